@@ -54,6 +54,7 @@ matrix-os A19 telemetry
       </div>
       <div class="row">
         <button onclick="loadAI()">Load</button>
+        <button onclick="loadAI(aiCursor)">Older</button>
         <button onclick="autoAI()">Auto (5s)</button>
       </div>
       <pre id="ai_box">—</pre>
@@ -82,6 +83,7 @@ matrix-os A19 telemetry
       </div>
       <div class="row">
         <button onclick="loadSessions()">Load</button>
+        <button onclick="loadSessions(sessCursor)">Older</button>
         <button onclick="autoSessions()">Auto (5s)</button>
       </div>
       <pre id="sess_box">—</pre>
@@ -93,44 +95,47 @@ const TELE = "http://127.0.0.1:5065";
 const AI_LOGS = TELE + "/api/telemetry/ai/logs";
 const SESS_LOGS = TELE + "/api/telemetry/session/logs";
 let aiTimer=null, sessTimer=null;
+let aiCursor=null, sessCursor=null;   // next_cursor from the last page (older rows)
 
 function setJSON(id,obj){ document.getElementById(id).textContent=(typeof obj==="string")?obj:JSON.stringify(obj,null,2); }
 
-async function loadAI(){
+async function loadAI(before){
   const user=(document.getElementById("ai_user").value||"").trim();
   const limit=(document.getElementById("ai_limit").value||"200").trim();
-  const url=AI_LOGS+`?user=${encodeURIComponent(user)}&limit=${limit}`;
+  let url=AI_LOGS+`?user=${encodeURIComponent(user)}&limit=${limit}`;
+  if(before) url+=`&before_id=${before}`;
   try{
     const r=await fetch(url); const j=await r.json();
     if(!j.ok) setJSON("ai_box","Error: "+(j.error||"Unknown"));
-    else setJSON("ai_box",j.events||[]);
+    else { aiCursor=j.next_cursor; setJSON("ai_box",j.events||[]); }
   }catch(e){ setJSON("ai_box","Connection error: "+e); }
 }
 
-async function loadSessions(){
+async function loadSessions(before){
   const user=(document.getElementById("sess_user").value||"").trim();
   const act=(document.getElementById("sess_action").value||"").trim();
   const limit=(document.getElementById("sess_limit").value||"200").trim();
   let url=SESS_LOGS+`?limit=${limit}`;
   if(user) url+=`&username=${encodeURIComponent(user)}`;
   if(act) url+=`&action=${encodeURIComponent(act)}`;
+  if(before) url+=`&before_id=${before}`;
   try{
     const r=await fetch(url); const j=await r.json();
     if(!j.ok) setJSON("sess_box","Error: "+(j.error||"Unknown"));
-    else setJSON("sess_box",j.events||[]);
+    else { sessCursor=j.next_cursor; setJSON("sess_box",j.events||[]); }
   }catch(e){ setJSON("sess_box","Connection error: "+e); }
 }
 
 function autoAI(){
   if(aiTimer){ clearInterval(aiTimer); aiTimer=null; alert("Auto-refresh stopped"); return; }
   loadAI();
-  aiTimer=setInterval(loadAI,5000);
+  aiTimer=setInterval(()=>loadAI(),5000);
   alert("Auto-refresh started (every 5s)");
 }
 function autoSessions(){
   if(sessTimer){ clearInterval(sessTimer); sessTimer=null; alert("Auto-refresh stopped"); return; }
   loadSessions();
-  sessTimer=setInterval(loadSessions,5000);
+  sessTimer=setInterval(()=>loadSessions(),5000);
   alert("Auto-refresh started (every 5s)");
 }
 </script>
@@ -6,30 +6,40 @@ matrix-os A11 auth bridge system
 
 from flask import Flask, request, jsonify
 import importlib.util
+import sys
+import threading
+import time
 from pathlib import Path
 
 APP_DIR = Path(__file__).parent.resolve()
 
-def load_module(module_name: str, filename: str):
-    """Dynamically load another Matrix module that has hyphens in filename."""
-    path = APP_DIR / filename
-    spec = importlib.util.spec_from_file_location(module_name, str(path))
-    if spec is None or spec.loader is None:
-        raise ImportError(f"Could not load spec for {filename}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
-
-# Load the dependent modules
-db      = load_module("matrix_os_a5_database",   "matrix-OS-A5-database.py")
-sec_mod = load_module("matrix_os_a3_security",   "matrix-OS-A3-security.py")
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# Load the dependent modules (A5 and A3 on first use)
+db      = loader.lazy("matrix_os_a5_database",   "matrix-OS-A5-database.py")
+sec_mod = loader.lazy("matrix_os_a3_security",   "matrix-OS-A3-security.py")
 ai_mod  = load_module("matrix_os_a6_ai_engine",  "matrix-OS-A6-ai-engine.py")
 MatrixAI = ai_mod.MatrixAI
 
 app = Flask(__name__)
 
-# One shared AI instance (you can expand to per-token if needed)
-AI = MatrixAI()
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A11-auth-bridge")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A11-auth-bridge")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A11-auth-bridge")
+
+# One AI engine per session token (A6 AIPool), released on logout
+AI_POOL = ai_mod.AIPool()
+memdiag.register("A11.ai_pool", AI_POOL.stats)
 
 def ok(data=None, **extra):
     payload = {"ok": True}
@@ -62,14 +72,10 @@ def login():
     if not username or not voice or not iris or not face:
         return err("Missing required fields: username, voice, iris, face")
 
-    # Verify biometrics against A5 database
-    if not db.verify_biometrics(username, voice, iris, face):
-        return err("Biometric verification failed", 401)
-
-    # Fetch stored user to determine security level
-    user = db.get_user(username)
+    # Verify biometrics and fetch the security level in one lookup (A5)
+    user = db.authenticate(username, voice, iris, face)
     if not user:
-        return err("User not found after verification", 404)
+        return err("Biometric verification failed", 401)
 
     # Create a security session via A3
     req_level = data.get("level")
@@ -77,8 +83,8 @@ def login():
     session = sec_mod.create_session(username, level)
     token = session["token"]
 
-    # Activate AI session for this user
-    AI.activate_session(username)
+    # Activate this session's AI engine
+    AI_POOL.activate(token, username)
 
     return ok(
         message="Login successful",
@@ -103,10 +109,8 @@ def logout():
     if not success:
         return err("Invalid or already revoked token", 400)
 
-    # Close AI session (simple global; extend to per-token if desired)
-    AI.session_active = False
-    AI.user = None
-    AI.log_event("Session terminated via logout.")
+    # Drop this session's AI engine
+    AI_POOL.release(token)
 
     return ok(message="Logout successful", token=token)
 
@@ -124,18 +128,100 @@ def verify_session():
     valid = sec_mod.verify_session(token)
     return ok(valid=bool(valid))
 
+@app.route("/api/auth/session/stats", methods=["GET"])
+def session_stats():
+    """
+    Session backend counters (shared across processes with the sqlite backend).
+    """
+    return ok(stats=sec_mod.session_stats(), ai_pool=AI_POOL.stats())
+
 # Simple CORS for local HTML pages
 @app.after_request
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return resp
 
+# ===== Login benchmark =====
+BENCH_USERS = 1000000
+BENCH_DB = "matrix_os_bench_users.sqlite3"
+BENCH_SESSIONS_DB = "matrix_os_bench_sessions.sqlite3"
+BENCH_CLIENTS = (1, 8, 64)
+BENCH_SECONDS = 5
+
+def _bench_seed(n_users):
+    """Seed BENCH_DB with n_users users (skipped when already seeded)."""
+    db.DB_PATH = BENCH_DB
+    db.init_db()
+    have = db.pool().one("SELECT COUNT(*) FROM users")[0]
+    if have >= n_users:
+        return
+    now = "2025-01-01T00:00:00"
+    rows = ((f"user{i}", f"voice{i}", f"iris{i}", f"face{i}", 1 + i % 4, now, now)
+            for i in range(have, n_users))
+    with db.pool().transaction() as conn:
+        conn.executemany("INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+def bench(n_users=BENCH_USERS, clients=BENCH_CLIENTS, seconds=BENCH_SECONDS, port=5980):
+    """
+    Logins/s and latency percentiles over real HTTP at each concurrency level,
+    against a database of n_users (random users, all logins succeed).
+    """
+    import http.client
+    import json
+    import logging
+    import random
+    from werkzeug.serving import make_server
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)   # no per-request access log
+
+    t0 = time.perf_counter()
+    _bench_seed(n_users)
+    print(f"seeded {n_users} users in {time.perf_counter() - t0:.1f}s ({BENCH_DB})")
+    sec_mod.active_sessions = sec_mod.make_store("sqlite", BENCH_SESSIONS_DB)
+    server = make_server("127.0.0.1", port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    def client(stop, latencies, failures):
+        rnd = random.Random()
+        while time.perf_counter() < stop:
+            i = rnd.randrange(n_users)
+            body = json.dumps({"username": f"user{i}", "voice": f"voice{i}",
+                               "iris": f"iris{i}", "face": f"face{i}"})
+            start = time.perf_counter()
+            conn = http.client.HTTPConnection("127.0.0.1", port)
+            conn.request("POST", "/api/auth/login", body, {"Content-Type": "application/json"})
+            resp = conn.getresponse()
+            resp.read()
+            conn.close()
+            latencies.append(time.perf_counter() - start)
+            if resp.status != 200:
+                failures.append(resp.status)
+
+    for n in clients:
+        latencies, failures = [], []
+        stop = time.perf_counter() + seconds
+        threads = [threading.Thread(target=client, args=(stop, latencies, failures)) for _ in range(n)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        latencies.sort()
+        pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+        print(f"clients={n:<3} logins/s={len(latencies) / seconds:8.0f}  "
+              f"p50={pct(0.50):.2f}ms  p99={pct(0.99):.2f}ms  failures={len(failures)}")
+    server.shutdown()
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        # python matrix-OS-A11-auth-bridge.py --bench [users]
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else BENCH_USERS)
+        sys.exit(0)
     # Run: python matrix-OS-A11-auth-bridge.py
     # Endpoints:
     #   POST http://127.0.0.1:5080/api/auth/login
     #   POST http://127.0.0.1:5080/api/auth/logout
     #   POST http://127.0.0.1:5080/api/auth/session/verify
+    #   GET  http://127.0.0.1:5080/api/auth/session/stats
     app.run(host="127.0.0.1", port=5080, debug=True)
@@ -7,25 +7,32 @@ matrix-os A16 user api system file
 
 from flask import Flask, request, jsonify
 import importlib.util
+import sys
 from pathlib import Path
 
 APP_DIR = Path(__file__).parent.resolve()
 
-def load_module(module_name: str, filename: str):
-    """Load another Matrix module even if its filename has hyphens."""
-    path = APP_DIR / filename
-    spec = importlib.util.spec_from_file_location(module_name, str(path))
-    if spec is None or spec.loader is None:
-        raise ImportError(f"Could not load spec for {filename}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
 
-# Load A5 database helpers
-db = load_module("matrix_os_a5_database", "matrix-OS-A5-database.py")
+# A5 database helpers, loaded on first use
+db = loader.lazy("matrix_os_a5_database", "matrix-OS-A5-database.py")
 
 app = Flask(__name__)
 
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A16-user-api")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A16-user-api")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A16-user-api")
+
 def ok(data=None, **extra):
     payload = {"ok": True}
     if data is not None:
@@ -111,7 +118,7 @@ def set_security():
 @app.after_request
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return resp
 
@@ -5,24 +5,63 @@ matrix-os A18 telemetrysystems program
 # Matrix Instruction Manual, ARM Index, Volume 1
 
 from flask import Flask, request, jsonify
-import sqlite3
-from contextlib import closing
 from pathlib import Path
 from datetime import datetime
 import importlib.util
+import sys
+import atexit
+import json
+import queue
+import sqlite3
+import threading
+import time
 
 APP_DIR = Path(__file__).parent.resolve()
 DB_PATH = str(APP_DIR / "matrix_os_telemetry.sqlite3")
 
+# ---------- Ingest Config ----------
+QUEUE_MAX = 50000          # pending events before producers fall back to direct writes
+BATCH_MAX = 1000           # rows per transaction
+FLUSH_EVERY = 0.05         # seconds a partial batch may wait before it is written
+ENQUEUE_WAIT = 0.25        # seconds a producer waits on a full queue
+WRITE_RETRIES = 3
+MAX_BATCH_REQUEST = 5000   # items accepted by one /batch call
+MAX_PAGE = 1000            # largest 'limit' for log queries
+
 app = Flask(__name__)
 
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A18-telemetry")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A18-telemetry")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A18-telemetry")
+
+# Shared pooled connections (WAL, statement cache) from A45
+dbpool = load_module("matrix_os_a45_dbpool", "matrix-OS-A45-dbpool.py")
+
 # ---------- DB Helpers ----------
 
+_schema_ready = False
+
 def db():
-    return sqlite3.connect(DB_PATH)
+    """Borrow a pooled connection to the telemetry DB: with db() as conn: ..."""
+    return dbpool.get_pool(DB_PATH).connection()
 
 def init_db():
-    with closing(db()) as conn, conn:
+    global _schema_ready
+    if _schema_ready:
+        return
+    with dbpool.get_pool(DB_PATH).transaction() as conn:
         conn.execute("""
         CREATE TABLE IF NOT EXISTS ai_events (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -49,39 +88,168 @@ def init_db():
         conn.execute("""
         CREATE INDEX IF NOT EXISTS idx_session_events_ts ON session_events(ts);
         """)
+        # Filtered, id-ordered reads (keyset pagination): equality columns then id
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_ai_events_user_id ON ai_events(user, id);
+        """)
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_session_events_username_id ON session_events(username, id);
+        """)
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_session_events_username_action_id ON session_events(username, action, id);
+        """)
+        conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_session_events_action_id ON session_events(action, id);
+        """)
+    _schema_ready = True
 
 def now():
     return datetime.utcnow().isoformat()
 
+INSERT_AI = "INSERT INTO ai_events (ts, user, event, details) VALUES (?, ?, ?, ?)"
+INSERT_SESSION = "INSERT INTO session_events (ts, username, level, token, action, details) VALUES (?, ?, ?, ?, ?, ?)"
+
+# ---------- Batched Ingestion ----------
+# Producers enqueue rows; one background writer drains the queue and commits
+# up to BATCH_MAX rows per transaction (or whatever arrived within FLUSH_EVERY).
+
+_queue = queue.Queue(maxsize=QUEUE_MAX)   # items: ("ai"|"session", row tuple)
+_writer = None
+_writer_lock = threading.Lock()
+_ingest = {
+    "enqueued": 0,
+    "written": 0,
+    "batches": 0,
+    "direct_writes": 0,    # queue was full; producer wrote its own row
+    "write_errors": 0,
+    "dropped": 0,          # rows lost after WRITE_RETRIES failed attempts
+    "last_flush_ms": 0.0,
+    "max_flush_ms": 0.0,
+    "total_flush_ms": 0.0,
+}
+
+def _write_rows(items):
+    ai_rows = [row for kind, row in items if kind == "ai"]
+    sess_rows = [row for kind, row in items if kind == "session"]
+    with dbpool.get_pool(DB_PATH).transaction() as conn:
+        if ai_rows:
+            conn.executemany(INSERT_AI, ai_rows)
+        if sess_rows:
+            conn.executemany(INSERT_SESSION, sess_rows)
+
+def _write_retrying(items):
+    """Write items in one transaction; True on success. Only lock/busy-type errors are retried."""
+    for attempt in range(WRITE_RETRIES):
+        try:
+            _write_rows(items)
+            return True
+        except (sqlite3.InterfaceError, sqlite3.ProgrammingError, sqlite3.IntegrityError):
+            _ingest["write_errors"] += 1
+            return False   # bad data: the same rows would fail again
+        except sqlite3.Error:
+            _ingest["write_errors"] += 1
+            time.sleep(0.05 * (attempt + 1))
+    return False
+
+def _flush_batch(items):
+    start = time.perf_counter()
+    if _write_retrying(items):
+        written = len(items)
+    else:
+        # Row by row, so one row that cannot be written does not take the batch with it
+        written = 0
+        for item in items:
+            try:
+                _write_rows([item])
+                written += 1
+            except sqlite3.Error:
+                _ingest["write_errors"] += 1
+                _ingest["dropped"] += 1
+    ms = (time.perf_counter() - start) * 1000
+    _ingest["written"] += written
+    _ingest["batches"] += 1
+    _ingest["last_flush_ms"] = ms
+    _ingest["total_flush_ms"] += ms
+    if ms > _ingest["max_flush_ms"]:
+        _ingest["max_flush_ms"] = ms
+
+def _writer_loop():
+    init_db()
+    while True:
+        first = _queue.get()
+        batch = [first]
+        deadline = time.monotonic() + FLUSH_EVERY
+        while len(batch) < BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(_queue.get(timeout=remaining) if remaining > 0 else _queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            _flush_batch(batch)
+        finally:
+            for _ in batch:
+                _queue.task_done()
+
+def _ensure_writer():
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="a18-telemetry-writer", daemon=True)
+            _writer.start()
+
+def _db_value(value):
+    """Columns are TEXT: None and str pass through, anything else is stored as JSON."""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, default=str)
+
+def _enqueue(kind, row):
+    row = tuple(_db_value(v) for v in row)   # never queue a row sqlite3 cannot bind
+    _ensure_writer()
+    try:
+        _queue.put((kind, row), timeout=ENQUEUE_WAIT)
+        _ingest["enqueued"] += 1
+    except queue.Full:
+        # Backpressure: the writer is behind, so pay for this row ourselves
+        init_db()
+        if _write_retrying([(kind, row)]):
+            _ingest["direct_writes"] += 1
+        else:
+            _ingest["dropped"] += 1
+
+def flush():
+    """
+    Block until every queued event has been committed.
+    """
+    if _writer is not None and _writer.is_alive():
+        _queue.join()
+
+def ingest_stats():
+    batches = _ingest["batches"]
+    return {
+        **_ingest,
+        "queue_depth": _queue.qsize(),
+        "queue_max": QUEUE_MAX,
+        "batch_max": BATCH_MAX,
+        "flush_every_s": FLUSH_EVERY,
+        "avg_batch_rows": round(_ingest["written"] / batches, 2) if batches else 0.0,
+        "avg_flush_ms": round(_ingest["total_flush_ms"] / batches, 4) if batches else 0.0,
+    }
+
+atexit.register(flush)
+
 # Public helpers (importable from other modules):
 def log_ai_event(user: str, event: str, details: str = ""):
-    init_db()
-    with closing(db()) as conn, conn:
-        conn.execute(
-            "INSERT INTO ai_events (ts, user, event, details) VALUES (?, ?, ?, ?)",
-            (now(), user, event, details),
-        )
+    _enqueue("ai", (now(), user, event, details))
 
 def log_session_event(username: str, level: str, token: str, action: str, details: str = ""):
-    init_db()
-    with closing(db()) as conn, conn:
-        conn.execute(
-            "INSERT INTO session_events (ts, username, level, token, action, details) VALUES (?, ?, ?, ?, ?, ?)",
-            (now(), username, level, token, action, details),
-        )
+    _enqueue("session", (now(), username, level, token, action, details))
 
 # ---------- Optional dynamic loads (if you want to call from here) ----------
 
-def load_module(module_name: str, filename: str):
-    """Utility to import another Matrix module by filename (supports hyphens)."""
-    path = APP_DIR / filename
-    spec = importlib.util.spec_from_file_location(module_name, str(path))
-    if spec is None or spec.loader is None:
-        raise ImportError(f"Could not load spec for {filename}")
-    mod = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(mod)
-    return mod
-
 # You may uncomment these if you want to call A3/A6 from telemetry server directly:
 # sec = load_module("matrix_os_a3_security", "matrix-OS-A3-security.py")
 # ai_mod = load_module("matrix_os_a6_ai_engine", "matrix-OS-A6-ai-engine.py")
@@ -100,6 +268,37 @@ def ok(data=None, **extra):
 def err(message, code=400):
     return jsonify({"ok": False, "error": message}), code
 
+def text_field(data, key):
+    """Stripped string value of data[key] ("" if missing/null); ValueError if it is not a string."""
+    value = data.get(key)
+    if value is None:
+        return ""
+    if not isinstance(value, str):
+        raise ValueError(f"'{key}' must be a string")
+    return value.strip()
+
+def details_field(data):
+    """'details' as stored: strings as given, objects/arrays/numbers JSON-encoded."""
+    value = data.get("details")
+    if value is None:
+        return ""
+    return value if isinstance(value, str) else json.dumps(value)
+
+def page_args():
+    """
+    Parse ?limit=, ?before_id=, ?after_id= (raises ValueError on bad cursors).
+    """
+    try:
+        limit = int(request.args.get("limit") or "200")
+    except Exception:
+        limit = 200
+    limit = max(1, min(limit, MAX_PAGE))
+    before_id = request.args.get("before_id")
+    after_id = request.args.get("after_id")
+    before_id = int(before_id) if before_id not in (None, "") else None
+    after_id = int(after_id) if after_id not in (None, "") else None
+    return limit, before_id, after_id
+
 # ---------- Telemetry API ----------
 
 @app.route("/api/telemetry/ai/add", methods=["POST"])
@@ -110,13 +309,48 @@ def api_ai_add():
     """
     init_db()
     data = request.get_json(silent=True) or {}
-    user    = (data.get("user") or "").strip()
-    event   = (data.get("event") or "").strip()
-    details = (data.get("details") or "")
+    if not isinstance(data, dict):
+        return err("Expected a JSON object")
+    try:
+        user  = text_field(data, "user")
+        event = text_field(data, "event")
+    except ValueError as e:
+        return err(str(e))
+    details = details_field(data)
     if not event:
         return err("Missing 'event'")
     log_ai_event(user, event, details)
-    return ok(message="AI event recorded")
+    return ok(message="AI event queued")
+
+@app.route("/api/telemetry/ai/batch", methods=["POST"])
+def api_ai_batch():
+    """
+    JSON: an array of AI events (or {"events": [...]})
+    [ { "user":"Admin", "event":"command", "details":"encrypt Hello" }, ... ]
+    Items without 'event', or with non-string user/event, are skipped and
+    reported (by index) in 'rejected'. Object/array 'details' are stored as JSON.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("events") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return err("Expected a JSON array of events")
+    if len(items) > MAX_BATCH_REQUEST:
+        return err(f"Too many events (max {MAX_BATCH_REQUEST})", 413)
+    accepted, rejected = 0, []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError(i)
+            user, event = text_field(item, "user"), text_field(item, "event")
+        except ValueError:
+            rejected.append(i)
+            continue
+        if not event:
+            rejected.append(i)
+            continue
+        log_ai_event(user, event, details_field(item))
+        accepted += 1
+    return ok(message="AI events queued", accepted=accepted, rejected=rejected)
 
 @app.route("/api/telemetry/ai/logs", methods=["GET"])
 def api_ai_logs():
@@ -124,27 +358,29 @@ def api_ai_logs():
     Optional query params:
       ?user=Admin
       ?limit=100 (default 200)
+      ?before_id=<id>  older page (use the returned next_cursor)
+      ?after_id=<id>   newer rows only (next_cursor continues forward)
     """
     init_db()
     user = (request.args.get("user") or "").strip()
     try:
-        limit = int(request.args.get("limit") or "200")
-    except Exception:
-        limit = 200
-    q = "SELECT ts, user, event, details FROM ai_events "
-    params = []
+        limit, before_id, after_id = page_args()
+    except ValueError:
+        return err("before_id/after_id must be integers")
+    clauses, params = [], []
     if user:
-        q += "WHERE user = ? "
+        clauses.append("user = ?")
         params.append(user)
-    q += "ORDER BY id DESC LIMIT ?"
-    params.append(limit)
-    with closing(db()) as conn:
-        rows = conn.execute(q, tuple(params)).fetchall()
-        result = [
-            {"ts": r[0], "user": r[1], "event": r[2], "details": r[3]}
-            for r in rows
-        ]
-        return ok(events=result, count=len(result))
+    q, args = dbpool.keyset_query(
+        "SELECT id, ts, user, event, details FROM ai_events",
+        clauses, params, limit, before_id, after_id)
+    rows, next_cursor = dbpool.keyset_page(
+        dbpool.get_pool(DB_PATH).rows(q, args), limit, before_id, after_id)
+    result = [
+        {"id": r[0], "ts": r[1], "user": r[2], "event": r[3], "details": r[4]}
+        for r in rows
+    ]
+    return ok(events=result, count=len(result), next_cursor=next_cursor)
 
 @app.route("/api/telemetry/session/add", methods=["POST"])
 def api_session_add():
@@ -155,15 +391,50 @@ def api_session_add():
     """
     init_db()
     data = request.get_json(silent=True) or {}
-    username = (data.get("username") or "").strip()
-    level    = (data.get("level") or "").strip()
-    token    = (data.get("token") or "").strip()
-    action   = (data.get("action") or "").strip()
-    details  = (data.get("details") or "")
+    if not isinstance(data, dict):
+        return err("Expected a JSON object")
+    try:
+        username = text_field(data, "username")
+        level    = text_field(data, "level")
+        token    = text_field(data, "token")
+        action   = text_field(data, "action")
+    except ValueError as e:
+        return err(str(e))
+    details = details_field(data)
     if not action:
         return err("Missing 'action'")
     log_session_event(username, level, token, action, details)
-    return ok(message="Session event recorded")
+    return ok(message="Session event queued")
+
+@app.route("/api/telemetry/session/batch", methods=["POST"])
+def api_session_batch():
+    """
+    JSON: an array of session events (or {"events": [...]})
+    [ { "username":"Admin", "level":"...", "token":"...", "action":"created", "details":"" }, ... ]
+    Items without 'action', or with non-string text fields, are skipped and
+    reported (by index) in 'rejected'. Object/array 'details' are stored as JSON.
+    """
+    data = request.get_json(silent=True)
+    items = data.get("events") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return err("Expected a JSON array of events")
+    if len(items) > MAX_BATCH_REQUEST:
+        return err(f"Too many events (max {MAX_BATCH_REQUEST})", 413)
+    accepted, rejected = 0, []
+    for i, item in enumerate(items):
+        try:
+            if not isinstance(item, dict):
+                raise ValueError(i)
+            fields = [text_field(item, k) for k in ("username", "level", "token", "action")]
+        except ValueError:
+            rejected.append(i)
+            continue
+        if not fields[3]:
+            rejected.append(i)
+            continue
+        log_session_event(*fields, details_field(item))
+        accepted += 1
+    return ok(message="Session events queued", accepted=accepted, rejected=rejected)
 
 @app.route("/api/telemetry/session/logs", methods=["GET"])
 def api_session_logs():
@@ -172,16 +443,17 @@ def api_session_logs():
       ?username=Admin
       ?action=created
       ?limit=100 (default 200)
+      ?before_id=<id>  older page (use the returned next_cursor)
+      ?after_id=<id>   newer rows only (next_cursor continues forward)
     """
     init_db()
     username = (request.args.get("username") or "").strip()
     action   = (request.args.get("action") or "").strip()
     try:
-        limit = int(request.args.get("limit") or "200")
-    except Exception:
-        limit = 200
+        limit, before_id, after_id = page_args()
+    except ValueError:
+        return err("before_id/after_id must be integers")
 
-    q = "SELECT ts, username, level, token, action, details FROM session_events"
     clauses = []
     params = []
     if username:
@@ -190,25 +462,33 @@ def api_session_logs():
     if action:
         clauses.append("action = ?")
         params.append(action)
-    if clauses:
-        q += " WHERE " + " AND ".join(clauses)
-    q += " ORDER BY id DESC LIMIT ?"
-    params.append(limit)
-
-    with closing(db()) as conn:
-        rows = conn.execute(q, tuple(params)).fetchall()
-        result = [
-            {"ts": r[0], "username": r[1], "level": r[2], "token": r[3], "action": r[4], "details": r[5]}
-            for r in rows
-        ]
-        return ok(events=result, count=len(result))
+    q, args = dbpool.keyset_query(
+        "SELECT id, ts, username, level, token, action, details FROM session_events",
+        clauses, params, limit, before_id, after_id)
+    rows, next_cursor = dbpool.keyset_page(
+        dbpool.get_pool(DB_PATH).rows(q, args), limit, before_id, after_id)
+    result = [
+        {"id": r[0], "ts": r[1], "username": r[2], "level": r[3], "token": r[4], "action": r[5], "details": r[6]}
+        for r in rows
+    ]
+    return ok(events=result, count=len(result), next_cursor=next_cursor)
+
+@app.route("/api/telemetry/db/stats", methods=["GET"])
+def api_db_stats():
+    """Connection pool and query latency counters."""
+    return ok(pools=dbpool.stats())
+
+@app.route("/api/telemetry/ingest/stats", methods=["GET"])
+def api_ingest_stats():
+    """Queue depth, batch sizes and flush latency of the background writer."""
+    return ok(ingest=ingest_stats())
 
 # ---------- CORS ----------
 
 @app.after_request
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return resp
 
@@ -220,7 +500,12 @@ if __name__ == "__main__":
     #   python matrix-OS-A18-telemetry.py
     # Endpoints:
     #   POST http://127.0.0.1:5065/api/telemetry/ai/add
+    #   POST http://127.0.0.1:5065/api/telemetry/ai/batch
     #   GET  http://127.0.0.1:5065/api/telemetry/ai/logs?user=Admin
+    #   GET  http://127.0.0.1:5065/api/telemetry/ai/logs?user=Admin&before_id=<next_cursor>
     #   POST http://127.0.0.1:5065/api/telemetry/session/add
+    #   POST http://127.0.0.1:5065/api/telemetry/session/batch
     #   GET  http://127.0.0.1:5065/api/telemetry/session/logs?action=created
+    #   GET  http://127.0.0.1:5065/api/telemetry/db/stats
+    #   GET  http://127.0.0.1:5065/api/telemetry/ingest/stats
     app.run(host="127.0.0.1", port=5065, debug=True)
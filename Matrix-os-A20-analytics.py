@@ -4,19 +4,48 @@ matrix-os A20 analytics system
 # Consumes matrix_os_telemetry.sqlite3 and produces summary analytics
 # Matrix Instruction Manual, ARM Index, Volume 1
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 import sqlite3
+import sys
+import threading
+import time
+import importlib.util
 from datetime import datetime, timedelta
-from contextlib import closing
 from pathlib import Path
 
 APP_DIR = Path(__file__).parent.resolve()
 DB_PATH = APP_DIR / "matrix_os_telemetry.sqlite3"
 
+# ---------- Rollup Config ----------
+ROLLUP_REFRESH_EVERY = 5.0   # seconds between incremental refreshes on the request path
+ROLLUP_CHUNK = 50000         # raw rows folded into the rollups per transaction
+ROLLUP_BUDGET = 200000       # raw rows a request-time refresh may fold before answering
+RECENT_LIMIT = 200           # newest raw rows returned in 'recent_24h'
+
 app = Flask(__name__)
 
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A20-analytics")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A20-analytics")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A20-analytics")
+
+# Shared pooled connections (WAL, statement cache) from A45
+dbpool = load_module("matrix_os_a45_dbpool", "matrix-OS-A45-dbpool.py")
+
 def db():
-    return sqlite3.connect(DB_PATH)
+    """Borrow a pooled connection (rows as sqlite3.Row): with db() as conn: ..."""
+    return dbpool.get_pool(DB_PATH, sqlite3.Row).connection()
 
 def ok(data=None, **extra):
     payload = {"ok": True}
@@ -29,52 +58,223 @@ def err(msg, code=400):
     return jsonify({"ok": False, "error": msg}), code
 
 def get_rows(q, args=()):
-    with closing(db()) as conn:
-        conn.row_factory = sqlite3.Row
-        return [dict(r) for r in conn.execute(q, args).fetchall()]
+    return [dict(r) for r in dbpool.get_pool(DB_PATH, sqlite3.Row).rows(q, args)]
+
+# ---------- Rollups ----------
+# Counts are folded in from the raw tables by id high-water mark, so each
+# refresh only reads rows appended since the last one. A18 commits ids in
+# order (single SQLite writer), so everything <= MAX(id) is already visible.
+
+ROLLUP_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup_state (
+    source  TEXT PRIMARY KEY,          -- ai_events | session_events
+    last_id INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollup_ai_hourly (
+    hour  TEXT NOT NULL,               -- 'YYYY-MM-DDTHH' (UTC)
+    user  TEXT NOT NULL,
+    event TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (hour, user, event)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_session_hourly (
+    hour     TEXT NOT NULL,
+    username TEXT NOT NULL,
+    action   TEXT NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (hour, username, action)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_ai_user_event (
+    user  TEXT NOT NULL,
+    event TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (user, event)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_session_user_action (
+    username TEXT NOT NULL,
+    action   TEXT NOT NULL,
+    count    INTEGER NOT NULL,
+    PRIMARY KEY (username, action)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_ai_user (
+    user  TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_ai_event (
+    event TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rollup_session_action (
+    action TEXT PRIMARY KEY,
+    count  INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_rollup_ai_user_count ON rollup_ai_user(count);
+CREATE INDEX IF NOT EXISTS idx_rollup_ai_event_count ON rollup_ai_event(count);
+"""
+
+ROLLUP_TABLES = (
+    "rollup_state", "rollup_ai_hourly", "rollup_session_hourly",
+    "rollup_ai_user_event", "rollup_session_user_action",
+    "rollup_ai_user", "rollup_ai_event", "rollup_session_action",
+)
+
+# (target, key columns, select expressions over the raw table)
+AI_ROLLUPS = (
+    ("rollup_ai_hourly", "hour, user, event", "substr(ts,1,13), COALESCE(user,''), event"),
+    ("rollup_ai_user_event", "user, event", "COALESCE(user,''), event"),
+    ("rollup_ai_user", "user", "COALESCE(user,'')"),
+    ("rollup_ai_event", "event", "event"),
+)
+SESSION_ROLLUPS = (
+    ("rollup_session_hourly", "hour, username, action", "substr(ts,1,13), COALESCE(username,''), action"),
+    ("rollup_session_user_action", "username, action", "COALESCE(username,''), action"),
+    ("rollup_session_action", "action", "action"),
+)
+
+_rollup_lock = threading.Lock()
+_rollup_ready = False
+_last_refresh = 0.0
+
+def init_rollups():
+    global _rollup_ready
+    if not _rollup_ready:
+        dbpool.get_pool(DB_PATH).script(ROLLUP_SCHEMA)
+        _rollup_ready = True
+
+def _fold(conn, source, rollups, budget):
+    """
+    Fold raw rows with id > high-water mark into the rollups; returns rows read.
+    Each chunk takes the write lock first (BEGIN IMMEDIATE) and reads the
+    high-water mark inside that transaction, so another process folding the
+    same DB (a second worker, the rebuild-rollups CLI) never adds a range twice.
+    """
+    try:
+        hi = conn.execute(f"SELECT MAX(id) FROM {source}").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0  # A18 has not created the raw table yet
+    done = 0
+    while done < budget:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            r = conn.execute("SELECT last_id FROM rollup_state WHERE source=?", (source,)).fetchone()
+            last = r[0] if r else 0
+            if last >= hi:
+                break
+            upto = min(last + ROLLUP_CHUNK, hi)
+            for table, keys, exprs in rollups:
+                conn.execute(f"""
+                    INSERT INTO {table} ({keys}, count)
+                    SELECT {exprs}, COUNT(*) FROM {source}
+                    WHERE id > ? AND id <= ? GROUP BY {exprs}
+                    ON CONFLICT ({keys}) DO UPDATE SET count = count + excluded.count
+                """, (last, upto))
+            conn.execute("""
+                INSERT INTO rollup_state (source, last_id) VALUES (?, ?)
+                ON CONFLICT (source) DO UPDATE SET last_id = excluded.last_id
+            """, (source, upto))
+        done += upto - last
+    return done
+
+def refresh_rollups(budget=None):
+    """
+    Bring the rollups up to date with the raw tables (bounded by 'budget' raw ids per source).
+    """
+    global _last_refresh
+    init_rollups()
+    budget = float("inf") if budget is None else budget
+    with _rollup_lock:
+        with dbpool.get_pool(DB_PATH).connection() as conn:
+            folded = _fold(conn, "ai_events", AI_ROLLUPS, budget)
+            folded += _fold(conn, "session_events", SESSION_ROLLUPS, budget)
+        _last_refresh = time.monotonic()
+    return folded
+
+def refresh_if_stale():
+    if time.monotonic() - _last_refresh >= ROLLUP_REFRESH_EVERY:
+        refresh_rollups(ROLLUP_BUDGET)
+
+def rebuild_rollups():
+    """
+    Drop every rollup row and backfill from the full raw history.
+    """
+    init_rollups()
+    with _rollup_lock:
+        with dbpool.get_pool(DB_PATH).transaction() as conn:
+            for table in ROLLUP_TABLES:
+                conn.execute(f"DELETE FROM {table}")
+    return refresh_rollups()
 
 # ---------- Core Analytics ----------
 def top_users(limit=5):
-    q = """SELECT user, COUNT(*) AS count FROM ai_events
-           WHERE user IS NOT NULL AND user!=''
-           GROUP BY user ORDER BY count DESC LIMIT ?"""
+    q = """SELECT user, count FROM rollup_ai_user
+           WHERE user!='' ORDER BY count DESC LIMIT ?"""
     return get_rows(q, (limit,))
 
 def top_events(limit=5):
-    q = """SELECT event, COUNT(*) AS count FROM ai_events
-           GROUP BY event ORDER BY count DESC LIMIT ?"""
+    q = """SELECT event, count FROM rollup_ai_event
+           ORDER BY count DESC LIMIT ?"""
     return get_rows(q, (limit,))
 
 def session_summary():
-    q = """SELECT action, COUNT(*) AS count FROM session_events
-           GROUP BY action ORDER BY count DESC"""
+    q = """SELECT action, count FROM rollup_session_action
+           ORDER BY count DESC"""
     return get_rows(q)
 
+def user_summary(username):
+    events = get_rows("""SELECT event, count FROM rollup_ai_user_event
+                         WHERE user=? ORDER BY count DESC""", (username,))
+    actions = get_rows("""SELECT action, count FROM rollup_session_user_action
+                          WHERE username=? ORDER BY count DESC""", (username,))
+    return {"events": events, "actions": actions}
+
+def activity_by_hour(hours=24, username=None):
+    """
+    AI events and session actions per UTC hour for the last 'hours' hours,
+    oldest first, from the hourly rollups (optionally for one user).
+    """
+    since = (datetime.utcnow() - timedelta(hours=hours - 1)).strftime("%Y-%m-%dT%H")
+    user_clause = " AND user=?" if username is not None else ""
+    ai = get_rows(f"""SELECT hour, SUM(count) AS count FROM rollup_ai_hourly
+                      WHERE hour>=?{user_clause} GROUP BY hour""",
+                  (since,) + ((username,) if username is not None else ()))
+    user_clause = " AND username=?" if username is not None else ""
+    sess = get_rows(f"""SELECT hour, SUM(count) AS count FROM rollup_session_hourly
+                        WHERE hour>=?{user_clause} GROUP BY hour""",
+                    (since,) + ((username,) if username is not None else ()))
+    buckets = {}
+    for r in ai:
+        buckets.setdefault(r["hour"], {"hour": r["hour"], "ai": 0, "sessions": 0})["ai"] = r["count"]
+    for r in sess:
+        buckets.setdefault(r["hour"], {"hour": r["hour"], "ai": 0, "sessions": 0})["sessions"] = r["count"]
+    return [buckets[h] for h in sorted(buckets)]
+
 def failed_logins(limit=10):
     q = """SELECT username, ts, details FROM session_events
            WHERE action='failed' ORDER BY id DESC LIMIT ?"""
     return get_rows(q, (limit,))
 
-def recent_activity(hours=24):
+def recent_activity(hours=24, limit=RECENT_LIMIT):
     cutoff = (datetime.utcnow() - timedelta(hours=hours)).isoformat()
     q_ai = """SELECT ts,'AI' AS type,user AS actor,event AS info
-              FROM ai_events WHERE ts>=?"""
+              FROM ai_events WHERE ts>=? ORDER BY ts DESC LIMIT ?"""
     q_sess = """SELECT ts,'SESSION' AS type,username AS actor,action AS info
-                FROM session_events WHERE ts>=?"""
-    rows = get_rows(q_ai, (cutoff,)) + get_rows(q_sess, (cutoff,))
+                FROM session_events WHERE ts>=? ORDER BY ts DESC LIMIT ?"""
+    rows = get_rows(q_ai, (cutoff, limit)) + get_rows(q_sess, (cutoff, limit))
     rows.sort(key=lambda r: r["ts"], reverse=True)
-    return rows
+    return rows[:limit]
 
 # ---------- API Endpoints ----------
 @app.route("/api/analytics/summary")
 def api_summary():
     try:
+        refresh_if_stale()
         data = {
             "top_users": top_users(),
             "top_events": top_events(),
             "session_summary": session_summary(),
             "failed_logins": failed_logins(),
             "recent_24h": recent_activity(24),
+            "hourly_24h": activity_by_hour(24),
         }
         return ok(data)
     except Exception as e:
@@ -82,26 +282,83 @@ def api_summary():
 
 @app.route("/api/analytics/user/<username>")
 def api_user(username):
+    """
+    Optional query params (each list pages independently):
+      ?limit=50 (max 1000)
+      ?ai_before_id= / ?ai_after_id=      cursor for the 'ai' list
+      ?sess_before_id= / ?sess_after_id=  cursor for the 'sessions' list
+    """
+    try:
+        limit = max(1, min(int(request.args.get("limit") or "50"), 1000))
+        cur = {k: (int(request.args[k]) if request.args.get(k) else None)
+               for k in ("ai_before_id", "ai_after_id", "sess_before_id", "sess_after_id")}
+    except ValueError:
+        return err("limit and cursors must be integers")
+    try:
+        refresh_if_stale()
+        pool = dbpool.get_pool(DB_PATH, sqlite3.Row)
+        q1, a1 = dbpool.keyset_query("SELECT id,ts,event,details FROM ai_events",
+                                     ["user=?"], [username], limit,
+                                     cur["ai_before_id"], cur["ai_after_id"])
+        q2, a2 = dbpool.keyset_query("SELECT id,ts,action,details FROM session_events",
+                                     ["username=?"], [username], limit,
+                                     cur["sess_before_id"], cur["sess_after_id"])
+        ai, ai_next = dbpool.keyset_page(pool.rows(q1, a1), limit,
+                                         cur["ai_before_id"], cur["ai_after_id"])
+        sess, sess_next = dbpool.keyset_page(pool.rows(q2, a2), limit,
+                                             cur["sess_before_id"], cur["sess_after_id"])
+        return ok({"ai": [dict(r) for r in ai],
+                   "sessions": [dict(r) for r in sess],
+                   "totals": user_summary(username)},
+                  next_cursor={"ai": ai_next, "sessions": sess_next})
+    except Exception as e:
+        return err(str(e), 500)
+
+@app.route("/api/analytics/hourly")
+def api_hourly():
+    """
+    Counts per UTC hour from the hourly rollups:
+      ?hours=24 (max 24*90)  ?user=Admin (one user's events and session actions)
+    """
+    try:
+        hours = max(1, min(int(request.args.get("hours") or "24"), 24 * 90))
+    except ValueError:
+        return err("hours must be an integer")
     try:
-        q1 = """SELECT ts,event,details FROM ai_events
-                WHERE user=? ORDER BY id DESC LIMIT 50"""
-        q2 = """SELECT ts,action,details FROM session_events
-                WHERE username=? ORDER BY id DESC LIMIT 50"""
-        ai = get_rows(q1, (username,))
-        sess = get_rows(q2, (username,))
-        return ok({"ai": ai, "sessions": sess})
+        refresh_if_stale()
+        return ok(activity_by_hour(hours, request.args.get("user") or None), hours=hours)
     except Exception as e:
         return err(str(e), 500)
 
+@app.route("/api/analytics/db/stats")
+def api_db_stats():
+    return ok(pools=dbpool.stats())
+
 @app.after_request
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     return resp
 
+@app.route("/api/analytics/rollups/refresh", methods=["POST"])
+def api_rollups_refresh():
+    try:
+        return ok(folded=refresh_rollups())
+    except Exception as e:
+        return err(str(e), 500)
+
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild-rollups":
+        # Backfill: python matrix-OS-A20-analytics.py rebuild-rollups
+        t0 = time.perf_counter()
+        n = rebuild_rollups()
+        print(f"Rollups rebuilt from {n} raw rows in {time.perf_counter() - t0:.2f}s")
+        sys.exit(0)
     # Run: python matrix-OS-A20-analytics.py
     # Examples:
     #   GET http://127.0.0.1:5066/api/analytics/summary
     #   GET http://127.0.0.1:5066/api/analytics/user/Admin
+    #   GET http://127.0.0.1:5066/api/analytics/hourly?hours=48&user=Admin
+    #   GET http://127.0.0.1:5066/api/analytics/db/stats
+    #   POST http://127.0.0.1:5066/api/analytics/rollups/refresh
     app.run(host="127.0.0.1", port=5066, debug=True)
@@ -4,32 +4,151 @@ matrix-os A26 authentication file
 # Matrix Instruction Manual, ARM Index, Volume 1
 
 from flask import Flask, request, jsonify, Response
-from datetime import datetime
 from collections import deque
+from datetime import datetime
+from pathlib import Path
+import atexit
+import importlib.util
+import sys
 import json
 import threading
 import time
 
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+notify_log = load_module("matrix_os_a47_notify_log", "matrix-OS-A47-notify-log.py")
+notify_filter = load_module("matrix_os_a48_notify_filter", "matrix-OS-A48-notify-filter.py")
+
 app = Flask(__name__)
 
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A26-notifications")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A26-notifications")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A26-notifications")
+
 # ===== Config =====
 RING_SIZE = 500            # how many notifications to keep in memory
 HEARTBEAT_EVERY = 20       # seconds between SSE heartbeats
+PULL_MAX_WAIT = 30         # longest ?wait= a long-poll pull may hold (seconds)
+DURABLE = True             # persist history to LOG_DIR so ?since= survives restarts
+LOG_DIR = APP_DIR / "notify_log"
+LOG_SEGMENT_BYTES = 8 * 1024 * 1024
+LOG_RETAIN_SEGMENTS = 16
+LOG_RETAIN_SECONDS = None  # e.g. 7 * 86400 to also expire by age
 
 # ===== State =====
-_notifs = deque(maxlen=RING_SIZE)  # each item: dict with id, ts, level, message, source, user, details
-_next_id = 1
-_cv = threading.Condition()        # used to wake SSE/pull waiters
+class _Ring:
+    """
+    Fixed-size buffer of notifications with contiguous ids.
+    Ids are handed out by append(), so the slot of id N is N % capacity and
+    a read for 'since' jumps straight to its offset instead of scanning.
+    Per-user and per-source id queues let filtered reads skip unrelated items.
+    Callers hold _cv while appending or reading.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self.first_id = 1      # oldest id still buffered
+        self.next_id = 1       # id the next append receives
+        self._by_user = {}     # user -> deque of buffered ids (ascending)
+        self._by_source = {}
+
+    def __len__(self):
+        return self.next_id - self.first_id
+
+    def reset(self, next_id):
+        """Start empty, handing out ids from next_id (continues a durable log)."""
+        self._slots = [None] * self.capacity
+        self._by_user, self._by_source = {}, {}
+        self.first_id = self.next_id = next_id
+
+    @staticmethod
+    def _index_pop(index, key):
+        ids = index[key]
+        ids.popleft()          # the evicted item is always the oldest of its topic
+        if not ids:
+            del index[key]
+
+    def append(self, n):
+        nid = self.next_id
+        n["id"] = nid
+        slot = nid % self.capacity
+        if self.next_id - self.first_id >= self.capacity:
+            old = self._slots[slot]
+            self._index_pop(self._by_user, old["user"])
+            self._index_pop(self._by_source, old["source"])
+        self._slots[slot] = n
+        self._by_user.setdefault(n["user"], deque()).append(nid)
+        self._by_source.setdefault(n["source"], deque()).append(nid)
+        self.next_id = nid + 1
+        if self.next_id - self.first_id > self.capacity:
+            self.first_id = self.next_id - self.capacity
+        return nid
+
+    def since(self, since_id, limit=0, flt=None):
+        """Items with id > since_id (oldest first), at most 'limit' if limit > 0."""
+        start = max(since_id + 1, self.first_id)
+        slots, cap = self._slots, self.capacity
+        if flt is None:
+            end = self.next_id
+            if limit > 0:
+                end = min(end, start + limit)
+            return [slots[i % cap] for i in range(start, end)]
+        ids = None
+        if flt.exact_user:
+            ids = self._by_user.get(flt.exact_user, ())
+        elif flt.exact_source:
+            ids = self._by_source.get(flt.exact_source, ())
+        if ids is None:
+            candidates = range(start, self.next_id)
+        else:
+            candidates = []
+            for nid in reversed(ids):
+                if nid < start:
+                    break
+                candidates.append(nid)
+            candidates.reverse()
+        out = []
+        for nid in candidates:
+            n = slots[nid % cap]
+            if flt.matches(n):
+                out.append(n)
+                if 0 < limit <= len(out):
+                    break
+        return out
+
+_notifs = _Ring(RING_SIZE)         # each item: dict with id, ts, level, message, source, user, details
+_cv = threading.Condition()        # guards _notifs; wakes SSE/pull waiters
+_listeners = []                    # callables fed each new notification (see add_listener)
+_router = notify_filter.Router()   # threaded SSE/long-poll waiters, woken only by matching pushes
+memdiag.register("A26.notifications", lambda: len(_notifs))
+memdiag.register("A26.subscribers", _router.stats)
+memdiag.register("A26.listeners", lambda: len(_listeners))
+
+# Older history lives in the segment log; the ring only holds the newest RING_SIZE
+_log = None
+if DURABLE:
+    _log = notify_log.SegmentLog(LOG_DIR, segment_bytes=LOG_SEGMENT_BYTES,
+                                 retain_segments=LOG_RETAIN_SEGMENTS,
+                                 retain_seconds=LOG_RETAIN_SECONDS)
+    _notifs.reset(_log.last_id + 1)
+    atexit.register(_log.close)   # the writer thread is a daemon; fsync the last interval on exit
 
 def _now_iso():
     return datetime.utcnow().isoformat()
 
-def _next():
-    global _next_id
-    nid = _next_id
-    _next_id += 1
-    return nid
-
 def push(level: str, message: str, source: str = "A26", user: str = "", details=None):
     """
     Programmatic helper to push a notification (import from other modules).
@@ -40,7 +159,7 @@ def push(level: str, message: str, source: str = "A26", user: str = "", details=
     if details is None:
         details = {}
     n = {
-        "id": _next(),
+        "id": 0,                                # assigned by _notifs.append under _cv
         "ts": _now_iso(),
         "level": (level or "info").lower(),     # info|success|warning|error
         "message": str(message or ""),
@@ -50,11 +169,35 @@ def push(level: str, message: str, source: str = "A26", user: str = "", details=
     }
     with _cv:
         _notifs.append(n)
+        if _log is not None:
+            _log.append(n["id"], n)   # buffered; fsync happens in the log's group commit
+        for fn in _listeners:
+            fn(n)
+        for group in _router.match(n):
+            for ev in list(group.subs):
+                ev.set()
         _cv.notify_all()
     return n
 
-# Seed a hello on boot
-push("success", "A26 Notifications online", source="A26")
+def add_listener(fn):
+    """
+    Call fn(n) for every pushed notification, in id order.
+    fn runs while _cv is held, so it must only hand off (e.g. to an event loop).
+    """
+    with _cv:
+        _listeners.append(fn)
+
+def remove_listener(fn):
+    with _cv:
+        if fn in _listeners:
+            _listeners.remove(fn)
+
+# Seed a hello on boot (from loader.startup(), not at import)
+@loader.on_startup
+def announce():
+    push("success", "A26 Notifications online", source="A26")
+
+app.before_request(loader.startup)
 
 # ===== Helpers =====
 def ok(data=None, **extra):
@@ -67,13 +210,64 @@ def ok(data=None, **extra):
 def err(msg, code=400):
     return jsonify({"ok": False, "error": msg}), code
 
-def _slice_since(since_id: int, limit: int):
-    # Return notifications with id > since_id (up to limit)
-    items = [n for n in list(_notifs) if n["id"] > since_id]
-    if limit > 0:
-        items = items[:limit]
+def _slice_since(since_id: int, limit: int, flt=None):
+    # Return notifications with id > since_id (up to limit), optionally filtered
+    with _cv:
+        first = _notifs.first_id
+        items = _notifs.since(since_id, limit, flt)
+    if _log is not None and since_id + 1 < first:
+        # Older than the ring: replay from the segment log, then continue in memory
+        older = _log.read_since(since_id, limit, stop_id=first,
+                                match=flt.matches if flt is not None else None)
+        items = older + items
+        if limit > 0:
+            items = items[:limit]
     return items
 
+def _needs_log(since_id):
+    """True if reading after since_id goes to the segment log (disk), not just the ring."""
+    with _cv:
+        return _log is not None and since_id + 1 < _notifs.first_id
+
+def _scan_cursor(since_id, items, limit, high_water):
+    """
+    Where a filtered reader should resume: past the newest id it has already
+    examined, so unrelated notifications are not rescanned next time.
+    """
+    if items and 0 < limit <= len(items):
+        return items[-1]["id"]
+    return max(since_id, high_water, items[-1]["id"] if items else 0)
+
+def _high_water():
+    with _cv:
+        return _notifs.next_id - 1
+
+def _pull_args(get):
+    """since, limit, wait seconds (capped at PULL_MAX_WAIT) and filter of a pull request."""
+    try:
+        since = int(get("since") or "0")
+    except Exception:
+        since = 0
+    try:
+        limit = int(get("limit") or "50")
+    except Exception:
+        limit = 50
+    try:
+        wait_s = int(get("wait") or "0")
+    except Exception:
+        wait_s = 0
+    if wait_s > 0:
+        wait_s = max(1, min(wait_s, PULL_MAX_WAIT))
+    return since, limit, wait_s, notify_filter.Filter.from_args(get)
+
+def _pull_result(since, limit, flt, items, hw):
+    """Body fields of a pull response (shared with A46's asyncio long-poll)."""
+    if flt is None:
+        last_id = items[-1]["id"] if items else since
+    else:
+        last_id = _scan_cursor(since, items, limit, hw)
+    return {"notifications": items, "last_id": last_id}
+
 # ===== API: send, pull, stream =====
 @app.route("/api/notify/send", methods=["POST"])
 def api_send():
@@ -103,39 +297,39 @@ def api_pull():
     - since: last seen id (default 0)
     - limit: max items (default 50)
     - wait:  long-poll seconds to wait if none available (default 0 -> no wait)
+    Optional filters (server-side):
+      ?user=Admin  ?source=A2*  ?level>=warning (or ?min_level=)  ?level=warning,error
+    With a filter, last_id is the newest id examined, so pass it back as since.
+    Each waiting pull holds a server thread here; A46 serves it from a future.
     """
-    try:
-        since = int(request.args.get("since", "0"))
-    except Exception:
-        since = 0
-    try:
-        limit = int(request.args.get("limit", "50"))
-    except Exception:
-        limit = 50
-    try:
-        wait_s = int(request.args.get("wait", "0"))
-    except Exception:
-        wait_s = 0
+    since, limit, wait_s, flt = _pull_args(request.args.get)
 
-    items = _slice_since(since, limit)
+    def result(items, hw):
+        return ok(**_pull_result(since, limit, flt, items, hw))
+
+    hw = _high_water()
+    items = _slice_since(since, limit, flt)
     if items or wait_s <= 0:
-        last_id = items[-1]["id"] if items else since
-        return ok(notifications=items, last_id=last_id)
+        return result(items, hw)
 
-    # Long-poll wait
-    end = time.time() + max(1, min(wait_s, 30))
-    with _cv:
-        while time.time() < end:
-            # Re-check
-            items = _slice_since(since, limit)
+    # Long-poll wait: woken only by pushes that match this filter
+    ev = threading.Event()
+    group = _router.subscribe(flt, ev)
+    try:
+        end = time.time() + wait_s
+        while True:
+            hw = _high_water()
+            items = _slice_since(since, limit, flt)
             if items:
                 break
             remaining = end - time.time()
             if remaining <= 0:
                 break
-            _cv.wait(timeout=remaining)
-    last_id = items[-1]["id"] if items else since
-    return ok(notifications=items, last_id=last_id)
+            ev.wait(timeout=remaining)
+            ev.clear()
+    finally:
+        _router.unsubscribe(group, ev)
+    return result(items, hw)
 
 @app.route("/api/notify/stream", methods=["GET"])
 def api_stream():
@@ -144,6 +338,7 @@ def api_stream():
     Optional query params:
       ?since=<id>  start by sending buffered items after <id>
       ?heartbeat=<seconds> override heartbeat interval
+      ?user= ?source= ?level>= ?level=  server-side filters (globs allowed)
     """
     try:
         since = int(request.args.get("since", "0"))
@@ -153,32 +348,46 @@ def api_stream():
         hb = int(request.args.get("heartbeat", str(HEARTBEAT_EVERY)))
     except Exception:
         hb = HEARTBEAT_EVERY
+    hb = min(max(hb, 1), 300)   # 0/negative would spin the ping loop
+    flt = notify_filter.Filter.from_args(request.args.get)
 
     def gen():
-        last_sent = time.time()
-        # On connect: flush buffered items after 'since'
-        items = _slice_since(since, RING_SIZE)
-        for n in items:
-            yield f"data: {json.dumps(n)}\n\n"
+        last_id = since
 
-        # Then wait for new
-        last_id = items[-1]["id"] if items else since
-        while True:
-            # Heartbeat if idle
-            if time.time() - last_sent >= hb:
-                yield "event: ping\ndata: {}\n\n"
-                last_sent = time.time()
-
-            with _cv:
-                # Check if new items exist
-                fresh = _slice_since(last_id, RING_SIZE)
-                if fresh:
-                    for n in fresh:
-                        yield f"data: {json.dumps(n)}\n\n"
-                        last_id = n["id"]
-                        last_sent = time.time()
-                else:
-                    _cv.wait(timeout=1.0)
+        def catch_up(after_id):
+            # Every item after after_id, a page at a time: a replay from the segment
+            # log (or a burst between wakes) can be longer than one RING_SIZE page
+            nonlocal last_id
+            last_id = after_id
+            while True:
+                hw = _high_water()
+                page = _slice_since(last_id, RING_SIZE, flt)
+                for n in page:
+                    yield f"data: {json.dumps(n)}\n\n"
+                last_id = _scan_cursor(last_id, page, RING_SIZE, hw)
+                if len(page) < RING_SIZE:
+                    return
+
+        ev = threading.Event()
+        group = _router.subscribe(flt, ev)   # before the replay, so no push is missed
+        try:
+            # On connect: send everything after 'since' before waiting
+            yield from catch_up(since)
+            last_sent = time.time()
+
+            # Then wait for new ones (only matching pushes set 'ev')
+            while True:
+                idle = time.time() - last_sent
+                if not ev.wait(timeout=max(0.0, hb - idle)):
+                    yield "event: ping\ndata: {}\n\n"
+                    last_sent = time.time()
+                    continue
+                ev.clear()
+                for frame in catch_up(last_id):
+                    yield frame
+                    last_sent = time.time()
+        finally:
+            _router.unsubscribe(group, ev)
 
     headers = {
         "Content-Type": "text/event-stream",
@@ -187,6 +396,12 @@ def api_stream():
     }
     return Response(gen(), headers=headers)
 
+@app.route("/api/notify/log/stats", methods=["GET"])
+def api_log_stats():
+    if _log is None:
+        return ok(durable=False)
+    return ok(durable=True, log=_log.stats())
+
 # ===== Convenience & Test =====
 @app.route("/api/notify/test", methods=["POST", "GET"])
 def api_test():
@@ -197,7 +412,7 @@ def api_test():
 @app.after_request
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return resp
 
@@ -210,4 +425,8 @@ if __name__ == "__main__":
     #   GET  http://127.0.0.1:5069/api/notify/pull?since=0&limit=50
     #   GET  http://127.0.0.1:5069/api/notify/stream
     #   POST http://127.0.0.1:5069/api/notify/test
+    #   GET  http://127.0.0.1:5069/api/notify/log/stats
+    # For thousands of SSE or long-poll clients, serve through the asyncio server instead:
+    #   python matrix-OS-A46-notify-async.py
+    loader.startup()
     app.run(host="127.0.0.1", port=5069, debug=True)
@@ -3,10 +3,27 @@ matrix-os-A3-security clearance system
 # Matrix Operating System Security Clearance Module
 # Matrix Instruction Manual, ARM Index, Volume 1
 
+import bisect
 import hashlib
+import heapq
+import importlib.util
+import sys
 import json
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
 
 # Define user security clearance levels
 SECURITY_LEVELS = {
@@ -16,8 +33,243 @@ SECURITY_LEVELS = {
     4: "Root Access"
 }
 
+# ===== Session limits =====
+SESSION_IDLE_TTL = 30 * 60          # seconds without a verify before a session expires
+SESSION_ABSOLUTE_TTL = 12 * 3600    # hard lifetime from creation
+MAX_SESSIONS = 100000               # least recently used sessions are evicted past this
+EXPIRE_BATCH = 256                  # expired sessions reclaimed per create/verify call
+LIST_LIMIT = 100                    # default page size for page_sessions()
+
+# ===== Session backend =====
+# "sqlite": one WAL database shared by every process that loads this module (A49),
+#           so tokens issued by A11 verify in A7 and in extra worker processes.
+# "memory": per-process SessionStore below (single-process deployments).
+SESSION_BACKEND = "sqlite"
+SESSION_DB = str(APP_DIR / "matrix_os_sessions.sqlite3")
+
+# ===== Token mode =====
+# "opaque": random token, looked up in the session backend on every verify.
+# "signed": A50 HMAC token carrying user, level and expiry, verified locally with
+#           no I/O; revocations are screened by a Bloom filter. Signed tokens have
+#           no idle timeout, only SIGNED_TOKEN_TTL.
+TOKEN_MODE = "opaque"
+SIGNED_TOKEN_TTL = 8 * 3600
+SESSION_KEY_FILE = APP_DIR / "matrix_os_session.key"   # shared HMAC key (created on first use)
+
+
+class Session:
+    """Compact session record (slots instead of a per-session dict)."""
+    __slots__ = ("token", "username", "level", "created", "last_seen", "seq")
+
+    def __init__(self, token, username, level, now, seq):
+        self.token = token
+        self.username = username
+        self.level = level
+        self.created = now
+        self.last_seen = now
+        self.seq = seq
+
+    def deadline(self, idle_ttl, absolute_ttl):
+        return min(self.last_seen + idle_ttl, self.created + absolute_ttl)
+
+    def to_dict(self):
+        return {
+            "username": self.username,
+            "level": self.level,
+            "token": self.token,
+            "created": datetime.fromtimestamp(self.created).isoformat(),
+            "last_seen": datetime.fromtimestamp(self.last_seen).isoformat(),
+            "status": "Active"
+        }
+
+
+class SessionStore:
+    """
+    Active sessions keyed by token, with idle and absolute expiry.
+
+    Expiry is driven by a min-heap of (deadline, seq, token). A verify only
+    updates last_seen; when a heap entry comes due its real deadline is
+    recomputed and the entry is pushed back if the session was used since,
+    so the heap holds about one entry per session. Revoked, expired and
+    evicted sessions are removed outright. Past 'capacity' the least
+    recently verified session is evicted (the OrderedDict is kept in LRU order).
+    """
+
+    def __init__(self, idle_ttl=SESSION_IDLE_TTL, absolute_ttl=SESSION_ABSOLUTE_TTL,
+                 capacity=MAX_SESSIONS):
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()   # token -> Session, least recently used first
+        self._heap = []                  # (deadline, seq, token)
+        self._seqs = []                  # creation order for paging (may hold removed seqs)
+        self._by_seq = {}                # seq -> Session
+        self._seq = 0
+        self.expired = 0
+        self.evicted = 0
+        self.revoked = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, token):
+        return self.get(token) is not None
+
+    # ---------- Internal (caller holds _lock) ----------
+    def _remove(self, token):
+        sess = self._sessions.pop(token, None)
+        if sess is not None:
+            self._by_seq.pop(sess.seq, None)
+        return sess
+
+    def _alive(self, sess, now):
+        return now < sess.deadline(self.idle_ttl, self.absolute_ttl)
+
+    def _expire_due(self, now, budget=EXPIRE_BATCH):
+        heap = self._heap
+        while heap and heap[0][0] <= now and budget > 0:
+            _, seq, token = heapq.heappop(heap)
+            budget -= 1
+            sess = self._sessions.get(token)
+            if sess is None or sess.seq != seq:
+                continue                  # already revoked or evicted
+            deadline = sess.deadline(self.idle_ttl, self.absolute_ttl)
+            if deadline <= now:
+                self._remove(token)
+                self.expired += 1
+            else:
+                heapq.heappush(heap, (deadline, seq, token))
+        # Drop heap entries and paging seqs left behind by removed sessions
+        if len(heap) > 2 * len(self._sessions) + 64:
+            self._heap = [e for e in heap
+                          if e[2] in self._sessions and self._sessions[e[2]].seq == e[1]]
+            heapq.heapify(self._heap)
+        if len(self._seqs) > 2 * len(self._by_seq) + 64:
+            self._seqs = [q for q in self._seqs if q in self._by_seq]
+
+    # ---------- Public ----------
+    def add(self, token, username, level):
+        now = time.time()
+        with self._lock:
+            self._expire_due(now)
+            self._remove(token)
+            while len(self._sessions) >= self.capacity:
+                _, oldest = self._sessions.popitem(last=False)
+                self._by_seq.pop(oldest.seq, None)
+                self.evicted += 1
+            self._seq += 1
+            sess = Session(token, username, level, now, self._seq)
+            self._sessions[token] = sess
+            self._by_seq[sess.seq] = sess
+            self._seqs.append(sess.seq)
+            heapq.heappush(self._heap, (sess.deadline(self.idle_ttl, self.absolute_ttl), sess.seq, token))
+        return sess
+
+    def get(self, token, touch=False):
+        """The live session for token (refreshing its idle timer if touch), else None."""
+        now = time.time()
+        with self._lock:
+            self._expire_due(now)
+            sess = self._sessions.get(token)
+            if sess is None:
+                return None
+            if not self._alive(sess, now):
+                self._remove(token)
+                self.expired += 1
+                return None
+            if touch:
+                sess.last_seen = now
+                self._sessions.move_to_end(token)
+            return sess
+
+    def revoke(self, token):
+        with self._lock:
+            if self._remove(token) is None:
+                return False
+            self.revoked += 1
+            return True
+
+    def page(self, username=None, level=None, cursor=0, limit=LIST_LIMIT):
+        """
+        Live sessions in creation order after 'cursor' (a seq from a previous
+        page), optionally filtered by username and/or level name.
+        Returns (sessions, next_cursor or None).
+        """
+        now = time.time()
+        out = []
+        with self._lock:
+            self._expire_due(now)
+            i = bisect.bisect_right(self._seqs, cursor)
+            last = cursor
+            for seq in self._seqs[i:]:
+                sess = self._by_seq.get(seq)
+                if sess is None or not self._alive(sess, now):
+                    continue
+                last = seq
+                if username is not None and sess.username != username:
+                    continue
+                if level is not None and sess.level != level:
+                    continue
+                out.append(sess.to_dict())
+                if len(out) >= limit:
+                    return out, last
+        return out, None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "active": len(self._sessions),
+                "capacity": self.capacity,
+                "heap": len(self._heap),
+                "expired": self.expired,
+                "evicted": self.evicted,
+                "revoked": self.revoked,
+                "idle_ttl": self.idle_ttl,
+                "absolute_ttl": self.absolute_ttl,
+            }
+
+
+def make_store(backend=SESSION_BACKEND, path=SESSION_DB):
+    """
+    Build a session backend; both kinds share the SessionStore interface.
+    """
+    if backend == "memory":
+        return SessionStore()
+    if backend == "sqlite":
+        store_mod = load_module("matrix_os_a49_session_store", "matrix-OS-A49-session-store.py")
+        return store_mod.SqliteSessionStore(path, Session, SESSION_IDLE_TTL,
+                                            SESSION_ABSOLUTE_TTL, MAX_SESSIONS)
+    raise ValueError(f"Unknown session backend: {backend}")
+
 # Store active sessions
-active_sessions = {}
+active_sessions = make_store()
+load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py").register(
+    "A3.active_sessions", lambda: len(active_sessions))
+
+# Signed-token support (A50); key and revocation list are opened on first use
+tokens = loader.lazy("matrix_os_a50_session_tokens", "matrix-OS-A50-session-tokens.py")
+_signer = None
+_revocations = None
+_signed_lock = threading.Lock()
+
+def _signed():
+    global _signer, _revocations
+    if _signer is None:
+        with _signed_lock:
+            if _signer is None:
+                _revocations = tokens.RevocationList(SESSION_DB)
+                _signer = tokens.TokenSigner(tokens.load_secret(SESSION_KEY_FILE), SIGNED_TOKEN_TTL)
+    return _signer, _revocations
+
+def _signed_claims(token):
+    """Claims of a valid, unrevoked signed token, else None."""
+    signer, revocations = _signed()
+    claims = signer.decode(token)
+    if claims is None or revocations.is_revoked(claims["jti"]):
+        return None
+    return claims
 
 def generate_security_token(username, level):
     """
@@ -28,46 +280,140 @@ def generate_security_token(username, level):
 
 def create_session(username, level):
     """
-    Create and store a new active session for a verified user.
+    Create a new active session for a verified user (stored, or signed per TOKEN_MODE).
     """
+    level_name = SECURITY_LEVELS.get(level, "Unknown")
+    if TOKEN_MODE == "signed":
+        signer, _ = _signed()
+        token, claims = signer.issue(username, level_name)
+        return {
+            "username": username,
+            "level": level_name,
+            "token": token,
+            "created": datetime.fromtimestamp(claims["iat"]).isoformat(),
+            "expires": datetime.fromtimestamp(claims["exp"]).isoformat(),
+            "status": "Active"
+        }
     token = generate_security_token(username, level)
-    session = {
-        "username": username,
-        "level": SECURITY_LEVELS.get(level, "Unknown"),
-        "token": token,
-        "created": datetime.now().isoformat(),
-        "status": "Active"
-    }
-    active_sessions[token] = session
-    return session
+    sess = active_sessions.add(token, username, level_name)
+    return sess.to_dict()
 
 def verify_session(token):
     """
-    Verify if a session token is valid and still active.
+    Verify if a session token is valid and still active (refreshes its idle timer).
     """
-    return token in active_sessions and active_sessions[token]["status"] == "Active"
+    if not isinstance(token, str):
+        return False
+    if token.startswith(tokens.TOKEN_PREFIX):
+        return _signed_claims(token) is not None
+    return active_sessions.get(token, touch=True) is not None
 
 def revoke_session(token):
     """
     Revoke (end) a session if it exists.
     """
-    if token in active_sessions:
-        active_sessions[token]["status"] = "Revoked"
-        return True
-    return False
+    if not isinstance(token, str):
+        return False
+    if token.startswith(tokens.TOKEN_PREFIX):
+        claims = _signed()[0].decode(token)
+        return claims is not None and _revocations.revoke(claims["jti"], claims["exp"])
+    return active_sessions.revoke(token)
+
+def session_user(token):
+    """
+    Username behind a valid session token (either kind), else None.
+    """
+    if not isinstance(token, str):
+        return None
+    if token.startswith(tokens.TOKEN_PREFIX):
+        claims = _signed_claims(token)
+        return claims["sub"] if claims is not None else None
+    sess = active_sessions.get(token, touch=True)
+    return sess.username if sess is not None else None
 
 def list_sessions():
     """
-    Display all active sessions.
+    Display all active sessions (JSON text keyed by token, as always).
+    Use page_sessions() to read them a page at a time.
+    """
+    everything, cursor = {}, 0
+    while cursor is not None:
+        sessions, cursor = active_sessions.page(cursor=cursor, limit=LIST_LIMIT)
+        everything.update((s["token"], s) for s in sessions)
+    return json.dumps(everything, indent=4)
+
+def page_sessions(username=None, level=None, cursor=0, limit=LIST_LIMIT):
     """
-    return json.dumps(active_sessions, indent=4)
+    One page of active sessions, oldest first:
+      {"sessions": [...], "next_cursor": <pass back as cursor> or None, "total": N}
+    Signed tokens are not stored, so they are not listed.
+    """
+    sessions, next_cursor = active_sessions.page(username, level, cursor, limit)
+    return {"sessions": sessions, "next_cursor": next_cursor, "total": len(active_sessions)}
+
+def session_stats():
+    """
+    Counters for the session backend (active, expired, evicted, revoked).
+    """
+    stats = active_sessions.stats()
+    stats["token_mode"] = TOKEN_MODE
+    if _revocations is not None:
+        stats["revocations"] = _revocations.stats()
+    return stats
+
+def bench_verify(n=20000):
+    """
+    Verify throughput per token mode: in-memory dict store, SQLite store, and
+    signed tokens (1% of them revoked). The SQLite store, key and revocation
+    list live in a temp directory, never in SESSION_DB.
+    """
+    import tempfile
+
+    def rate(check, toks):
+        start = time.perf_counter()
+        for t in toks:
+            check(t)
+        return len(toks) / (time.perf_counter() - start)
+
+    results = {}
+    memory = make_store("memory")
+    toks = [generate_security_token(f"user{i}", i) for i in range(n)]
+    for t in toks:
+        memory.add(t, "bench", "Developer")
+    results["memory"] = rate(lambda t: memory.get(t, touch=True), toks)
+
+    with tempfile.TemporaryDirectory(prefix="matrix_os_bench_") as tmp:
+        bench_db = str(Path(tmp) / "bench_sessions.sqlite3")
+        shared = make_store("sqlite", bench_db)
+        for t in toks[:2000]:
+            shared.add(t, "bench", "Developer")
+        results["sqlite"] = rate(lambda t: shared.get(t, touch=True), toks[:2000])
+
+        signer = tokens.TokenSigner(tokens.load_secret(Path(tmp) / "bench.key"), SIGNED_TOKEN_TTL)
+        revocations = tokens.RevocationList(bench_db)
+        signed = [signer.issue(f"user{i}", "Developer")[0] for i in range(n)]
+        for t in signed[::100]:
+            claims = signer.decode(t)
+            revocations.revoke(claims["jti"], claims["exp"])
+
+        def check(t):
+            claims = signer.decode(t)
+            return claims is not None and not revocations.is_revoked(claims["jti"])
+        results["signed"] = rate(check, signed)
+    return {k: round(v) for k, v in results.items()}
 
 # Example test
 if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench":
+        # python matrix-OS-A3-security.py --bench [N]   verifies/s per token mode
+        print("Verify throughput (/s):", bench_verify(int(sys.argv[2]) if len(sys.argv) > 2 else 20000))
+        sys.exit(0)
     user = "Admin"
     level = 3  # Developer level
     session = create_session(user, level)
     print("Session Created ✅")
     print(json.dumps(session, indent=4))
-    print("\nAll Active Sessions:")
-    print(list_sessions())
+    print("\nActive Sessions (first page):")
+    print(json.dumps(page_sessions(limit=10), indent=4))
+    print("\nStore:", session_stats())
@@ -15,46 +15,60 @@ matrix-os A40 permission file
 from flask import Flask, request, jsonify
 from pathlib import Path
 import sqlite3
-from contextlib import closing
+import importlib.util
+import sys
 
 APP = Flask(__name__)
 
 APP_DIR = Path(__file__).parent.resolve()
 DB_PATH = APP_DIR / "matrix_rbac.sqlite3"
 
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(APP, "A42-permission")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(APP, "A42-permission")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(APP, "A42-permission")
+
+# Shared pooled connections (WAL, statement cache) from A45
+dbpool = load_module("matrix_os_a45_dbpool", "matrix-OS-A45-dbpool.py")
+
 # ---------- DB utils ----------
+def pool():
+    return dbpool.get_pool(DB_PATH, sqlite3.Row)
+
 def db():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Borrow a pooled connection: with db() as conn: ..."""
+    return pool().connection()
 
 def rows(q, args=()):
-    with closing(db()) as conn:
-        cur = conn.execute(q, args)
-        return [dict(r) for r in cur.fetchall()]
+    return [dict(r) for r in pool().rows(q, args)]
 
 def one(q, args=()):
-    with closing(db()) as conn:
-        cur = conn.execute(q, args)
-        r = cur.fetchone()
-        return dict(r) if r else None
+    r = pool().one(q, args)
+    return dict(r) if r else None
 
 def exec_(q, args=()):
-    with closing(db()) as conn:
-        cur = conn.execute(q, args)
-        conn.commit()
-        return cur.lastrowid
+    return pool().execute(q, args).lastrowid
 
 def ok(**kw): return jsonify({"ok": True, **kw})
 def err(msg, code=400): return jsonify({"ok": False, "error": msg}), code
 
 # ---------- Init ----------
+@loader.on_startup
 def init_db():
-    with closing(db()) as conn:
+    with pool().transaction() as conn:
         c = conn.cursor()
         c.executescript("""
-        PRAGMA foreign_keys=ON;
-
         CREATE TABLE IF NOT EXISTS roles(
           id INTEGER PRIMARY KEY AUTOINCREMENT,
           name TEXT UNIQUE NOT NULL
@@ -80,7 +94,6 @@ def init_db():
           FOREIGN KEY(role_id) REFERENCES roles(id) ON DELETE CASCADE
         );
         """)
-        conn.commit()
 
         # Seed some sensible defaults
         def ensure_role(name):
@@ -105,9 +118,9 @@ def init_db():
             "backup.exec", "logistics.exec", "diagnostics.exec"
         ):
             ensure_perm(p)
-        conn.commit()
 
-init_db()
+# Schema and seed rows are created by loader.startup(), not at import
+APP.before_request(loader.startup)
 
 # ---------- Helpers ----------
 def get_id(table, name):
@@ -224,11 +237,15 @@ def export_all():
         """)
     )
 
+@APP.get("/api/rbac/db/stats")
+def db_stats():
+    return ok(pools=dbpool.stats())
+
 # ---------- CORS ----------
 @APP.after_request
 def cors(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return resp
 
@@ -241,4 +258,5 @@ if __name__ == "__main__":
     #   curl -X POST localhost:5072/api/rbac/role/grant -H "Content-Type: application/json" -d '{"role":"operator","perm":"analytics.read"}'
     #   curl -X POST localhost:5072/api/rbac/user/assign -H "Content-Type: application/json" -d '{"user":"Admin","role":"operator"}'
     #   curl "localhost:5072/api/rbac/check?user=Admin&perm=analytics.read"
+    loader.startup()
     APP.run(host="127.0.0.1", port=5072, debug=True)
@@ -0,0 +1,319 @@
+matrix-os A45 dbpool system
+# matrix-OS-A45-dbpool.py
+# Matrix Windows - Shared SQLite Access Layer
+# Check-out/check-in connection pool (WAL + tuned pragmas) used by A5, A18, A20, A42
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# ===== Config =====
+POOL_SIZE = 16                 # connections per database file; further callers wait for a free one
+BUSY_TIMEOUT_MS = 5000         # wait on a locked DB (or a busy pool) instead of failing at once
+STATEMENT_CACHE = 256          # prepared statements kept per connection
+CACHE_SIZE_KB = 16384          # page cache per connection (negative pragma = KiB)
+MMAP_SIZE = 64 * 1024 * 1024   # memory-mapped reads
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}",
+    f"PRAGMA cache_size=-{CACHE_SIZE_KB}",
+    f"PRAGMA mmap_size={MMAP_SIZE}",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA foreign_keys=ON",
+)
+
+
+class Pool:
+    """
+    Up to 'size' tuned SQLite connections per database, checked out for
+    one operation and returned afterwards. Werkzeug's threaded server runs
+    every request on a new thread, so connections are not tied to threads:
+    each request borrows an already opened and tuned connection (with its
+    prepared-statement cache) and gives it back in a finally. The most
+    recently returned connection is handed out first. A connection is used
+    by one thread at a time but moves between threads, hence
+    check_same_thread=False. A forked worker process opens its own
+    connections instead of reusing the parent's.
+    """
+
+    def __init__(self, path, row_factory=None, size=POOL_SIZE):
+        self.path = str(path)
+        self.row_factory = row_factory
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._all = set()              # open connections, idle or checked out
+        self._opening = 0              # connections being opened right now (count toward size)
+        self._lock = threading.Lock()  # guards _all and the counters below
+        self._pid = os.getpid()
+        self.opened = 0
+        self.reused = 0
+        self.waited = 0                # check-outs that had to wait for a free connection
+        self.queries = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    # ---------- Connections ----------
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000,
+                               cached_statements=STATEMENT_CACHE, check_same_thread=False)
+        try:
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+        except sqlite3.Error:
+            conn.close()
+            raise
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        return conn
+
+    def _checkout(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked: connections inherited from the parent must not be used here
+                self._idle, self._all, self._pid = queue.LifoQueue(), set(), os.getpid()
+            idle = self._idle
+            try:
+                conn = idle.get_nowait()
+                self.reused += 1
+                return conn
+            except queue.Empty:
+                grow = len(self._all) + self._opening < self.size
+                if grow:
+                    self._opening += 1     # reserve the slot while connecting outside the lock
+                else:
+                    self.waited += 1
+        if not grow:
+            try:
+                conn = idle.get(timeout=BUSY_TIMEOUT_MS / 1000)
+            except queue.Empty:
+                raise sqlite3.OperationalError(
+                    f"All {self.size} connections to {self.path} are in use") from None
+            with self._lock:
+                self.reused += 1
+            return conn
+        try:
+            conn = self._open()
+        except BaseException:
+            with self._lock:
+                self._opening -= 1
+            raise
+        with self._lock:
+            self._opening -= 1
+            self._all.add(conn)
+            self.opened += 1
+        return conn
+
+    def _checkin(self, conn):
+        if conn.in_transaction:
+            conn.rollback()   # never hand the next borrower someone else's open transaction
+        with self._lock:
+            pooled = conn in self._all and self._pid == os.getpid()
+            if pooled:
+                self._idle.put(conn)
+        if not pooled:
+            conn.close()      # close_all() ran while it was checked out
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for a few statements:
+            with pool.connection() as conn:
+                conn.execute(...)
+        Commits are up to the caller (see transaction()).
+        """
+        conn = self._checkout()
+        try:
+            yield conn
+        finally:
+            self._checkin(conn)
+
+    def close_all(self):
+        """
+        Close every pooled connection (use at shutdown or before deleting the file).
+        Connections checked out right now are closed when they are returned.
+        """
+        with self._lock:
+            self._all.clear()
+            idle, self._idle = self._idle, queue.LifoQueue()
+        while True:
+            try:
+                idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    # ---------- Queries ----------
+    def _record(self, start, failed):
+        ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self.queries += 1
+            self.errors += failed
+            self.total_ms += ms
+            if ms > self.max_ms:
+                self.max_ms = ms
+
+    def _timed(self, fn):
+        start = time.perf_counter()
+        failed = False
+        try:
+            with self.connection() as conn:
+                return fn(conn)
+        except sqlite3.Error:
+            failed = True
+            raise
+        finally:
+            self._record(start, failed)
+
+    def rows(self, q, args=()):
+        return self._timed(lambda conn: conn.execute(q, args).fetchall())
+
+    def one(self, q, args=()):
+        return self._timed(lambda conn: conn.execute(q, args).fetchone())
+
+    def execute(self, q, args=()):
+        """
+        Run one write statement in its own transaction; returns the cursor
+        (read lastrowid/rowcount from it; fetch results with rows()/one()).
+        """
+        def run(conn):
+            with conn:
+                return conn.execute(q, args)
+        return self._timed(run)
+
+    def executemany(self, q, seq):
+        def run(conn):
+            with conn:
+                return conn.executemany(q, seq)
+        return self._timed(run)
+
+    def script(self, sql):
+        return self._timed(lambda conn: conn.executescript(sql))
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """
+        Group several statements into one commit:
+            with pool.transaction() as conn:
+                conn.execute(...)
+        immediate=True takes the write lock up front (BEGIN IMMEDIATE), so
+        values read inside cannot be changed by another process before the commit.
+        """
+        start = time.perf_counter()
+        failed = False
+        try:
+            with self.connection() as conn:
+                if immediate:
+                    conn.execute("BEGIN IMMEDIATE")
+                with conn:
+                    yield conn
+        except sqlite3.Error:
+            failed = True
+            raise
+        finally:
+            self._record(start, failed)
+
+    # ---------- Stats ----------
+    def stats(self):
+        with self._lock:
+            open_conns = len(self._all)
+            return {
+                "path": self.path,
+                "size": self.size,
+                "open_connections": open_conns,
+                "idle_connections": self._idle.qsize(),
+                "opened": self.opened,
+                "reused": self.reused,
+                "waited": self.waited,
+                "queries": self.queries,
+                "errors": self.errors,
+                "avg_ms": round(self.total_ms / self.queries, 4) if self.queries else 0.0,
+                "max_ms": round(self.max_ms, 4),
+            }
+
+
+# ===== Process-wide registry =====
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(path, row_factory=None):
+    """
+    Shared pool for a database file (one per path and row factory per process).
+    """
+    key = (str(path), row_factory)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = Pool(path, row_factory=row_factory)
+        return pool
+
+def stats():
+    """
+    Counters for every pool opened in this process.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [p.stats() for p in pools]
+
+
+# ===== Keyset pagination =====
+# Pages walk the integer primary key instead of OFFSET, so page N costs the
+# same as page 1 when an index ends in the id column.
+
+def keyset_query(base, clauses, params, limit, before_id=None, after_id=None, id_col="id"):
+    """
+    Build a newest-first page query.
+      before_id -> rows older than this id (the usual "next page")
+      after_id  -> rows newer than this id (fetched oldest-first, see keyset_page)
+    'base' is "SELECT ... FROM table" and must select the id column first.
+    """
+    clauses, params = list(clauses), list(params)
+    if before_id is not None:
+        clauses.append(f"{id_col} < ?")
+        params.append(before_id)
+    if after_id is not None:
+        clauses.append(f"{id_col} > ?")
+        params.append(after_id)
+    q = base
+    if clauses:
+        q += " WHERE " + " AND ".join(clauses)
+    forward = after_id is not None and before_id is None
+    q += f" ORDER BY {id_col} {'ASC' if forward else 'DESC'} LIMIT ?"
+    params.append(limit)
+    return q, tuple(params)
+
+def keyset_page(rows, limit, before_id=None, after_id=None, id_of=lambda r: r[0]):
+    """
+    Order a fetched page newest-first and compute its continuation cursor.
+    next_cursor continues in the direction of the request: pass it back as
+    before_id when paging older, or as after_id when paging newer. It is
+    None once a page comes back short.
+    """
+    forward = after_id is not None and before_id is None
+    rows = list(rows)
+    if forward:
+        rows.reverse()
+    next_cursor = None
+    if rows and len(rows) >= limit:
+        next_cursor = id_of(rows[0]) if forward else id_of(rows[-1])
+    return rows, next_cursor
+
+
+# --- Example test ---
+if __name__ == "__main__":
+    import os
+    import tempfile
+    path = os.path.join(tempfile.mkdtemp(), "pool-demo.sqlite3")
+    pool = get_pool(path)
+    pool.execute("CREATE TABLE IF NOT EXISTS kv (k TEXT PRIMARY KEY, v TEXT)")
+    with pool.transaction() as conn:
+        for i in range(100):
+            conn.execute("INSERT OR REPLACE INTO kv VALUES (?, ?)", (f"k{i}", str(i)))
+    print("Journal mode:", pool.one("PRAGMA journal_mode")[0])
+    print("Rows:", pool.one("SELECT COUNT(*) FROM kv")[0])
+    print("Stats:", stats())
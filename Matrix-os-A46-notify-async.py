@@ -0,0 +1,549 @@
+matrix-os A46 notify async system
+# matrix-OS-A46-notify-async.py
+# Matrix Windows — Notifications asyncio server (SSE fan-out and long-poll for A26)
+# One event loop holds every /api/notify/stream client and waiting /api/notify/pull; other A26 routes run on its Flask app
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import asyncio
+import importlib.util
+import io
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# A26 owns the ring buffer and push(); this server only changes how clients are served
+notify = load_module("matrix_os_a26_notifications", "matrix-OS-A26-authentication.py")
+
+# ===== Config =====
+HOST = "127.0.0.1"
+PORT = 5069                         # same port as the threaded A26 server
+HEARTBEAT_EVERY = notify.HEARTBEAT_EVERY
+MAX_CLIENT_BUFFER = 256 * 1024      # bytes queued for one client before it is dropped as too slow
+WSGI_THREADS = 8                    # worker threads for the non-streaming Flask routes
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024       # larger request bodies are refused with 413
+
+PING_FRAME = b"event: ping\ndata: {}\n\n"
+SSE_HEAD = (
+    b"HTTP/1.1 200 OK\r\n"
+    b"Content-Type: text/event-stream\r\n"
+    b"Cache-Control: no-cache\r\n"
+    b"X-Accel-Buffering: no\r\n"
+    b"Access-Control-Allow-Origin: *\r\n"
+    b"Connection: close\r\n\r\n"
+)
+
+def _frame(n):
+    return ("data: " + json.dumps(n) + "\n\n").encode()
+
+
+class _Sub:
+    __slots__ = ("writer", "last_id", "group", "replaying")
+
+    def __init__(self, writer, last_id):
+        self.writer = writer
+        self.last_id = last_id
+        self.group = None
+        self.replaying = True   # publish() leaves the client alone until add() has caught it up
+
+
+class Broadcaster:
+    """
+    Fans each notification out to every SSE subscriber from the event loop.
+    A notification is serialized once into a shared frame; heartbeats come
+    from one loop timer instead of a wait per connection. Subscribers are
+    grouped by filter in an A48 Router, so a push only visits matching groups.
+    Long-poll pulls wait on a future in a second Router, resolved by the
+    same publish().
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.subs = {}                 # writer -> _Sub
+        self.router = notify.notify_filter.Router()
+        self.waiters = notify.notify_filter.Router()   # long-poll futures
+        self._frames = OrderedDict()   # id -> encoded frame, for replays
+        self.published = 0
+        self.writes = 0
+        self.dropped = 0
+        self.peak = 0
+        self.waiting = 0
+        self.peak_waiting = 0
+        self.polls_woken = 0
+
+    def attach(self, loop):
+        self.loop = loop
+        notify.add_listener(self._from_push)
+        loop.call_later(HEARTBEAT_EVERY, self._heartbeat)
+
+    # ---------- Producer side ----------
+    def _from_push(self, n):
+        # Runs on the pushing thread while A26 holds _cv: just hand off
+        try:
+            self.loop.call_soon_threadsafe(self.publish, n)
+        except RuntimeError:
+            notify.remove_listener(self._from_push)   # loop has shut down
+
+    def _frame_for(self, n):
+        frame = self._frames.get(n["id"])
+        if frame is None:
+            frame = self._frames[n["id"]] = _frame(n)
+            while len(self._frames) > notify.RING_SIZE:
+                self._frames.popitem(last=False)
+        return frame
+
+    def publish(self, n):
+        frame = self._frame_for(n)
+        nid = n["id"]
+        self.published += 1
+        for group in self.router.match(n):
+            for sub in list(group.subs):
+                if sub.last_id < nid and not sub.replaying:   # else sent (or sent soon) by the replay
+                    sub.last_id = nid
+                    self._write(sub, frame)
+        for group in self.waiters.match(n):
+            for fut in list(group.subs):
+                if not fut.done():
+                    fut.set_result(nid)
+                    self.polls_woken += 1
+
+    def _heartbeat(self):
+        for sub in list(self.subs.values()):
+            self._write(sub, PING_FRAME)
+        self.loop.call_later(HEARTBEAT_EVERY, self._heartbeat)
+
+    def _write(self, sub, frame):
+        transport = sub.writer.transport
+        if transport.is_closing():
+            self.remove(sub.writer)
+            return
+        if transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            self.remove(sub.writer)
+            self.dropped += 1
+            transport.abort()
+            return
+        sub.writer.write(frame)
+        self.writes += 1
+
+    # ---------- Subscriber side ----------
+    async def add(self, writer, since, flt=None):
+        """
+        Subscribe, then replay everything after 'since' a RING_SIZE page at a
+        time until a short page comes back. Pages that come from the segment
+        log (disk) are read on the worker pool; the last page is read on the
+        loop, where no publish() can run between it and going live.
+        """
+        sub = self.subs[writer] = _Sub(writer, since)
+        sub.group = self.router.subscribe(flt, sub)
+        self.peak = max(self.peak, len(self.subs))
+        writer.write(SSE_HEAD)
+        page_size = notify.RING_SIZE
+        while True:
+            hw = notify._high_water()
+            if notify._needs_log(sub.last_id):
+                items = await self.loop.run_in_executor(
+                    _wsgi_pool, notify._slice_since, sub.last_id, page_size, flt)
+                last_page = False   # pushes may have arrived meanwhile; check again on the loop
+            else:
+                items = notify._slice_since(sub.last_id, page_size, flt)
+                last_page = len(items) < page_size
+            if writer not in self.subs:
+                return              # dropped while reading
+            writer.write(b"".join(self._frame_for(n) for n in items))
+            sub.last_id = notify._scan_cursor(sub.last_id, items, page_size, hw)
+            if last_page:
+                sub.replaying = False
+                return
+            await writer.drain()
+
+    def remove(self, writer):
+        sub = self.subs.pop(writer, None)
+        if sub is not None and sub.group is not None:
+            self.router.unsubscribe(sub.group, sub)
+
+    # ---------- Long-poll side ----------
+    async def wait(self, flt, timeout):
+        """Sleep until a push matching flt is published, or timeout. True if woken."""
+        fut = self.loop.create_future()
+        group = self.waiters.subscribe(flt, fut)
+        self.waiting += 1
+        self.peak_waiting = max(self.peak_waiting, self.waiting)
+        try:
+            await asyncio.wait_for(fut, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.waiting -= 1
+            self.waiters.unsubscribe(group, fut)
+
+    def stats(self):
+        return {
+            "subscribers": len(self.subs),
+            "waiting_pulls": self.waiting,
+            "peak_waiting_pulls": self.peak_waiting,
+            "polls_woken": self.polls_woken,
+            "router": self.router.stats(),
+            "peak_subscribers": self.peak,
+            "published": self.published,
+            "writes": self.writes,
+            "dropped_slow": self.dropped,
+            "threads": threading.active_count(),
+        }
+
+
+broadcaster = Broadcaster()
+_wsgi_pool = ThreadPoolExecutor(max_workers=WSGI_THREADS, thread_name_prefix="a46-wsgi")
+
+# ===== HTTP =====
+def _call_wsgi(method, url, headers, body, peer=None):
+    """Run one request through A26's Flask app (on a worker thread); peer is the client (host, port)."""
+    environ = {
+        "REQUEST_METHOD": method,
+        "SCRIPT_NAME": "",
+        "PATH_INFO": url.path,
+        "QUERY_STRING": url.query,
+        "SERVER_NAME": HOST,
+        "SERVER_PORT": str(PORT),
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": "http",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if peer:
+        # Client address, as a WSGI server would set it (A54/A55 only answer loopback)
+        environ["REMOTE_ADDR"], environ["REMOTE_PORT"] = str(peer[0]), str(peer[1])
+    for k, v in headers.items():
+        key = k.upper().replace("-", "_")
+        if key in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            environ[key] = v
+        else:
+            environ["HTTP_" + key] = v
+    out = {}
+
+    def start_response(status, response_headers, exc_info=None):
+        out["status"] = status
+        out["headers"] = response_headers
+
+    result = notify.app(environ, start_response)
+    try:
+        data = b"".join(result)
+    finally:
+        if hasattr(result, "close"):
+            result.close()
+    return out["status"], out["headers"], data
+
+def _response(status, headers, data):
+    lines = [f"HTTP/1.1 {status}"]
+    for k, v in headers:
+        if k.lower() not in ("content-length", "connection"):
+            lines.append(f"{k}: {v}")
+    lines.append(f"Content-Length: {len(data)}")
+    lines.append("Connection: close")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + data
+
+def _json_response(payload, status="200 OK"):
+    return _response(status, [("Content-Type", "application/json"),
+                              ("Access-Control-Allow-Origin", "*")],
+                     json.dumps(payload, sort_keys=True).encode())   # key order as Flask's jsonify
+
+def _int_arg(query, name, default):
+    try:
+        return int(query.get(name, [default])[0])
+    except (TypeError, ValueError):
+        return default
+
+async def _stream(reader, writer, query):
+    flt = notify.notify_filter.Filter.from_args(lambda k: query.get(k, [None])[0])
+    try:
+        await broadcaster.add(writer, _int_arg(query, "since", 0), flt)
+        # Nothing is expected from the client; EOF means it went away
+        while await reader.read(1024):
+            pass
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        broadcaster.remove(writer)
+        writer.close()
+
+async def _pull(writer, query):
+    """
+    /api/notify/pull?wait=: same contract as A26's route, but the wait is a
+    future on the loop instead of a worker thread blocked on an Event.
+    """
+    since, limit, wait_s, flt = notify._pull_args(lambda k: query.get(k, [None])[0])
+    loop = asyncio.get_running_loop()
+    end = loop.time() + wait_s
+    scan_from = since
+    while True:
+        hw = notify._high_water()
+        if notify._needs_log(scan_from):
+            # Segment log read (disk) on the worker pool, off the loop
+            items = await loop.run_in_executor(_wsgi_pool, notify._slice_since, scan_from, limit, flt)
+            if items:
+                break
+            scan_from = max(scan_from, hw)   # nothing up to hw matched; read the rest in memory
+            continue
+        # No await between this read and broadcaster.wait(), and publish() runs
+        # on this loop, so a push cannot slip in unnoticed
+        items = notify._slice_since(scan_from, limit, flt)
+        if items:
+            break
+        remaining = end - loop.time()
+        if remaining <= 0:
+            break
+        await broadcaster.wait(flt, remaining)
+    writer.write(_json_response({"ok": True, **notify._pull_result(since, limit, flt, items, hw)}))
+
+def _body_length(headers):
+    """(Content-Length, None), or (0, (status, error)) when the body must be refused."""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        return 0, ("411 Length Required", "Chunked request bodies are not supported")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        length = -1
+    if length < 0:
+        return 0, ("400 Bad Request", "Invalid Content-Length")
+    if length > MAX_BODY_BYTES:
+        return 0, ("413 Payload Too Large", f"Request body over {MAX_BODY_BYTES} bytes")
+    return length, None
+
+async def handle(reader, writer):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        writer.close()
+        return
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        writer.close()
+        return
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            k, v = line.split(":", 1)
+            headers[k.strip().lower()] = v.strip()
+    url = urlsplit(target)
+    query = parse_qs(url.query)
+
+    try:
+        if method == "GET" and url.path == "/api/notify/stream":
+            await _stream(reader, writer, query)
+            return
+        if method == "GET" and url.path == "/api/notify/async/stats":
+            writer.write(_json_response({"ok": True, "stats": broadcaster.stats()}))
+        elif method == "GET" and url.path == "/api/notify/pull" and _int_arg(query, "wait", 0) > 0:
+            await _pull(writer, query)
+        else:
+            length, refused = _body_length(headers)
+            if refused is not None:
+                writer.write(_json_response({"ok": False, "error": refused[1]}, refused[0]))
+            else:
+                body = await reader.readexactly(length)
+                loop = asyncio.get_running_loop()
+                status, resp_headers, data = await loop.run_in_executor(
+                    _wsgi_pool, _call_wsgi, method, url, headers, body, writer.get_extra_info("peername"))
+                writer.write(_response(status, resp_headers, data))
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+def _raise_fd_limit():
+    """Each SSE client is a socket; lift the soft fd limit to the hard one."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY:
+            hard = 1 << 20
+        if soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError, OSError):
+        pass  # no resource module on Windows, or not permitted
+
+async def serve(host=HOST, port=PORT, ready=None):
+    _raise_fd_limit()
+    broadcaster.attach(asyncio.get_running_loop())
+    server = await asyncio.start_server(handle, host, port, limit=MAX_HEADER_BYTES, backlog=4096)
+    if ready is not None:
+        ready.set()
+    async with server:
+        await server.serve_forever()
+
+
+# ===== Fan-out benchmark =====
+async def _bench_clients(n_clients, n_msgs, port, since):
+    opened, done = [], []
+    expected = n_msgs
+
+    async def client():
+        reader, writer = await asyncio.open_connection(HOST, port)
+        writer.write(f"GET /api/notify/stream?since={since} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+        await reader.readuntil(b"\r\n\r\n")
+        opened.append(1)
+        got = 0
+        while got < expected:
+            line = await reader.readline()
+            if not line:
+                break
+            if line.startswith(b'data: {"id"'):
+                got += 1
+        done.append(time.perf_counter())
+        writer.close()
+
+    tasks = [asyncio.create_task(client()) for _ in range(n_clients)]
+    t0 = time.perf_counter()
+    while len(opened) < n_clients:
+        await asyncio.sleep(0.05)
+    connect_s = time.perf_counter() - t0
+    return tasks, done, connect_s
+
+def bench(n_clients=10000, n_msgs=20, port=PORT + 1000):
+    """
+    Open n_clients SSE connections, push n_msgs notifications and report how
+    long it takes for every client to receive them, plus the thread count.
+    """
+    _raise_fd_limit()
+    ready = threading.Event()
+    threading.Thread(target=lambda: asyncio.run(serve(HOST, port, ready)), daemon=True).start()
+    ready.wait()
+
+    async def run():
+        # Subscribe from the newest id so only the bench messages are counted
+        since = notify._notifs.next_id - 1
+        tasks, done, connect_s = await _bench_clients(n_clients, n_msgs, port, since)
+        t0 = time.perf_counter()
+        for i in range(n_msgs):
+            notify.push("info", f"bench {i}", source="A46")
+        await asyncio.gather(*tasks)
+        fanout_s = max(done) - t0 if done else float("nan")
+        return connect_s, fanout_s
+
+    connect_s, fanout_s = asyncio.run(run())
+    deliveries = n_clients * n_msgs
+    print(f"clients={n_clients} messages={n_msgs}")
+    print(f"connect all: {connect_s:.2f}s")
+    print(f"fan-out: {fanout_s:.3f}s for {deliveries} deliveries ({deliveries / fanout_s:,.0f}/s)")
+    print(f"threads: {threading.active_count()}  stats: {broadcaster.stats()}")
+
+
+# ===== Long-poll benchmark: asyncio vs threaded A26 =====
+POLL_BENCH_WAIT = 30      # ?wait= each benchmark client sends
+POLL_BENCH_SETTLE = 60    # seconds to get every client waiting before giving up
+
+def _start_threaded(port):
+    """A26's own Flask app on werkzeug's thread-per-request server."""
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    srv = make_server(HOST, port, notify.app, threaded=True)
+    srv.socket.listen(4096)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+
+def _waiting(mode):
+    if mode == "async":
+        return broadcaster.waiting
+    return notify._router.stats()["subscribers"]
+
+def bench_poll(n_clients=2000, mode="async", port=PORT + 1001):
+    """
+    Park n_clients long-poll pulls, push one notification and time how long
+    each waiter takes to receive its response. Prints one JSON line.
+    """
+    import psutil
+    _raise_fd_limit()
+    if mode == "async":
+        ready = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(serve(HOST, port, ready)), daemon=True).start()
+        ready.wait()
+    else:
+        _start_threaded(port)
+
+    async def run():
+        since = notify._notifs.next_id - 1
+        done = []
+
+        async def client():
+            try:
+                reader, writer = await asyncio.open_connection(HOST, port)
+                writer.write(f"GET /api/notify/pull?since={since}&wait={POLL_BENCH_WAIT} HTTP/1.1\r\n"
+                             f"Host: x\r\nConnection: close\r\n\r\n".encode())
+                body = await reader.read()
+                writer.close()
+            except OSError:
+                return
+            if b'"bench wake"' in body:
+                done.append(time.perf_counter())
+
+        tasks = [asyncio.create_task(client()) for _ in range(n_clients)]
+        t0 = time.perf_counter()
+        while _waiting(mode) < n_clients and time.perf_counter() - t0 < POLL_BENCH_SETTLE:
+            await asyncio.sleep(0.05)
+        parked, connect_s = _waiting(mode), time.perf_counter() - t0
+        threads = threading.active_count()
+        rss = psutil.Process().memory_info().rss
+        t0 = time.perf_counter()
+        notify.push("info", "bench wake", source="A46")
+        await asyncio.gather(*tasks)
+        lat = sorted(t - t0 for t in done)
+        return {
+            "mode": mode, "clients": n_clients, "parked": parked,
+            "park_s": round(connect_s, 2), "threads": threads,
+            "rss_mib": round(rss / 2**20, 1), "woken": len(lat),
+            "wake_p50_ms": round(lat[len(lat) // 2] * 1000, 1) if lat else None,
+            "wake_p99_ms": round(lat[int(0.99 * (len(lat) - 1))] * 1000, 1) if lat else None,
+            "wake_all_ms": round(lat[-1] * 1000, 1) if lat else None,
+        }
+
+    print(json.dumps(asyncio.run(run())))
+
+def bench_poll_compare(n_clients=2000):
+    """Run bench_poll for each mode in a fresh process and print both results."""
+    import subprocess
+    for mode in ("threaded", "async"):
+        subprocess.run([sys.executable, str(Path(__file__).resolve()),
+                        "--bench-poll", str(n_clients), mode])
+
+
+# ===== Main =====
+if __name__ == "__main__":
+    # Run:
+    #   python matrix-OS-A46-notify-async.py                 serve A26 on :5069
+    #   python matrix-OS-A46-notify-async.py --bench 10000   fan-out benchmark
+    #   python matrix-OS-A46-notify-async.py --bench-poll 2000   long-poll: threaded A26 vs this server
+    # Endpoints: the same as A26, plus
+    #   GET http://127.0.0.1:5069/api/notify/async/stats
+    # GET /api/notify/pull?wait= and /api/notify/stream wait on the loop, not on threads.
+    # Note: in this mode ?heartbeat= is ignored; every client shares HEARTBEAT_EVERY.
+    loader.startup()
+    if len(sys.argv) > 2 and sys.argv[1] == "--bench":
+        bench(int(sys.argv[2]))
+    elif len(sys.argv) > 3 and sys.argv[1] == "--bench-poll":
+        bench_poll(int(sys.argv[2]), sys.argv[3])
+    elif len(sys.argv) > 1 and sys.argv[1] == "--bench-poll":
+        bench_poll_compare(int(sys.argv[2]) if len(sys.argv) > 2 else 2000)
+    else:
+        asyncio.run(serve())
@@ -0,0 +1,343 @@
+matrix-os A47 notify log system
+# matrix-OS-A47-notify-log.py
+# Matrix Windows — Durable notification log for A26
+# Append-only segment files with a sparse id index; replays read through mmap
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import bisect
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from pathlib import Path
+
+# ===== Config =====
+SEGMENT_BYTES = 8 * 1024 * 1024   # roll over to a new segment past this size
+RETAIN_SEGMENTS = 16              # closed segments kept on disk (oldest deleted first)
+RETAIN_SECONDS = None             # optionally also drop segments older than this
+INDEX_EVERY = 64                  # one sparse index entry per this many records
+FSYNC_INTERVAL = 0.05             # group-commit window in seconds
+
+REC = struct.Struct("<QI")        # record header: id, payload length
+IDX = struct.Struct("<QQ")        # index entry: id, byte offset in segment
+
+
+class _Segment:
+    """One .log file (records) plus its .idx file (sparse id -> offset)."""
+
+    def __init__(self, directory, base_id):
+        self.base_id = base_id
+        self.log_path = directory / f"{base_id:020d}.log"
+        self.idx_path = directory / f"{base_id:020d}.idx"
+        self.ids = array("Q")         # sparse index, ascending
+        self.offsets = array("Q")
+        self.size = 0                 # bytes handed to the writer (may be pending)
+        self.written = 0              # bytes actually in the file
+        self.count = 0
+        self.last_id = base_id - 1
+        self._log_f = None
+        self._idx_f = None
+        self._map = None
+
+    # ---------- Files ----------
+    def open_append(self):
+        if self._log_f is None:
+            self._log_f = open(self.log_path, "ab")
+            self._idx_f = open(self.idx_path, "ab")
+
+    def close(self):
+        for f in (self._log_f, self._idx_f):
+            if f is not None:
+                f.close()
+        self._log_f = self._idx_f = None
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+    def delete(self):
+        self._map = None   # a replay may still hold it; it closes once unreferenced
+        self.close()
+        for p in (self.log_path, self.idx_path):
+            try:
+                p.unlink()
+            except FileNotFoundError:
+                pass
+
+    def load(self, index_every):
+        """Rebuild in-memory state from disk, dropping a torn tail record."""
+        if self.idx_path.exists():
+            raw = self.idx_path.read_bytes()
+            for i in range(len(raw) // IDX.size):
+                nid, off = IDX.unpack_from(raw, i * IDX.size)
+                self.ids.append(nid)
+                self.offsets.append(off)
+        size = self.log_path.stat().st_size if self.log_path.exists() else 0
+        # Trust the index only up to what is really in the log file
+        while self.offsets and self.offsets[-1] >= size:
+            self.ids.pop()
+            self.offsets.pop()
+        off = self.offsets[-1] if self.offsets else 0
+        count = (len(self.ids) - 1) * index_every if self.ids else 0
+        last_id = self.base_id - 1
+        with open(self.log_path, "rb") as f:
+            f.seek(off)
+            while True:
+                head = f.read(REC.size)
+                if len(head) < REC.size:
+                    break
+                nid, length = REC.unpack(head)
+                if len(f.read(length)) < length:
+                    break
+                last_id = nid
+                off += REC.size + length
+                count += 1
+        if off < size:
+            with open(self.log_path, "r+b") as f:
+                f.truncate(off)
+        self.size = self.written = off
+        self.count = count
+        self.last_id = last_id
+
+    def view(self):
+        """Read-only mmap covering everything written so far."""
+        if self.written == 0:
+            return None
+        if self._map is None or len(self._map) < self.written:
+            # Readers may still hold the old map; it closes once unreferenced
+            with open(self.log_path, "rb") as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._map
+
+    def start_offset(self, after_id):
+        """Byte offset of the last indexed record with id <= after_id + 1."""
+        i = bisect.bisect_right(self.ids, after_id + 1) - 1
+        return self.offsets[i] if i >= 0 else 0
+
+
+class SegmentLog:
+    """
+    Durable, append-only notification history.
+
+    append() only buffers the encoded record, so callers never wait on disk.
+    A background thread writes the buffer and fsyncs every FSYNC_INTERVAL
+    (group commit); a crash can lose at most that window. read_since()
+    finds the segment by base id and the start offset by the sparse index,
+    then scans forward through an mmap of the file.
+    """
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES, retain_segments=RETAIN_SEGMENTS,
+                 retain_seconds=RETAIN_SECONDS, index_every=INDEX_EVERY, fsync_interval=FSYNC_INTERVAL):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self.retain_segments = retain_segments
+        self.retain_seconds = retain_seconds
+        self.index_every = index_every
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()       # segments list + pending buffer
+        self._io_lock = threading.Lock()    # serializes file writes
+        self._wake = threading.Event()
+        self._pending = []                  # (segment, record bytes, index entry or None)
+        self._segments = []
+        self._bases = []
+        self.commits = 0
+        self.total_fsync_ms = 0.0
+        self.max_fsync_ms = 0.0
+        for p in sorted(self.dir.glob("*.log")):
+            seg = _Segment(self.dir, int(p.stem))
+            seg.load(index_every)
+            self._segments.append(seg)
+            self._bases.append(seg.base_id)
+        self._writer = threading.Thread(target=self._writer_loop, name="a47-notify-log", daemon=True)
+        self._writer.start()
+
+    @property
+    def last_id(self):
+        for seg in reversed(self._segments):
+            if seg.count:
+                return seg.last_id
+        return self._segments[-1].base_id - 1 if self._segments else 0
+
+    @property
+    def first_id(self):
+        for seg in self._segments:
+            if seg.count:
+                return seg.base_id
+        return self.last_id + 1
+
+    # ---------- Append ----------
+    def append(self, nid, payload):
+        """Buffer one record; 'payload' is the notification dict or its JSON bytes."""
+        if not isinstance(payload, (bytes, bytearray)):
+            payload = json.dumps(payload).encode()
+        rec = REC.pack(nid, len(payload)) + payload
+        retired = []
+        with self._lock:
+            seg = self._segments[-1] if self._segments else None
+            if seg is None or seg.size >= self.segment_bytes:
+                seg = self._roll(nid, retired)
+            entry = IDX.pack(nid, seg.size) if seg.count % self.index_every == 0 else None
+            if entry is not None:
+                seg.ids.append(nid)
+                seg.offsets.append(seg.size)
+            seg.size += len(rec)
+            seg.count += 1
+            seg.last_id = nid
+            self._pending.append((seg, rec, entry))
+        if retired:
+            with self._io_lock:
+                for old in retired:
+                    old.delete()
+
+    def _roll(self, base_id, retired):
+        # Caller holds _lock; retired segments are deleted after it is released
+        seg = _Segment(self.dir, base_id)
+        self._segments.append(seg)
+        self._bases.append(base_id)
+        self._apply_retention(retired)
+        return seg
+
+    def _apply_retention(self, retired):
+        now = time.time()
+        while len(self._segments) > 1:
+            oldest = self._segments[0]
+            too_many = len(self._segments) - 1 > self.retain_segments
+            too_old = (self.retain_seconds is not None and oldest.log_path.exists()
+                       and now - oldest.log_path.stat().st_mtime > self.retain_seconds)
+            if not (too_many or too_old):
+                break
+            if any(seg is oldest for seg, _, _ in self._pending):
+                break   # still has unwritten records; retry at the next roll
+            self._segments.pop(0)
+            self._bases.pop(0)
+            retired.append(oldest)
+
+    # ---------- Group commit ----------
+    def _write_pending(self):
+        """Move buffered records into the files (no fsync). Returns touched segments."""
+        with self._io_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+            touched = []
+            for seg, rec, entry in batch:
+                seg.open_append()
+                seg._log_f.write(rec)
+                if entry is not None:
+                    seg._idx_f.write(entry)
+                seg.written += len(rec)
+                if not touched or touched[-1] is not seg:
+                    touched.append(seg)
+            for seg in touched:
+                seg._log_f.flush()
+                seg._idx_f.flush()
+            return touched
+
+    def _commit(self):
+        touched = self._write_pending()
+        if not touched:
+            return
+        start = time.perf_counter()
+        for seg in touched:
+            try:
+                os.fsync(seg._log_f.fileno())
+                os.fsync(seg._idx_f.fileno())
+            except (OSError, ValueError, AttributeError):
+                pass   # segment was retired between write and fsync
+        ms = (time.perf_counter() - start) * 1000
+        self.commits += 1
+        self.total_fsync_ms += ms
+        self.max_fsync_ms = max(self.max_fsync_ms, ms)
+
+    def _writer_loop(self):
+        while True:
+            self._wake.wait(self.fsync_interval)
+            self._wake.clear()
+            self._commit()
+
+    def flush(self):
+        """Write and fsync everything appended so far."""
+        self._commit()
+
+    # ---------- Replay ----------
+    def read_since(self, since_id, limit=0, stop_id=None, match=None):
+        """
+        Records with since_id < id (< stop_id if given), oldest first,
+        at most 'limit' if limit > 0. 'match' optionally filters records
+        before the limit applies. Only retained segments are searched.
+        """
+        self._write_pending()
+        out = []
+        with self._lock:
+            segments = list(self._segments)
+            bases = list(self._bases)
+        i = max(0, bisect.bisect_right(bases, since_id + 1) - 1)
+        for seg in segments[i:]:
+            if seg.last_id <= since_id:
+                continue
+            with self._io_lock:
+                view = seg.view()
+                end = seg.written
+            if view is None:
+                continue
+            off = seg.start_offset(since_id)
+            while off + REC.size <= end:
+                nid, length = REC.unpack_from(view, off)
+                body = off + REC.size
+                off = body + length
+                if nid <= since_id:
+                    continue
+                if stop_id is not None and nid >= stop_id:
+                    return out
+                n = json.loads(view[body:off])
+                if match is not None and not match(n):
+                    continue
+                out.append(n)
+                if 0 < limit <= len(out):
+                    return out
+        return out
+
+    def stats(self):
+        with self._lock:
+            segments = list(self._segments)
+            pending = len(self._pending)
+        return {
+            "dir": str(self.dir),
+            "segments": len(segments),
+            "bytes": sum(s.size for s in segments),
+            "first_id": self.first_id,
+            "last_id": self.last_id,
+            "pending": pending,
+            "commits": self.commits,
+            "avg_fsync_ms": round(self.total_fsync_ms / self.commits, 4) if self.commits else 0.0,
+            "max_fsync_ms": round(self.max_fsync_ms, 4),
+        }
+
+    def close(self):
+        self.flush()
+        with self._io_lock:
+            for seg in self._segments:
+                seg.close()
+
+
+# --- Example test ---
+if __name__ == "__main__":
+    import tempfile
+    d = tempfile.mkdtemp()
+    log = SegmentLog(d, segment_bytes=64 * 1024, retain_segments=4)
+    t0 = time.perf_counter()
+    for i in range(1, 20001):
+        log.append(i, {"id": i, "message": f"event {i}"})
+    print(f"append: {20000 / (time.perf_counter() - t0):,.0f}/s")
+    log.flush()
+    print("Stats:", log.stats())
+    first = log.first_id
+    t0 = time.perf_counter()
+    page = log.read_since(first + 100, 50)
+    print(f"replay 50 from id {first + 101}: {(time.perf_counter() - t0) * 1000:.3f} ms ->",
+          page[0]["id"], "...", page[-1]["id"])
+    log.close()
+    reopened = SegmentLog(d)
+    print("Reopened last_id:", reopened.last_id)
@@ -0,0 +1,248 @@
+matrix-os A48 notify filter system
+# matrix-OS-A48-notify-filter.py
+# Matrix Windows — Notification subscription filters and topic router (A26/A46)
+# Subscribers ask for user=, source=, level>= (exact or glob); pushes reach only matching ones
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import fnmatch
+import re
+import threading
+
+LEVEL_RANK = {"info": 0, "success": 1, "warning": 2, "error": 3}
+GLOB_CHARS = re.compile(r"[*?\[]")
+
+
+def _glob(pattern):
+    """(literal prefix, compiled matcher) for a glob, or None for a plain value."""
+    m = GLOB_CHARS.search(pattern)
+    if not m:
+        return None
+    return pattern[:m.start()], re.compile(fnmatch.translate(pattern)).match
+
+
+class Filter:
+    """
+    One subscription's criteria. Empty fields match everything.
+      user / source  exact value or glob (Admin, A2*, ?dmin)
+      levels         exact levels (level=warning,error)
+      min_rank       minimum level (level>=warning / min_level=warning)
+    """
+    __slots__ = ("user", "source", "levels", "min_rank", "_user_glob", "_source_glob", "key")
+
+    def __init__(self, user="", source="", levels=(), min_level=""):
+        self.user = user or ""
+        self.source = source or ""
+        self.levels = frozenset(l.lower() for l in levels if l)
+        self.min_rank = LEVEL_RANK.get((min_level or "").lower(), 0)
+        self._user_glob = _glob(self.user) if self.user else None
+        self._source_glob = _glob(self.source) if self.source else None
+        self.key = (self.user, self.source, tuple(sorted(self.levels)), self.min_rank)
+
+    @classmethod
+    def from_args(cls, get):
+        """
+        Build from query args; 'get' is e.g. request.args.get.
+        '?level>=warning' arrives as key 'level>' with value 'warning'.
+        Returns None when no filter was given.
+        """
+        user = (get("user") or "").strip()
+        source = (get("source") or "").strip()
+        levels = [l.strip() for l in (get("level") or "").split(",") if l.strip()]
+        min_level = (get("level>") or get("min_level") or "").strip()
+        if not (user or source or levels or min_level):
+            return None
+        return cls(user, source, levels, min_level)
+
+    @property
+    def exact_user(self):
+        return self.user if self.user and self._user_glob is None else ""
+
+    @property
+    def exact_source(self):
+        return self.source if self.source and self._source_glob is None else ""
+
+    def matches(self, n):
+        if self.min_rank and LEVEL_RANK.get(n.get("level"), 0) < self.min_rank:
+            return False
+        if self.levels and n.get("level") not in self.levels:
+            return False
+        if self.user:
+            if self._user_glob is None:
+                if n.get("user") != self.user:
+                    return False
+            elif not self._user_glob[1](n.get("user") or ""):
+                return False
+        if self.source:
+            if self._source_glob is None:
+                if n.get("source") != self.source:
+                    return False
+            elif not self._source_glob[1](n.get("source") or ""):
+                return False
+        return True
+
+    def to_dict(self):
+        return {"user": self.user, "source": self.source,
+                "levels": sorted(self.levels), "min_rank": self.min_rank}
+
+
+class Group:
+    """Subscribers that share an identical filter; matched once per push."""
+    __slots__ = ("filter", "subs")
+
+    def __init__(self, flt):
+        self.filter = flt
+        self.subs = set()
+
+
+class Router:
+    """
+    Routes a notification to the subscriber groups whose filters match it.
+
+    Each group is indexed under its most selective key: exact user, exact
+    source, the literal prefix of a user/source glob, or (for level-only
+    and unfiltered subscriptions) its minimum level. A push looks up only
+    the buckets its own user, source, prefixes and level can hit, then
+    confirms each candidate group with Filter.matches().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups = {}             # filter key -> Group
+        self._by_user = {}            # exact user -> [Group]
+        self._by_source = {}
+        self._user_prefix = {}        # glob literal prefix -> [Group]
+        self._source_prefix = {}
+        self._by_rank = [[] for _ in range(len(LEVEL_RANK))]
+        self._user_prefix_lens = set()
+        self._source_prefix_lens = set()
+        self.routed = 0
+        self.candidates = 0
+
+    def _bucket(self, flt):
+        if flt is None:
+            return self._by_rank[0]
+        if flt.exact_user:
+            return self._by_user.setdefault(flt.exact_user, [])
+        if flt.exact_source:
+            return self._by_source.setdefault(flt.exact_source, [])
+        if flt._user_glob and flt._user_glob[0]:
+            p = flt._user_glob[0]
+            self._user_prefix_lens.add(len(p))
+            return self._user_prefix.setdefault(p, [])
+        if flt._source_glob and flt._source_glob[0]:
+            p = flt._source_glob[0]
+            self._source_prefix_lens.add(len(p))
+            return self._source_prefix.setdefault(p, [])
+        return self._by_rank[flt.min_rank]
+
+    def subscribe(self, flt, sub):
+        """Add 'sub' (any hashable) under 'flt' (None = everything); returns its group."""
+        key = flt.key if flt is not None else None
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = Group(flt)
+                bucket = self._bucket(flt)
+                bucket.append(group)
+            group.subs.add(sub)
+        return group
+
+    def unsubscribe(self, group, sub):
+        with self._lock:
+            group.subs.discard(sub)
+            if group.subs:
+                return
+            key = group.filter.key if group.filter is not None else None
+            if self._groups.get(key) is group:
+                del self._groups[key]
+                bucket = self._bucket(group.filter)
+                if group in bucket:
+                    bucket.remove(group)
+
+    def match(self, n):
+        """Groups whose filter matches notification n."""
+        user = n.get("user") or ""
+        source = n.get("source") or ""
+        rank = LEVEL_RANK.get(n.get("level"), 0)
+        out = []
+        seen = 0
+        with self._lock:
+            buckets = [self._by_user.get(user, ()), self._by_source.get(source, ())]
+            for k in self._user_prefix_lens:
+                if k <= len(user):
+                    buckets.append(self._user_prefix.get(user[:k], ()))
+            for k in self._source_prefix_lens:
+                if k <= len(source):
+                    buckets.append(self._source_prefix.get(source[:k], ()))
+            buckets.extend(self._by_rank[:rank + 1])
+            for bucket in buckets:
+                for group in bucket:
+                    seen += 1
+                    if group.filter is None or group.filter.matches(n):
+                        out.append(group)
+        self.routed += 1
+        self.candidates += seen
+        return out
+
+    def stats(self):
+        with self._lock:
+            groups = len(self._groups)
+            subs = sum(len(g.subs) for g in self._groups.values())
+        return {
+            "groups": groups,
+            "subscribers": subs,
+            "routed": self.routed,
+            "avg_candidates": round(self.candidates / self.routed, 2) if self.routed else 0.0,
+        }
+
+
+# --- Routing benchmark ---
+if __name__ == "__main__":
+    import random
+    import sys
+    import time
+
+    n_filters = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    n_push = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    rnd = random.Random(7)
+    users = [f"user{i}" for i in range(2000)]
+    sources = [f"A{i}" for i in range(1, 45)]
+    levels = list(LEVEL_RANK)
+
+    router = Router()
+    for i in range(n_filters):
+        kind = i % 5
+        if kind == 0:
+            flt = Filter(user=rnd.choice(users))
+        elif kind == 1:
+            flt = Filter(source=rnd.choice(sources), min_level=rnd.choice(levels))
+        elif kind == 2:
+            flt = Filter(user=f"user{rnd.randrange(200)}*")
+        elif kind == 3:
+            flt = Filter(source=f"A{rnd.randrange(1, 5)}?", levels=[rnd.choice(levels)])
+        else:
+            flt = Filter(user=rnd.choice(users), source=rnd.choice(sources))
+        router.subscribe(flt, i)
+
+    pushes = [{"user": rnd.choice(users), "source": rnd.choice(sources), "level": rnd.choice(levels)}
+              for _ in range(n_push)]
+    t0 = time.perf_counter()
+    delivered = 0
+    for n in pushes:
+        delivered += sum(len(g.subs) for g in router.match(n))
+    dt = time.perf_counter() - t0
+
+    # Reference: test every filter on every push
+    flts = [g.filter for g in router._groups.values()]
+    sample = pushes[:2000]
+    t1 = time.perf_counter()
+    for n in sample:
+        for f in flts:
+            f.matches(n)
+    linear = (time.perf_counter() - t1) / len(sample)
+
+    print(f"filters={n_filters} distinct_groups={len(router._groups)} pushes={n_push}")
+    print(f"indexed routing: {n_push / dt:,.0f} pushes/s ({dt / n_push * 1e6:.1f} us/push), "
+          f"{delivered / n_push:.2f} deliveries/push")
+    print(f"linear scan:     {1 / linear:,.0f} pushes/s ({linear * 1e6:.1f} us/push)")
+    print("stats:", router.stats())
@@ -0,0 +1,176 @@
+matrix-os A49 session store system
+# matrix-OS-A49-session-store.py
+# Matrix Windows — Shared session backend for A3 (SQLite WAL)
+# Every process that loads A3 (A11, A7, extra workers) reads and writes the same sessions
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import importlib.util
+import sys
+import threading
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+dbpool = load_module("matrix_os_a45_dbpool", "matrix-OS-A45-dbpool.py")
+
+# ===== Config =====
+TOUCH_EVERY = 30          # seconds; a verify rewrites last_seen at most this often
+SWEEP_EVERY = 5           # seconds between expiry/capacity sweeps in one process
+SWEEP_BATCH = 1000        # rows deleted per sweep statement
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+  id         INTEGER PRIMARY KEY,
+  token      TEXT NOT NULL UNIQUE,
+  username   TEXT NOT NULL,
+  level      TEXT NOT NULL,
+  created    REAL NOT NULL,
+  last_seen  REAL NOT NULL,
+  deadline   REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_deadline  ON sessions(deadline);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_seen ON sessions(last_seen);
+CREATE INDEX IF NOT EXISTS idx_sessions_user      ON sessions(username, id);
+"""
+
+
+class SqliteSessionStore:
+    """
+    Session backend shared by every process on the host.
+
+    Sessions live in one WAL-mode SQLite file, read through connections
+    checked out of A45's bounded pool (prepared statements, mmap reads),
+    so a verify is one unique-index lookup and a revoke is visible to every
+    process on its next verify. Idle refreshes are written at most every TOUCH_EVERY
+    seconds per session to keep verifies read-only. Expired and
+    over-capacity rows are swept in bulk by whichever process is active.
+
+    Same interface as A3's in-memory SessionStore; 'record' builds the
+    session objects returned to callers.
+    """
+
+    def __init__(self, path, record, idle_ttl, absolute_ttl, capacity):
+        self.pool = dbpool.get_pool(path)
+        self.record = record
+        self.idle_ttl = idle_ttl
+        self.absolute_ttl = absolute_ttl
+        self.capacity = capacity
+        self.touch_every = min(TOUCH_EVERY, idle_ttl / 10)
+        self._lock = threading.Lock()
+        self._next_sweep = 0.0
+        self.expired = 0
+        self.evicted = 0
+        self.revoked = 0
+        with self.pool.transaction() as conn:
+            conn.executescript(SCHEMA)
+
+    def __len__(self):
+        return self.pool.one("SELECT COUNT(*) FROM sessions")[0]
+
+    def __contains__(self, token):
+        return self.get(token) is not None
+
+    def _build(self, row):
+        sid, token, username, level, created, last_seen = row[:6]
+        sess = self.record(token, username, level, created, sid)
+        sess.last_seen = last_seen
+        return sess
+
+    def _deadline(self, created, last_seen):
+        return min(last_seen + self.idle_ttl, created + self.absolute_ttl)
+
+    # ---------- Sweeps ----------
+    def sweep(self, now=None):
+        """Delete expired sessions, then the least recently used beyond capacity."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if now < self._next_sweep:
+                return
+            self._next_sweep = now + SWEEP_EVERY
+        cur = self.pool.execute(
+            "DELETE FROM sessions WHERE id IN "
+            "(SELECT id FROM sessions WHERE deadline <= ? LIMIT ?)", (now, SWEEP_BATCH))
+        self.expired += max(cur.rowcount, 0)
+        excess = len(self) - self.capacity
+        if excess > 0:
+            cur = self.pool.execute(
+                "DELETE FROM sessions WHERE id IN "
+                "(SELECT id FROM sessions ORDER BY last_seen LIMIT ?)", (excess,))
+            self.evicted += max(cur.rowcount, 0)
+
+    # ---------- Public ----------
+    def add(self, token, username, level):
+        now = time.time()
+        self.sweep(now)
+        cur = self.pool.execute(
+            "INSERT OR REPLACE INTO sessions (token, username, level, created, last_seen, deadline) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (token, username, level, now, now, self._deadline(now, now)))
+        return self._build((cur.lastrowid, token, username, level, now, now))
+
+    def get(self, token, touch=False):
+        now = time.time()
+        row = self.pool.one(
+            "SELECT id, token, username, level, created, last_seen, deadline "
+            "FROM sessions WHERE token=?", (token,))
+        if row is None:
+            return None
+        if row[6] <= now:
+            self.pool.execute("DELETE FROM sessions WHERE token=? AND deadline <= ?", (token, now))
+            self.expired += 1
+            return None
+        sess = self._build(row)
+        if touch and now - sess.last_seen >= self.touch_every:
+            sess.last_seen = now
+            self.pool.execute(
+                "UPDATE sessions SET last_seen=?, deadline=? WHERE token=?",
+                (now, self._deadline(sess.created, now), token))
+            self.sweep(now)
+        return sess
+
+    def revoke(self, token):
+        cur = self.pool.execute("DELETE FROM sessions WHERE token=?", (token,))
+        if cur.rowcount <= 0:
+            return False
+        self.revoked += 1
+        return True
+
+    def page(self, username=None, level=None, cursor=0, limit=100):
+        """Same contract as SessionStore.page(); the cursor is the row id."""
+        clauses, params = ["id > ?", "deadline > ?"], [cursor, time.time()]
+        if username is not None:
+            clauses.append("username = ?")
+            params.append(username)
+        if level is not None:
+            clauses.append("level = ?")
+            params.append(level)
+        rows = self.pool.rows(
+            "SELECT id, token, username, level, created, last_seen FROM sessions "
+            f"WHERE {' AND '.join(clauses)} ORDER BY id LIMIT ?", (*params, limit))
+        sessions = [self._build(r).to_dict() for r in rows]
+        next_cursor = rows[-1][0] if len(rows) >= limit else None
+        return sessions, next_cursor
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "path": self.pool.path,
+            "active": len(self),
+            "capacity": self.capacity,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "revoked": self.revoked,
+            "idle_ttl": self.idle_ttl,
+            "absolute_ttl": self.absolute_ttl,
+            "touch_every": self.touch_every,
+            "db": self.pool.stats(),
+        }
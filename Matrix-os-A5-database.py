@@ -3,14 +3,35 @@ matrix-os database system
 # Matrix Windows User Database (SQLite)
 # Matrix Instruction Manual, ARM Index, Volume 1
 
+import bisect
+import hmac
+import importlib.util
+import sys
+import os
 import sqlite3
-from contextlib import closing
+import threading
 from datetime import datetime
+from pathlib import Path
 
+APP_DIR = Path(__file__).parent.resolve()
 DB_PATH = "matrix_os_users.sqlite3"
 
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# Shared pooled connections (WAL, statement cache) from A45
+dbpool = load_module("matrix_os_a45_dbpool", "matrix-OS-A45-dbpool.py")
+
+def pool():
+    return dbpool.get_pool(DB_PATH)
+
 def init_db():
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
+    with pool().transaction() as conn:
         conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
           username      TEXT PRIMARY KEY,
@@ -25,63 +46,145 @@ def init_db():
 
 def upsert_user(username, voiceprint, iris, face_hash, security_lvl=1):
     now = datetime.utcnow().isoformat()
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        # insert or update
-        conn.execute("""
-        INSERT INTO users (username, voiceprint, iris, face_hash, security_lvl, created_at, updated_at)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-        ON CONFLICT(username) DO UPDATE SET
-          voiceprint=excluded.voiceprint,
-          iris=excluded.iris,
-          face_hash=excluded.face_hash,
-          security_lvl=excluded.security_lvl,
-          updated_at=excluded.updated_at;
-        """, (username, voiceprint, iris, face_hash, security_lvl, now, now))
+    # insert or update
+    pool().execute("""
+    INSERT INTO users (username, voiceprint, iris, face_hash, security_lvl, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(username) DO UPDATE SET
+      voiceprint=excluded.voiceprint,
+      iris=excluded.iris,
+      face_hash=excluded.face_hash,
+      security_lvl=excluded.security_lvl,
+      updated_at=excluded.updated_at;
+    """, (username, voiceprint, iris, face_hash, security_lvl, now, now))
 
 def get_user(username):
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        row = conn.execute("""
-        SELECT username, voiceprint, iris, face_hash, security_lvl, created_at, updated_at
-        FROM users WHERE username=?;
-        """, (username,)).fetchone()
-        if not row:
-            return None
-        return {
-            "username": row[0],
-            "voiceprint": row[1],
-            "iris": row[2],
-            "face_hash": row[3],
-            "security_lvl": row[4],
-            "created_at": row[5],
-            "updated_at": row[6],
-        }
+    row = pool().one("""
+    SELECT username, voiceprint, iris, face_hash, security_lvl, created_at, updated_at
+    FROM users WHERE username=?;
+    """, (username,))
+    if not row:
+        return None
+    return {
+        "username": row[0],
+        "voiceprint": row[1],
+        "iris": row[2],
+        "face_hash": row[3],
+        "security_lvl": row[4],
+        "created_at": row[5],
+        "updated_at": row[6],
+    }
+
+def authenticate(username, input_voice, input_iris, input_face):
+    """
+    Check all three biometrics with one primary-key lookup.
+    Returns {"username", "security_lvl"} on a match, else None.
+    Every field is compared in constant time, and all three are always
+    compared, so timing does not reveal which one was wrong.
+    """
+    row = pool().one("""
+    SELECT voiceprint, iris, face_hash, security_lvl FROM users WHERE username=?;
+    """, (username,))
+    if not row:
+        return None
+    matched = hmac.compare_digest(input_voice.encode(), row[0].encode())
+    matched &= hmac.compare_digest(input_iris.encode(), row[1].encode())
+    matched &= hmac.compare_digest(input_face.encode(), row[2].encode())
+    if not matched:
+        return None
+    return {"username": username, "security_lvl": row[3]}
 
 def verify_biometrics(username, input_voice, input_iris, input_face):
-    user = get_user(username)
-    if not user:
-        return False
-    return (
-        input_voice == user["voiceprint"] and
-        input_iris == user["iris"] and
-        input_face == user["face_hash"]
-    )
+    return authenticate(username, input_voice, input_iris, input_face) is not None
 
 def update_security_level(username, new_level):
     now = datetime.utcnow().isoformat()
-    with closing(sqlite3.connect(DB_PATH)) as conn, conn:
-        cur = conn.execute("""
-        UPDATE users SET security_lvl=?, updated_at=? WHERE username=?;
-        """, (new_level, now, username))
-        return cur.rowcount == 1
+    cur = pool().execute("""
+    UPDATE users SET security_lvl=?, updated_at=? WHERE username=?;
+    """, (new_level, now, username))
+    return cur.rowcount == 1
+
+class UserDirectory:
+    """
+    Process-wide cached view of the users table (username order).
+
+    A private connection watches PRAGMA data_version, which changes
+    whenever any other connection (in this or another process) commits to
+    the database. While it is unchanged every read is served from memory;
+    a change triggers one reload of the table.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._watch = None
+        self._pid = None
+        self._version = None
+        self._users = []
+        self._names = []
+        self.hits = 0
+        self.reloads = 0
+
+    def _data_version(self):
+        if self._watch is None or self._pid != os.getpid():
+            self._watch = sqlite3.connect(self.path, check_same_thread=False)
+            self._pid = os.getpid()
+            self._version = None
+        return self._watch.execute("PRAGMA data_version").fetchone()[0]
+
+    def _current(self):
+        with self._lock:
+            version = self._data_version()
+            if version == self._version:
+                self.hits += 1
+                return self._users, self._names
+            rows = pool().rows("""
+            SELECT username, security_lvl, created_at, updated_at FROM users ORDER BY username;
+            """)
+            self._users = [
+                {"username": r[0], "security_lvl": r[1], "created_at": r[2], "updated_at": r[3]}
+            for r in rows]
+            self._names = [u["username"] for u in self._users]
+            self._version = version
+            self.reloads += 1
+            return self._users, self._names
+
+    def all(self):
+        return list(self._current()[0])
+
+    def count(self):
+        return len(self._current()[0])
+
+    def page(self, after=None, limit=100):
+        """Users with username > 'after'; returns (users, next_cursor or None)."""
+        users, names = self._current()
+        i = bisect.bisect_right(names, after) if after is not None else 0
+        chunk = users[i:i + limit]
+        next_cursor = chunk[-1]["username"] if i + limit < len(users) else None
+        return list(chunk), next_cursor
+
+    def stats(self):
+        return {"users": len(self._users), "hits": self.hits, "reloads": self.reloads}
+
+_directories = {}
+_directories_lock = threading.Lock()
+
+def directory():
+    """Shared UserDirectory for the current DB_PATH."""
+    with _directories_lock:
+        d = _directories.get(DB_PATH)
+        if d is None:
+            d = _directories[DB_PATH] = UserDirectory(DB_PATH)
+        return d
 
 def list_users():
-    with closing(sqlite3.connect(DB_PATH)) as conn:
-        rows = conn.execute("""
-        SELECT username, security_lvl, created_at, updated_at FROM users ORDER BY username;
-        """).fetchall()
-        return [
-            {"username": r[0], "security_lvl": r[1], "created_at": r[2], "updated_at": r[3]}
-        for r in rows]
+    return directory().all()
+
+def count_users():
+    return directory().count()
+
+def list_users_page(after=None, limit=100):
+    return directory().page(after, limit)
 
 # --- Example seeding & quick test ---
 if __name__ == "__main__":
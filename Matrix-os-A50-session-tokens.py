@@ -0,0 +1,212 @@
+matrix-os A50 session tokens system
+# matrix-OS-A50-session-tokens.py
+# Matrix Windows — Stateless signed session tokens for A3
+# User, level and expiry travel inside an HMAC-SHA256 token; revocations go through a Bloom filter
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import base64
+import hashlib
+import hmac
+import importlib.util
+import sys
+import json
+import math
+import os
+import secrets
+import threading
+import time
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+dbpool = load_module("matrix_os_a45_dbpool", "matrix-OS-A45-dbpool.py")
+
+# ===== Config =====
+TOKEN_PREFIX = "v1."
+REVOKED_CAPACITY = 100000     # revocations the Bloom filter is sized for
+REVOKED_ERROR_RATE = 0.001    # false positive rate at capacity (each costs one exact lookup)
+REVOKED_REFRESH = 1.0         # seconds between pulls of other processes' revocations
+
+REVOKED_SCHEMA = """
+CREATE TABLE IF NOT EXISTS revoked_tokens (
+  id   INTEGER PRIMARY KEY,
+  jti  TEXT NOT NULL UNIQUE,
+  exp  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_revoked_exp ON revoked_tokens(exp);
+"""
+
+def _b64(raw):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+def _unb64(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def load_secret(path):
+    """
+    Read the shared signing key, creating it (0600) on first use. Every
+    process pointed at the same file signs and verifies with the same key.
+    """
+    path = Path(path)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        return path.read_bytes()
+    with os.fdopen(fd, "wb") as f:
+        key = secrets.token_bytes(32)
+        f.write(key)
+    return key
+
+
+class TokenSigner:
+    """
+    Token = "v1." + base64url(JSON claims) + "." + hex(HMAC-SHA256).
+    Claims: sub (username), lvl (level name), iat, exp, jti (random id).
+    """
+
+    def __init__(self, secret, ttl):
+        self.secret = secret
+        self.ttl = ttl
+        self._mac = hmac.new(secret, digestmod=hashlib.sha256)   # keyed once, copied per token
+
+    def _sign(self, body):
+        mac = self._mac.copy()
+        mac.update(body.encode("ascii"))
+        return mac.hexdigest()
+
+    def issue(self, username, level, now=None):
+        now = time.time() if now is None else now
+        claims = {"sub": username, "lvl": level, "iat": int(now),
+                  "exp": int(now + self.ttl), "jti": secrets.token_hex(8)}
+        body = _b64(json.dumps(claims, separators=(",", ":")).encode())
+        return f"{TOKEN_PREFIX}{body}.{self._sign(body)}", claims
+
+    def decode(self, token, now=None):
+        """Claims of a correctly signed, unexpired token, else None."""
+        if not token.startswith(TOKEN_PREFIX):
+            return None
+        body, _, sig = token[len(TOKEN_PREFIX):].partition(".")
+        try:
+            if not hmac.compare_digest(self._sign(body), sig):
+                return None
+            claims = json.loads(_unb64(body))
+        except (TypeError, ValueError, UnicodeError):
+            return None
+        now = time.time() if now is None else now
+        if claims.get("exp", 0) <= now:
+            return None
+        return claims
+
+
+class BloomFilter:
+    """Fixed-size bit array with k hash positions from one blake2b digest."""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.m = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.m for i in range(self.k)]
+
+    def add(self, key):
+        for p in self._positions(key):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        for p in self._positions(key):
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+        return True
+
+
+class RevocationList:
+    """
+    Revoked token ids, shared through a SQLite table and screened locally.
+
+    Each process keeps a Bloom filter of revoked jtis. A verify that misses
+    the filter needs no I/O; a hit is confirmed with one indexed lookup.
+    New rows from other processes are pulled every REVOKED_REFRESH seconds
+    (by id high-water mark), so a revocation reaches every process within
+    that window. Rows are purged once their token would have expired anyway.
+    """
+
+    def __init__(self, path, capacity=REVOKED_CAPACITY, error_rate=REVOKED_ERROR_RATE,
+                 refresh=REVOKED_REFRESH):
+        self.pool = dbpool.get_pool(path)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._high_water = 0
+        self._next_refresh = 0.0
+        self.screened = 0
+        self.exact_checks = 0
+        with self.pool.transaction() as conn:
+            conn.executescript(REVOKED_SCHEMA)
+        self._pull(time.time())
+
+    def _rebuild(self, now):
+        # Caller holds _lock. Purge expired rows and size a fresh filter.
+        self.pool.execute("DELETE FROM revoked_tokens WHERE exp <= ?", (now,))
+        rows = self.pool.rows("SELECT id, jti FROM revoked_tokens")
+        self._bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for _, jti in rows:
+            self._bloom.add(jti)
+        self._high_water = max((r[0] for r in rows), default=self._high_water)
+
+    def _pull(self, now):
+        with self._lock:
+            if now < self._next_refresh:
+                return
+            self._next_refresh = now + self.refresh
+            rows = self.pool.rows("SELECT id, jti FROM revoked_tokens WHERE id > ? ORDER BY id",
+                                  (self._high_water,))
+            for sid, jti in rows:
+                self._bloom.add(jti)
+                self._high_water = sid
+            if self._bloom.count > self._bloom.capacity:   # filter full: purge and resize
+                self._rebuild(now)
+
+    def revoke(self, jti, exp):
+        cur = self.pool.execute("INSERT OR IGNORE INTO revoked_tokens (jti, exp) VALUES (?, ?)",
+                                (jti, exp))
+        with self._lock:
+            self._bloom.add(jti)
+        return cur.rowcount > 0
+
+    def is_revoked(self, jti, now=None):
+        self._pull(time.time() if now is None else now)
+        self.screened += 1
+        if jti not in self._bloom:
+            return False
+        self.exact_checks += 1
+        return self.pool.one("SELECT 1 FROM revoked_tokens WHERE jti=?", (jti,)) is not None
+
+    def stats(self):
+        with self._lock:
+            bloom = self._bloom
+            return {
+                "bloom_bits": bloom.m,
+                "bloom_hashes": bloom.k,
+                "bloom_entries": bloom.count,
+                "screened": self.screened,
+                "exact_checks": self.exact_checks,
+                "refresh_s": self.refresh,
+            }
@@ -0,0 +1,314 @@
+matrix-os A51 gateway system
+# matrix-OS-A51-gateway.py
+# Matrix Windows — Single-process gateway for all Matrix Flask services
+# Mounts every service app behind one WSGI dispatcher; shared modules, pools and in-process calls
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import importlib.util
+import json
+import sys
+import threading
+import time
+from pathlib import Path
+
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# ===== Config =====
+HOST = "127.0.0.1"
+PORT = 5090
+ROUTE_CACHE = 4096     # (method, path) -> app entries remembered by the dispatcher
+
+# name, file, module name (same as the services use), app attribute, standalone port
+SERVICES = [
+    ("api",       "matrix-OS-A7-api.py",            "matrix_os_a7_api",           "app", 5000),
+    ("monitor",   "matrix-OS-A9-monitor.py",        "matrix_os_a9_monitor",       "app", 5050),
+    ("auth",      "matrix-OS-A11-auth-bridge.py",   "matrix_os_a11_auth_bridge",  "app", 5080),
+    ("users",     "matrix-OS-A16-user-api.py",      "matrix_os_a16_user_api",     "app", 5060),
+    ("telemetry", "matrix-OS-A18-telemetry.py",     "matrix_os_a18_telemetry",    "app", 5065),
+    ("analytics", "matrix-OS-A20-analytics.py",     "matrix_os_a20_analytics",    "app", 5066),
+    ("logistics", "matrix-OS-A22-logistics.py",     "matrix_os_a22_logistics",    "app", 5000),
+    ("backup",    "matrix-OS-A24-backup.py",        "matrix_os_a24_backup",       "app", 5068),
+    ("notify",    "matrix-OS-A26-authentication.py", "matrix_os_a26_notifications", "app", 5069),
+    ("rbac",      "matrix-OS-A42-permission.py",    "matrix_os_a42_permission",   "APP", 5072),
+]
+
+
+class Gateway:
+    """
+    WSGI dispatcher over several Flask apps.
+
+    A request goes to the first mounted app whose URL map matches its path
+    and method (every service already uses its own /api/<area>/ paths);
+    the answer is cached per (method, path), so routing is one dict lookup
+    after warm-up. Because all services live in one process, modules
+    loaded through load_module (A5, A3, A6, A45 pools...) exist once and
+    call() reaches any route as a function call instead of an HTTP hop.
+    """
+
+    def __init__(self):
+        self.apps = {}          # name -> Flask app
+        self.failed = {}        # name -> load error
+        self._routes = {}       # (method, path) -> (name, app) or None
+        self._rules = {}        # (method, rule) -> first app name serving it
+        self.conflicts = []
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.internal_calls = 0
+
+    def mount(self, name, app):
+        """Add an app; a rule another app already serves stays with the first one."""
+        for rule in app.url_map.iter_rules():
+            if rule.endpoint in ("static", "matrix_route_stats", "matrix_profile", "matrix_memory"):
+                continue   # A53-A55 diagnostics are on every app and cover the whole process
+            for method in rule.methods - {"HEAD", "OPTIONS"}:
+                owner = self._rules.setdefault((method, rule.rule), name)
+                if owner != name:
+                    self.conflicts.append(f"{method} {rule.rule}: {owner} shadows {name}")
+        self.apps[name] = app
+        with self._lock:
+            self._routes.clear()
+
+    def load(self, services=SERVICES):
+        """Import and mount each service; one that fails to load is skipped."""
+        for name, filename, module_name, attr, _ in services:
+            try:
+                mod = load_module(module_name, filename)
+                self.mount(name, getattr(mod, attr))
+            except Exception as e:   # includes SyntaxError from an unfinished service file
+                self.failed[name] = f"{type(e).__name__}: {e}"
+        loader.startup()
+        return self
+
+    def resolve(self, method, path):
+        key = (method, path)
+        hit = self._routes.get(key)
+        if hit is not None or key in self._routes:
+            return hit
+        found = None
+        for name, app in self.apps.items():
+            adapter = app.url_map.bind("gateway")
+            try:
+                adapter.match(path, method=method)
+            except NotFound:
+                continue
+            except MethodNotAllowed:
+                if found is None:
+                    found = (name, app)   # let the app answer 405 (and OPTIONS)
+                continue
+            found = (name, app)
+            break
+        with self._lock:
+            if len(self._routes) >= ROUTE_CACHE:
+                self._routes.clear()
+            self._routes[key] = found
+        return found
+
+    def __call__(self, environ, start_response):
+        self.requests += 1
+        hit = self.resolve(environ.get("REQUEST_METHOD", "GET"), environ.get("PATH_INFO", "/"))
+        if hit is None:
+            body = json.dumps({"ok": False, "error": "Not found"}).encode()
+            start_response("404 NOT FOUND", [("Content-Type", "application/json"),
+                                             ("Content-Length", str(len(body))),
+                                             ("Access-Control-Allow-Origin", "*")])
+            return [body]
+        environ["matrix.dispatch"] = self   # A54 runs ?mode=cprofile requests through the gateway
+        return hit[1](environ, start_response)
+
+    def call(self, method, path, json_body=None, query=None, headers=None):
+        """
+        In-process request to any mounted route, e.g.
+            gateway.call("POST", "/api/auth/session/verify", {"token": t})
+        Returns (status code, parsed JSON or raw bytes).
+        """
+        self.internal_calls += 1
+        builder = EnvironBuilder(path=path, method=method, json=json_body,
+                                 query_string=query, headers=headers)
+        try:
+            app_iter, status, _ = run_wsgi_app(self, builder.get_environ(), buffered=True)
+            data = b"".join(app_iter)
+        finally:
+            builder.close()
+        code = int(status.split(" ", 1)[0])
+        try:
+            return code, json.loads(data)
+        except ValueError:
+            return code, data
+
+    def stats(self):
+        return {
+            "services": sorted(self.apps),
+            "failed": self.failed,
+            "conflicts": self.conflicts,
+            "requests": self.requests,
+            "internal_calls": self.internal_calls,
+            "cached_routes": len(self._routes),
+            "modules": loader.stats(),
+        }
+
+
+gateway = Gateway()
+
+def _gateway_stats(environ, start_response):
+    body = json.dumps({"ok": True, "stats": gateway.stats()}).encode()
+    start_response("200 OK", [("Content-Type", "application/json"),
+                              ("Content-Length", str(len(body))),
+                              ("Access-Control-Allow-Origin", "*")])
+    return [body]
+
+def application(environ, start_response):
+    """WSGI entry point (gunicorn/waitress: matrix-OS-A51-gateway:application)."""
+    if environ.get("PATH_INFO") == "/api/gateway/stats":
+        return _gateway_stats(environ, start_response)
+    return gateway(environ, start_response)
+
+def serve(ports=(PORT,), host=HOST):
+    """Serve the gateway on one or more ports (e.g. the old per-service ports) from one process."""
+    from werkzeug.serving import make_server
+    if not gateway.apps:
+        gateway.load()
+    servers = [make_server(host, p, application, threaded=True) for p in ports]
+    for srv in servers[1:]:
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+    servers[0].serve_forever()
+
+
+# ===== Footprint / latency benchmark =====
+BENCH_CALLS = 500
+# Cheap routes on different services: what one service would call on another
+BENCH_ROUTES = [
+    ("GET",  "/api/health", None),
+    ("POST", "/api/auth/session/verify", {"token": "bench"}),
+    ("GET",  "/api/notify/pull", None),
+    ("GET",  "/api/rbac/check", None),
+    ("GET",  "/api/telemetry/ingest/stats", None),
+]
+
+def _serve_one(name, port):
+    """Child process for the benchmark: one service on its own port."""
+    from werkzeug.serving import make_server
+    svc = next(s for s in SERVICES if s[0] == name)
+    app = getattr(load_module(svc[2], svc[1]), svc[3])
+    loader.startup()
+    make_server(HOST, port, app, threaded=True).serve_forever()
+
+def _http_latency(port_for, calls):
+    import http.client
+    samples = []
+    for i in range(calls):
+        method, path, body = BENCH_ROUTES[i % len(BENCH_ROUTES)]
+        conn = http.client.HTTPConnection(HOST, port_for(path))
+        start = time.perf_counter()
+        conn.request(method, path, json.dumps(body) if body else None,
+                     {"Content-Type": "application/json"})
+        conn.getresponse().read()
+        samples.append(time.perf_counter() - start)
+        conn.close()
+    return samples
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {"mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+            "p99_ms": round(samples[int(0.99 * (len(samples) - 1))] * 1000, 3)}
+
+def _wait_port(port, timeout=30):
+    import socket
+    end = time.time() + timeout
+    while time.time() < end:
+        with socket.socket() as s:
+            if s.connect_ex((HOST, port)) == 0:
+                return True
+        time.sleep(0.05)
+    return False
+
+def bench(calls=BENCH_CALLS, base_port=6100):
+    """
+    Separate processes (one per service) vs one gateway process:
+    total RSS, and latency of cross-service requests over HTTP and, for the
+    gateway, as in-process calls.
+    """
+    import logging
+    import subprocess
+    import psutil
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    probe = Gateway().load()
+    names = [s[0] for s in SERVICES if s[0] in probe.apps]
+    route_owner = {path: probe.resolve(method, path)[0] for method, path, _ in BENCH_ROUTES}
+
+    # 1) one process per service
+    procs, ports = [], {}
+    for i, name in enumerate(names):
+        ports[name] = base_port + i
+        procs.append(subprocess.Popen(
+            [sys.executable, str(Path(__file__).resolve()), "--serve-one", name, str(ports[name])],
+            cwd=str(Path.cwd()), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    try:
+        for name in names:
+            _wait_port(ports[name])
+        separate_rss = sum(psutil.Process(p.pid).memory_info().rss for p in procs)
+        separate = _summary(_http_latency(lambda path: ports[route_owner[path]], calls))
+    finally:
+        for p in procs:
+            p.terminate()
+        for p in procs:
+            p.wait()
+
+    # 2) one gateway process
+    gw_port = base_port + len(names)
+    proc = subprocess.Popen([sys.executable, str(Path(__file__).resolve()), "--port", str(gw_port)],
+                            cwd=str(Path.cwd()), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_port(gw_port)
+        gateway_rss = psutil.Process(proc.pid).memory_info().rss
+        via_http = _summary(_http_latency(lambda path: gw_port, calls))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    # 3) in-process calls (this process has every service loaded)
+    samples = []
+    for i in range(calls):
+        method, path, body = BENCH_ROUTES[i % len(BENCH_ROUTES)]
+        start = time.perf_counter()
+        probe.call(method, path, body)
+        samples.append(time.perf_counter() - start)
+
+    print(f"services: {', '.join(names)}  (not loadable: {', '.join(probe.failed) or 'none'})")
+    print(f"RSS separate processes: {separate_rss / 2**20:8.1f} MiB ({len(names)} processes)")
+    print(f"RSS gateway:            {gateway_rss / 2**20:8.1f} MiB (1 process)")
+    print(f"cross-service HTTP, separate: {separate}")
+    print(f"cross-service HTTP, gateway:  {via_http}")
+    print(f"in-process gateway.call():    {_summary(samples)}")
+
+
+# ===== Main =====
+if __name__ == "__main__":
+    # Run:
+    #   python matrix-OS-A51-gateway.py                  every service on :5090
+    #   python matrix-OS-A51-gateway.py --legacy-ports   also answer on each service's old port
+    #   python matrix-OS-A51-gateway.py --bench          RSS and latency vs separate processes
+    # Endpoints: every service route, plus GET /api/gateway/stats
+    # Streaming routes (SSE, long-poll) each hold a worker thread here; see A46 for those.
+    args = sys.argv[1:]
+    if args[:1] == ["--serve-one"]:
+        _serve_one(args[1], int(args[2]))
+    elif args[:1] == ["--bench"]:
+        bench(int(args[1]) if len(args) > 1 else BENCH_CALLS)
+    elif args[:1] == ["--port"]:
+        serve((int(args[1]),))
+    elif args[:1] == ["--legacy-ports"]:
+        serve((PORT,) + tuple(sorted({s[4] for s in SERVICES})))
+    else:
+        serve()
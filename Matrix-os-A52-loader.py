@@ -0,0 +1,180 @@
+matrix-os A52 loader system
+# matrix-OS-A52-loader.py
+# Matrix Windows — Shared module loader for every Matrix service
+# Loads hyphenated Matrix files once per process, lazily on first attribute use, and runs startup hooks
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import importlib.util
+import sys
+import threading
+import time
+import types
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# ===== Config =====
+COLD_START_RUNS = 3      # fresh interpreters per service in --bench (best run is reported)
+
+_lock = threading.RLock()    # module execution and startup hooks
+_running = set()             # module names executing right now (guards self-reference)
+_import_ms = {}              # module name -> exec time in ms (includes modules it loads)
+_hooks = []                  # [module name, function, done]
+
+
+class _LazyModule(types.ModuleType):
+    """Module placeholder; the first missing-attribute lookup runs the real file."""
+
+    def __getattr__(self, attr):
+        _execute(self)
+        try:
+            return self.__dict__[attr]
+        except KeyError:
+            raise AttributeError(f"module {self.__name__!r} has no attribute {attr!r}") from None
+
+
+def _execute(mod):
+    with _lock:
+        name = mod.__name__
+        if type(mod) is not _LazyModule or name in _running:
+            return
+        _running.add(name)
+        start = time.perf_counter()
+        try:
+            mod.__spec__.loader.exec_module(mod)
+        except BaseException:
+            sys.modules.pop(name, None)
+            raise
+        finally:
+            _running.discard(name)
+        _import_ms[name] = (time.perf_counter() - start) * 1000
+        mod.__class__ = types.ModuleType
+
+
+def _placeholder(module_name, filename):
+    path = APP_DIR / filename
+    spec = importlib.util.spec_from_file_location(module_name, str(path))
+    if spec is None or spec.loader is None:
+        raise ImportError(f"Could not load spec for {filename}")
+    mod = importlib.util.module_from_spec(spec)
+    mod.__class__ = _LazyModule
+    return mod
+
+
+def lazy(module_name: str, filename: str):
+    """
+    The module registered as module_name, loading it from filename on
+    first attribute access. Every caller in the process gets the same object.
+    """
+    with _lock:
+        mod = sys.modules.get(module_name)
+        if mod is None:
+            mod = sys.modules[module_name] = _placeholder(module_name, filename)
+        return mod
+
+
+def load(module_name: str, filename: str):
+    """Same as lazy(), but the module is executed before returning."""
+    mod = lazy(module_name, filename)
+    _execute(mod)
+    return mod
+
+
+# ===== Startup hooks =====
+def on_startup(fn):
+    """
+    Decorator: run fn once from startup() instead of at import time
+    (schema creation, seeding, boot notifications...).
+    """
+    with _lock:
+        _hooks.append([fn.__module__, fn, False])
+    return fn
+
+
+def startup():
+    """Run pending startup hooks in registration order. Cheap when none are pending."""
+    if all(h[2] for h in _hooks):
+        return None
+    with _lock:
+        for hook in _hooks:
+            if not hook[2]:
+                hook[1]()
+                hook[2] = True   # a hook that raises is retried by the next startup()
+    return None   # also usable as a Flask before_request handler
+
+
+def stats():
+    return {
+        "modules": {name: ("loaded" if type(mod) is types.ModuleType else "lazy")
+                    for name, mod in sys.modules.items() if name.startswith("matrix_os_")},
+        "import_ms": {name: round(ms, 2) for name, ms in _import_ms.items()},
+        "startup_hooks": [(h[0], h[1].__name__, h[2]) for h in _hooks],
+    }
+
+
+# ===== Cold-start benchmark =====
+def _cold_start(name):
+    """Child process: import one service, run its startup hooks, print timings as JSON."""
+    import json
+    import flask   # framework import counts in wall time only; import_ms is Matrix code
+    import psutil
+    gateway = load("matrix_os_a51_gateway", "matrix-OS-A51-gateway.py")
+    svc = next(s for s in gateway.SERVICES if s[0] == name)
+    start = time.perf_counter()
+    try:
+        load(svc[2], svc[1])
+    except Exception as e:
+        print(json.dumps({"error": f"{type(e).__name__}: {e}"}))
+        return
+    imported = time.perf_counter()
+    startup()
+    done = time.perf_counter()
+    print(json.dumps({
+        "import_ms": round((imported - start) * 1000, 1),
+        "startup_ms": round((done - imported) * 1000, 1),
+        "rss_mib": round(psutil.Process().memory_info().rss / 2**20, 1),
+        "modules": sorted(m for m in _import_ms if m != gateway.__name__),
+    }))
+
+
+def bench(runs=COLD_START_RUNS):
+    """Cold start per service: process wall time, import, startup hooks and RSS."""
+    import json
+    import subprocess
+    gateway = load("matrix_os_a51_gateway", "matrix-OS-A51-gateway.py")
+    print(f"{'service':<10} {'wall ms':>8} {'import ms':>10} {'startup ms':>11} {'RSS MiB':>8}  modules")
+    for svc in gateway.SERVICES:
+        best = None
+        for _ in range(runs):
+            start = time.perf_counter()
+            out = subprocess.run([sys.executable, str(Path(__file__).resolve()), "--cold", svc[0]],
+                                 capture_output=True, text=True).stdout
+            wall = (time.perf_counter() - start) * 1000
+            result = json.loads(out.strip().splitlines()[-1]) if out.strip() else {"error": "no output"}
+            result["wall_ms"] = round(wall, 1)
+            if best is None or "error" in best or wall < best["wall_ms"]:
+                best = result
+        if "error" in best:
+            print(f"{svc[0]:<10} not loadable: {best['error']}")
+            continue
+        print(f"{svc[0]:<10} {best['wall_ms']:>8} {best['import_ms']:>10} {best['startup_ms']:>11} "
+              f"{best['rss_mib']:>8}  {len(best['modules'])}")
+
+
+# ===== Main =====
+if __name__ == "__main__":
+    # Run:
+    #   python matrix-OS-A52-loader.py --bench   cold start and RSS per service
+    # In a service:
+    #   loader = ...bootstrap (see the top of any service file)...
+    #   db = loader.lazy("matrix_os_a5_database", "matrix-OS-A5-database.py")   # runs on first db.x
+    #   @loader.on_startup
+    #   def init_db(): ...
+    #   loader.startup()   # in __main__, or app.before_request(loader.startup)
+    sys.modules.setdefault("matrix_os_a52_loader", sys.modules[__name__])   # services share this copy
+    if sys.argv[1:2] == ["--cold"]:
+        _cold_start(sys.argv[2])
+    elif sys.argv[1:2] == ["--bench"]:
+        bench(int(sys.argv[2]) if len(sys.argv) > 2 else COLD_START_RUNS)
+    else:
+        print(stats())
@@ -0,0 +1,287 @@
+matrix-os A53 route stats system
+# matrix-OS-A53-route-stats.py
+# Matrix Windows — Per-route latency histograms for every Matrix Flask service
+# WSGI middleware: log-scale histograms per route and status, in-flight gauges, GET /api/_stats
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import itertools
+import threading
+import time
+from flask import jsonify, request
+
+# ===== Config =====
+STRIPES = 16                 # independent lock+histogram sets; a thread always uses the same one
+SUB_BUCKETS = 4              # buckets per power of two (~19% resolution)
+BUCKETS = 160                # covers 1 ns .. ~20 minutes; slower requests land in the last bucket
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+STATS_PATH = "/api/_stats"
+UNMATCHED = "<unmatched>"    # requests no route matched (404s, 405s)
+RULE_KEY = "matrix.url_rule" # environ key where the matched Flask rule is left for the middleware
+
+_SHIFT = SUB_BUCKETS.bit_length() - 1
+_registry = {}               # service name -> RouteStats (every instrumented app in this process)
+_thread_slot = threading.local()
+_next_slot = itertools.count()   # next per-thread slot; thread ids are too aligned to stripe by
+
+
+def _slot_of_thread():
+    """Small per-thread number (0, 1, 2, ... in order of first use); stripe = slot % STRIPES."""
+    try:
+        return _thread_slot.n
+    except AttributeError:
+        n = _thread_slot.n = next(_next_slot)
+        return n
+
+
+def bucket_of(ns):
+    """Histogram index: octave of ns, then which quarter of that octave (inlined in instrument())."""
+    bits = ns.bit_length()
+    if bits <= _SHIFT:
+        return 0
+    idx = ((bits - _SHIFT - 1) << _SHIFT) + (ns >> (bits - _SHIFT - 1)) - SUB_BUCKETS
+    return idx if idx < BUCKETS else BUCKETS - 1
+
+def bucket_upper(idx):
+    """Exclusive upper bound in ns of histogram bucket idx."""
+    octave, sub = divmod(idx, SUB_BUCKETS)
+    return (SUB_BUCKETS + sub + 1) << octave
+
+
+class _Hist:
+    __slots__ = ("counts", "count", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+class _Stripe:
+    __slots__ = ("lock", "hists", "active", "streaming")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hists = {}        # (method, rule, status) -> _Hist
+        self.active = 0        # requests inside the app right now
+        self.streaming = 0     # responses without Content-Length still being sent
+
+
+class RouteStats:
+    """
+    Latency histograms for one service.
+
+    Each thread takes the next stripe in turn on its first request, so
+    concurrent requests are spread evenly over the stripes and the lock is
+    only held for a few integer adds. Readers merge all stripes. Latency is the time to
+    the response start (the view's return); a streamed body is counted
+    as streaming until its iterator is closed.
+    """
+
+    def __init__(self, service):
+        self.service = service
+        self.stripes = [_Stripe() for _ in range(STRIPES)]
+        self.started = time.time()
+
+    def merged(self):
+        hists, active, streaming = {}, 0, 0
+        for stripe in self.stripes:
+            with stripe.lock:
+                active += stripe.active
+                streaming += stripe.streaming
+                for key, h in stripe.hists.items():
+                    m = hists.get(key)
+                    if m is None:
+                        m = hists[key] = _Hist()
+                    m.counts = [a + b for a, b in zip(m.counts, h.counts)]
+                    m.count += h.count
+                    m.total_ns += h.total_ns
+                    m.max_ns = max(m.max_ns, h.max_ns)
+        return hists, active, streaming
+
+    @staticmethod
+    def quantile(h, q):
+        """Upper bound of the bucket holding quantile q, capped at the observed max."""
+        rank = q * h.count
+        seen = 0
+        for idx, c in enumerate(h.counts):
+            seen += c
+            if c and seen >= rank:
+                return min(bucket_upper(idx), h.max_ns)
+        return h.max_ns
+
+    def report(self):
+        hists, active, streaming = self.merged()
+        routes = []
+        for (method, rule, status), h in sorted(hists.items()):
+            row = {"route": f"{method} {rule}", "status": int(status), "count": h.count,
+                   "mean_ms": round(h.total_ns / h.count / 1e6, 4), "max_ms": round(h.max_ns / 1e6, 4)}
+            for q in QUANTILES:
+                row[f"p{str(q)[2:].ljust(2, '0')}_ms"] = round(self.quantile(h, q) / 1e6, 4)
+            routes.append(row)
+        return {"service": self.service, "in_flight": active, "streaming": streaming,
+                "since": self.started, "routes": routes}
+
+
+class _Streamed:
+    """Response body wrapper that lowers the streaming gauge when closed."""
+
+    def __init__(self, body, stripe):
+        self.body = body
+        self.stripe = stripe
+
+    def __iter__(self):
+        return iter(self.body)
+
+    def close(self):
+        try:
+            if hasattr(self.body, "close"):
+                self.body.close()
+        finally:
+            with self.stripe.lock:
+                self.stripe.streaming -= 1
+
+
+def _rule_recording_request(base):
+    """Flask request class that also leaves its matched rule in the WSGI environ."""
+
+    class Request(base):
+        @property
+        def url_rule(self):
+            return self.environ.get(RULE_KEY)
+
+        @url_rule.setter
+        def url_rule(self, rule):
+            self.environ[RULE_KEY] = rule
+
+    return Request
+
+
+def instrument(app, service):
+    """
+    Install latency recording on a Flask app and add GET /api/_stats.
+    Call once per app, right after creating it.
+    """
+    stats = _registry[service] = RouteStats(service)
+    app.request_class = _rule_recording_request(app.request_class)
+    inner = app.wsgi_app
+    stripes = stats.stripes
+    n = len(stripes)
+    slot = _slot_of_thread
+    clock = time.perf_counter_ns
+
+    def wsgi_app(environ, start_response):
+        stripe = stripes[slot() % n]
+        meta = ["500", True]   # status line, body streamed (no Content-Length)
+
+        def recording_start_response(status, headers, exc_info=None):
+            meta[0] = status
+            for k, _ in headers:
+                if k == "Content-Length" or k.lower() == "content-length":
+                    meta[1] = False
+                    break
+            return start_response(status, headers, exc_info)
+
+        with stripe.lock:
+            stripe.active += 1
+        start = clock()
+        returned = False     # streaming is only counted for a body we hand back (and wrap)
+        try:
+            body = inner(environ, recording_start_response)
+            returned = True
+        finally:
+            ns = clock() - start
+            rule = environ.get(RULE_KEY)
+            # Kept as strings here; formatted once per report, not per request
+            key = (environ.get("REQUEST_METHOD"), rule.rule if rule is not None else UNMATCHED, meta[0][:3])
+            bits = ns.bit_length()
+            idx = ((bits - _SHIFT - 1) << _SHIFT) + (ns >> (bits - _SHIFT - 1)) - SUB_BUCKETS if bits > _SHIFT else 0
+            with stripe.lock:
+                stripe.active -= 1
+                h = stripe.hists.get(key)
+                if h is None:
+                    h = stripe.hists[key] = _Hist()
+                h.counts[idx if idx < BUCKETS else BUCKETS - 1] += 1
+                h.count += 1
+                h.total_ns += ns
+                if ns > h.max_ns:
+                    h.max_ns = ns
+                if returned and meta[1]:
+                    stripe.streaming += 1
+        return _Streamed(body, stripe) if meta[1] else body
+
+    app.wsgi_app = wsgi_app
+    app.add_url_rule(STATS_PATH, "matrix_route_stats", stats_view, methods=["GET"])
+    return stats
+
+
+def stats_view():
+    """
+    GET /api/_stats[?service=A7-api]
+    Every instrumented service in this process (one, or all of them behind
+    the A51 gateway), with p50/p90/p99/p999 per route and status.
+    """
+    wanted = request.args.get("service")
+    services = [s.report() for name, s in sorted(_registry.items()) if not wanted or name == wanted]
+    return jsonify({"ok": True, "services": services})
+
+
+# ===== Overhead benchmark =====
+def bench(n=100000):
+    """
+    Per-request cost of the middleware. Measured twice: around a bare WSGI
+    callable (the middleware alone) and on a tiny Flask app with and
+    without instrument() (includes the request-class hook, but noisier).
+    """
+    from flask import Flask
+    from werkzeug.test import EnvironBuilder
+
+    def best_us(call, make_env, runs=5):
+        sr = lambda status, headers, exc_info=None: None
+        best = float("inf")
+        for _ in range(runs):
+            start = time.perf_counter()
+            for _ in range(n):
+                call(make_env(), sr)
+            best = min(best, time.perf_counter() - start)
+        return best / n * 1e6
+
+    class _Rule:
+        rule = "/api/ping/<int:i>"
+
+    class _Bare:
+        request_class = object
+        add_url_rule = staticmethod(lambda *a, **k: None)
+
+        @staticmethod
+        def wsgi_app(environ, start_response):
+            start_response("200 OK", [("Content-Type", "text/plain"), ("Content-Length", "4")])
+            return [b"pong"]
+
+    bare = _Bare()
+    plain_call = bare.wsgi_app
+    instrument(bare, "bench-bare")
+    env = {"REQUEST_METHOD": "GET", RULE_KEY: _Rule()}
+    bare_plain, bare_measured = best_us(plain_call, lambda: env), best_us(bare.wsgi_app, lambda: env)
+
+    def make():
+        app = Flask("bench")
+        app.add_url_rule("/api/ping/<int:i>", "ping", lambda i: ("pong", 200, {"Content-Length": "4"}))
+        return app
+
+    plain, measured = make(), make()
+    instrument(measured, "bench")
+    base_env = EnvironBuilder(path="/api/ping/1").get_environ()
+    flask_plain = best_us(plain.wsgi_app, lambda: dict(base_env), runs=3)
+    flask_measured = best_us(measured.wsgi_app, lambda: dict(base_env), runs=3)
+    print(f"middleware alone: {bare_measured - bare_plain:.2f} us/request")
+    print(f"Flask app:        {flask_plain:.2f} -> {flask_measured:.2f} us/request "
+          f"({flask_measured - flask_plain:+.2f})")
+    print(_registry["bench"].report()["routes"])
+
+
+# --- Example test ---
+if __name__ == "__main__":
+    # python matrix-OS-A53-route-stats.py [N]   middleware overhead benchmark
+    import sys
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
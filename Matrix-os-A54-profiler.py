@@ -0,0 +1,231 @@
+matrix-os A54 profiler system
+# matrix-OS-A54-profiler.py
+# Matrix Windows — On-demand CPU profiling for every Matrix Flask service
+# GET /api/_profile?seconds=N samples all threads into collapsed stacks (flamegraph input);
+# ?mode=cprofile&path=... runs one request under cProfile. Profiles are also saved to PROFILE_DIR.
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from flask import jsonify, request
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# ===== Config =====
+PROFILE_DIR = APP_DIR / "profiles"
+PROFILE_HZ = 100                 # samples per second in sampling mode
+PROFILE_DEFAULT_SECONDS = 10
+PROFILE_MAX_SECONDS = 60
+PROFILE_KEEP = 50                # newest saved profiles kept per service (0 keeps all)
+PROFILE_TOP = 40                 # rows of cProfile output returned (the saved .prof has everything)
+PROFILE_LOCAL_ONLY = True        # only answer requests from this host
+PROFILE_TOKEN = os.environ.get("MATRIX_PROFILE_TOKEN")   # if set, also require X-Matrix-Profile-Token
+DISPATCH_KEY = "matrix.dispatch" # environ key for the WSGI app profiled requests go to (A51 sets itself)
+
+_busy = threading.Lock()         # one profile at a time per process
+_labels = {}                     # code object -> "file:function:line"
+
+
+def _label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = _labels[code] = f"{os.path.basename(code.co_filename)}:{code.co_name}:{code.co_firstlineno}"
+    return label
+
+
+def sample(seconds, hz=PROFILE_HZ, skip=None):
+    """
+    Sample every thread's stack hz times a second for 'seconds'.
+    Returns a Counter of collapsed stacks "thread;outer;...;inner" -> samples.
+    Runs on the calling thread, which is left out of its own samples.
+    """
+    skip = threading.get_ident() if skip is None else skip
+    interval = 1.0 / hz
+    stacks = Counter()
+    end = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    while True:
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == skip:
+                continue
+            parts = []
+            while frame is not None:
+                parts.append(_label(frame.f_code))
+                frame = frame.f_back
+            parts.append(names.get(ident, f"thread-{ident}").replace(" ", "_").replace(";", "_"))
+            parts.reverse()
+            stacks[";".join(parts)] += 1
+        if time.perf_counter() >= end:
+            return stacks
+
+
+def collapsed(stacks):
+    """Brendan Gregg's folded format: one 'frame;frame;frame count' line per stack."""
+    return "".join(f"{stack} {n}\n" for stack, n in stacks.most_common())
+
+
+def profile_request(app, method, path, body=b"", content_type=None, headers=None):
+    """Run one request through app under cProfile. Returns (status, pstats.Stats)."""
+    builder = EnvironBuilder(path=path, method=method, data=body, content_type=content_type,
+                             headers=headers)
+    environ = builder.get_environ()
+    prof = cProfile.Profile()
+    try:
+        prof.enable()
+        try:
+            _, status, _ = run_wsgi_app(app, environ, buffered=True)
+        finally:
+            prof.disable()
+    finally:
+        builder.close()
+    return status, pstats.Stats(prof)
+
+
+def _save(service, suffix, write):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    now = time.time()
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+    path = PROFILE_DIR / f"{service}-{stamp}-{os.getpid()}.{suffix}"
+    write(path)
+    # Names start with service and timestamp, so they sort oldest first
+    saved = sorted(PROFILE_DIR.glob(f"{service}-[0-9]*"), key=lambda p: p.name)
+    for old in saved[:-PROFILE_KEEP]:
+        try:
+            old.unlink()
+        except OSError:
+            pass   # already removed by another process
+    return path
+
+
+def allowed():
+    """
+    Diagnostics guard (also used by A55): loopback only, plus the token if one is configured.
+    A request with no known client address (no REMOTE_ADDR) is refused.
+    """
+    if PROFILE_LOCAL_ONLY and request.remote_addr not in ("127.0.0.1", "::1"):
+        return False
+    if PROFILE_TOKEN:
+        given = request.headers.get("X-Matrix-Profile-Token", "")
+        return hmac.compare_digest(given.encode(), PROFILE_TOKEN.encode())
+    return True
+
+
+def install(app, service):
+    """Add GET/POST /api/_profile to a Flask app."""
+
+    def profile_view():
+        """
+        Sampling (all threads, whole process):
+          GET /api/_profile?seconds=10[&hz=100]   -> text/plain collapsed stacks
+        One request under cProfile:
+          GET|POST /api/_profile?mode=cprofile&path=/api/analytics/summary[&method=GET]
+          (a POST body is passed on to the profiled request)  -> text/plain pstats
+        The saved file is named in the X-Matrix-Profile-File header.
+        """
+        if not allowed():
+            return jsonify({"ok": False, "error": "Profiling not allowed"}), 403
+        if not _busy.acquire(blocking=False):
+            return jsonify({"ok": False, "error": "A profile is already running"}), 409
+        try:
+            if request.args.get("mode", "sample") == "cprofile":
+                path = request.args.get("path")
+                if not path or not path.startswith("/") or path.startswith("/api/_profile"):
+                    return jsonify({"ok": False, "error": "Need path=/api/..."}), 400
+                status, stats = profile_request(
+                    request.environ.get(DISPATCH_KEY, app), request.args.get("method", "GET").upper(), path,
+                    request.get_data(), request.content_type,
+                    {k: v for k, v in request.headers.items() if k.lower().startswith("x-matrix-")})
+                saved = _save(service, "prof", lambda p: stats.dump_stats(str(p)))
+                out = io.StringIO()
+                stats.stream = out
+                stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+                text = f"# {service} {path} -> {status}\n" + out.getvalue()
+            else:
+                try:
+                    seconds = float(request.args.get("seconds", PROFILE_DEFAULT_SECONDS))
+                    hz = int(request.args.get("hz", PROFILE_HZ))
+                except (TypeError, ValueError):
+                    return jsonify({"ok": False, "error": "Bad seconds or hz"}), 400
+                seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+                hz = min(max(hz, 1), 1000)
+                text = collapsed(sample(seconds, hz))
+                saved = _save(service, "folded", lambda p: p.write_text(text))
+        finally:
+            _busy.release()
+        resp = app.response_class(text, mimetype="text/plain")
+        resp.headers["X-Matrix-Profile-File"] = saved.name
+        return resp
+
+    app.add_url_rule("/api/_profile", "matrix_profile", profile_view, methods=["GET", "POST"])
+
+
+# ===== Comparing saved profiles =====
+def self_share(folded_text):
+    """Fraction of samples with each frame on top of the stack (its self time)."""
+    totals = Counter()
+    for line in folded_text.splitlines():
+        stack, _, n = line.rpartition(" ")
+        if stack:
+            totals[stack.rsplit(";", 1)[-1]] += int(n)
+    total = sum(totals.values()) or 1
+    return {frame: n / total for frame, n in totals.items()}
+
+def compare(before_path, after_path, top=20):
+    """Frames whose share of samples changed most between two .folded files."""
+    a = self_share(Path(before_path).read_text())
+    b = self_share(Path(after_path).read_text())
+    rows = sorted(set(a) | set(b), key=lambda f: abs(b.get(f, 0) - a.get(f, 0)), reverse=True)
+    return [(f, round(a.get(f, 0) * 100, 2), round(b.get(f, 0) * 100, 2)) for f in rows[:top]]
+
+
+# ===== Overhead benchmark =====
+def bench(seconds=5.0):
+    """Throughput of a CPU-bound worker thread with and without the sampler running."""
+    def work(stop, out):
+        n = 0
+        while not stop.is_set():
+            sum(i * i for i in range(200))
+            n += 1
+        out.append(n)
+
+    def run(profiled):
+        stop, out = threading.Event(), []
+        t = threading.Thread(target=work, args=(stop, out), name="bench-worker")
+        t.start()
+        stacks = sample(seconds) if profiled else time.sleep(seconds)
+        stop.set()
+        t.join()
+        return out[0], stacks
+
+    base, _ = run(False)
+    prof, stacks = run(True)
+    print(f"worker loops: {base} without sampling, {prof} with {PROFILE_HZ} Hz sampling "
+          f"({(base - prof) / base * 100:+.2f}% slower)")
+    print(f"samples: {sum(stacks.values())}, distinct stacks: {len(stacks)}")
+    print(collapsed(stacks).splitlines()[0][:160])
+
+
+# --- Example test ---
+if __name__ == "__main__":
+    # python matrix-OS-A54-profiler.py                    sampler overhead benchmark
+    # python matrix-OS-A54-profiler.py --compare a.folded b.folded
+    # Flamegraph: curl -s 'localhost:5066/api/_profile?seconds=30' | flamegraph.pl > a20.svg
+    if sys.argv[1:2] == ["--compare"]:
+        for frame, before, after in compare(sys.argv[2], sys.argv[3]):
+            print(f"{before:6.2f}% -> {after:6.2f}%  {frame}")
+    else:
+        bench()
@@ -0,0 +1,268 @@
+matrix-os A55 memdiag system
+# matrix-OS-A55-memdiag.py
+# Matrix Windows — Memory growth diagnostics for every Matrix Flask service
+# tracemalloc start/stop, named snapshots and top allocation diffs by file and line on /api/_memory,
+# plus the sizes of registries that modules register (sessions, AI pools, subscribers...)
+# Matrix Instruction Manual, ARM Index, Volume 1
+
+import gc
+import importlib.util
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import OrderedDict
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# ===== Config =====
+MEMDIAG_FRAMES = 1           # frames kept per allocation; >1 allows group=traceback (costs more memory)
+MEMDIAG_MAX_FRAMES = 25
+MEMDIAG_MAX_SNAPSHOTS = 8    # oldest named snapshot is dropped past this
+MEMDIAG_TOP = 25
+GROUPS = ("lineno", "filename", "traceback")
+# Allocations made by the machinery itself are left out of snapshots
+IGNORE = (tracemalloc.__file__, "<frozen importlib._bootstrap>", "<frozen importlib._bootstrap_external>",
+          "<unknown>")
+
+_lock = threading.Lock()
+_snapshots = OrderedDict()   # name -> (taken at, tracemalloc.Snapshot)
+_registries = {}             # name -> callable returning a size (int or dict)
+
+
+# ===== Registries =====
+def register(name, size):
+    """
+    Report size() on GET /api/_memory under name, e.g. from the module
+    that owns the structure:
+        memdiag.register("A3.active_sessions", lambda: len(active_sessions))
+    Registering a name again replaces it.
+    """
+    _registries[name] = size
+    return size
+
+def registry_sizes():
+    out = {}
+    for name, size in sorted(_registries.items()):
+        try:
+            out[name] = size()
+        except Exception as e:   # one broken probe must not hide the others
+            out[name] = f"{type(e).__name__}: {e}"
+    return out
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+def duplicate_modules():
+    """Matrix files executed more than once in this process (under different module names)."""
+    by_file = {}
+    for name, mod in list(sys.modules.items()):
+        path = getattr(mod, "__file__", None)
+        # Lazy A52 placeholders are not types.ModuleType until they have run
+        if path and type(mod) is types.ModuleType and os.path.basename(path).lower().startswith("matrix"):
+            by_file.setdefault(os.path.realpath(path), []).append(name)
+    return {os.path.basename(p): sorted(names) for p, names in by_file.items() if len(names) > 1}
+
+def process_info():
+    loaded = loader.stats()["modules"]
+    return {
+        "pid": os.getpid(),
+        "rss_bytes": _rss_bytes(),
+        "threads": threading.active_count(),
+        "gc_counts": gc.get_count(),
+        "gc_objects": len(gc.get_objects()),
+        "matrix_modules": {"loaded": sum(1 for s in loaded.values() if s == "loaded"),
+                           "lazy": sum(1 for s in loaded.values() if s == "lazy")},
+        "duplicate_modules": duplicate_modules(),
+    }
+
+
+# ===== tracemalloc =====
+def start(frames=MEMDIAG_FRAMES):
+    """Start tracing (no-op if already tracing). Only allocations made from now on are seen."""
+    if tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(min(max(int(frames), 1), MEMDIAG_MAX_FRAMES))
+    return True
+
+def stop():
+    """Stop tracing and drop the snapshots (their traces are what use the memory)."""
+    with _lock:
+        _snapshots.clear()
+    if not tracemalloc.is_tracing():
+        return False
+    tracemalloc.stop()
+    return True
+
+def snapshot(name=None):
+    """Take a named snapshot; the oldest is dropped past MEMDIAG_MAX_SNAPSHOTS."""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing; start it first")
+    snap = tracemalloc.take_snapshot().filter_traces(
+        [tracemalloc.Filter(False, pattern) for pattern in IGNORE])
+    name = name or time.strftime("%H%M%S")
+    with _lock:
+        _snapshots.pop(name, None)
+        _snapshots[name] = (time.time(), snap)
+        while len(_snapshots) > MEMDIAG_MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return name
+
+def _get(name):
+    with _lock:
+        hit = _snapshots.get(name)
+    if hit is None:
+        raise KeyError(f"No snapshot named {name!r}")
+    return hit[1]
+
+def _where(stat, group):
+    frames = stat.traceback
+    if group == "filename":
+        return frames[0].filename
+    if group == "lineno":
+        return f"{frames[0].filename}:{frames[0].lineno}"
+    return [f"{f.filename}:{f.lineno}" for f in frames]
+
+def top(name, group="lineno", limit=MEMDIAG_TOP):
+    """Largest allocation sites in one snapshot."""
+    stats = _get(name).statistics(group)
+    return [{"where": _where(s, group), "size": s.size, "count": s.count} for s in stats[:limit]]
+
+def diff(base, to=None, group="lineno", limit=MEMDIAG_TOP):
+    """
+    Allocation sites that grew most from snapshot 'base' to snapshot 'to'
+    (default: a snapshot taken now, stored as "now").
+    """
+    old = _get(base)
+    new = _get(to if to else snapshot("now"))
+    stats = new.compare_to(old, group)
+    return [{"where": _where(s, group), "size_diff": s.size_diff, "count_diff": s.count_diff,
+             "size": s.size, "count": s.count} for s in stats[:limit]]
+
+def status():
+    traced = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else None
+    with _lock:
+        snaps = [{"name": n, "taken": t, "traces": len(s.traces)} for n, (t, s) in _snapshots.items()]
+    return {
+        "tracing": tracemalloc.is_tracing(),
+        "frames": tracemalloc.get_traceback_limit() if tracemalloc.is_tracing() else None,
+        "traced_bytes": traced[0] if traced else None,
+        "traced_peak_bytes": traced[1] if traced else None,
+        "tracemalloc_bytes": tracemalloc.get_tracemalloc_memory() if tracemalloc.is_tracing() else None,
+        "snapshots": snaps,
+        "registries": registry_sizes(),
+        "process": process_info(),
+    }
+
+
+# ===== Endpoint =====
+def install(app, service):
+    """Add /api/_memory (same guard as A54's /api/_profile) to a Flask app."""
+    from flask import jsonify, request
+    profiler = load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py")
+
+    def ok(data=None, **extra):
+        payload = {"ok": True, "service": service}
+        if data is not None:
+            payload["data"] = data
+        payload.update(extra)
+        return jsonify(payload)
+
+    def err(message, code=400):
+        return jsonify({"ok": False, "error": message}), code
+
+    def memory_view(action=None):
+        """
+        GET  /api/_memory                      tracing state, snapshots, registry sizes, RSS
+        POST /api/_memory/start[?frames=1]     start tracemalloc
+        POST /api/_memory/snapshot[?name=a]    take a named snapshot
+        GET  /api/_memory/top?name=a[&group=lineno|filename|traceback][&limit=25]
+        GET  /api/_memory/diff?base=a[&to=b][&group=...][&limit=25]   (to: a fresh snapshot)
+        POST /api/_memory/stop                 stop tracing, drop snapshots
+        Everything is per process: behind the A51 gateway it covers all services.
+        """
+        if not profiler.allowed():
+            return err("Diagnostics not allowed", 403)
+        args = request.args
+        group = args.get("group", "lineno")
+        if group not in GROUPS:
+            return err(f"group must be one of {', '.join(GROUPS)}")
+        try:
+            limit = min(max(int(args.get("limit", MEMDIAG_TOP)), 1), 500)
+            if action is None:
+                return ok(status())
+            if request.method == "POST" and action == "start":
+                return ok(started=start(args.get("frames", MEMDIAG_FRAMES)), tracing=True)
+            if request.method == "POST" and action == "stop":
+                return ok(stopped=stop(), tracing=False)
+            if request.method == "POST" and action == "snapshot":
+                return ok(name=snapshot(args.get("name")))
+            if request.method == "GET" and action == "top":
+                return ok(top(args.get("name", ""), group, limit))
+            if request.method == "GET" and action == "diff":
+                return ok(diff(args.get("base", ""), args.get("to"), group, limit))
+        except (KeyError, RuntimeError) as e:
+            return err(str(e.args[0]) if e.args else str(e), 409 if isinstance(e, RuntimeError) else 404)
+        except ValueError:
+            return err("Bad number")
+        return err("Unknown action", 404)
+
+    app.add_url_rule("/api/_memory", "matrix_memory", memory_view, methods=["GET"])
+    app.add_url_rule("/api/_memory/<action>", "matrix_memory", memory_view, methods=["GET", "POST"])
+
+
+# ===== Example / benchmark =====
+def bench(n=20000):
+    """Find a planted leak with a diff, and measure what tracing costs an allocation-heavy loop."""
+    leaked = []
+
+    def leaky_handler(i):
+        leaked.append({"id": i, "payload": "x" * 64})   # grows without bound
+
+    def workload():
+        start_t = time.perf_counter()
+        for i in range(n):
+            {"id": i, "items": [i] * 8, "name": f"user{i}"}
+        return time.perf_counter() - start_t
+
+    register("bench.leaked", lambda: len(leaked))
+    base_s = workload()
+    start()
+    traced_s = workload()
+    snapshot("before")
+    for i in range(n):
+        leaky_handler(i)
+    rows = diff("before", group="lineno", limit=3)
+    info = status()
+    stop()
+    print(f"workload: {base_s * 1000:.1f} ms untraced, {traced_s * 1000:.1f} ms traced "
+          f"(x{traced_s / base_s:.2f}); tracemalloc overhead {info['tracemalloc_bytes'] / 2**20:.1f} MiB")
+    print(f"registries: {info['registries']}")
+    for row in rows:
+        print(f"{row['size_diff'] / 1024:+9.1f} KiB {row['count_diff']:+7d} blocks  {row['where']}")
+
+
+if __name__ == "__main__":
+    # python matrix-OS-A55-memdiag.py [N]    leak-finding example and tracing overhead
+    # Against a running service:
+    #   curl -X POST 'localhost:5080/api/_memory/start'
+    #   curl -X POST 'localhost:5080/api/_memory/snapshot?name=a'
+    #   ... let traffic run ...
+    #   curl 'localhost:5080/api/_memory/diff?base=a'
+    sys.modules.setdefault("matrix_os_a55_memdiag", sys.modules[__name__])
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
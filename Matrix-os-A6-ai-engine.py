@@ -4,21 +4,136 @@ matrix-os A6 ai engine system
 # Matrix Instruction Manual, ARM Index, Volume 1
 
 import hashlib
+import importlib.util
+import os
 import random
+import sys
+import threading
 import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
-from matrix_OS_A5_database import verify_biometrics, list_users
+from pathlib import Path
+
+APP_DIR = Path(__file__).parent.resolve()
+
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+
+# A5 database, loaded on the first "list users" (same instance as A7/A11 use)
+db = loader.lazy("matrix_os_a5_database", "matrix-OS-A5-database.py")
+
+# ===== AI pool limits =====
+AI_POOL_SIZE = 5000                   # engine instances kept (one per session token)
+AI_POOL_MAX_BYTES = 256 * 1024 * 1024 # approximate memory cap across all instances
+AI_IDLE_SECONDS = 30 * 60             # instances unused this long are evicted
+
+# ===== Event memory =====
+MEMORY_CAPACITY = 1000                # events kept per engine; older ones drop (or spill)
+RECORD_BYTES = 136                    # estimated cost of one record without its payload
+
+# ===== Hashing =====
+HASH_ALGORITHM = "sha256"
+HASH_CHUNK = 1024 * 1024              # bytes fed to hashlib per update when streaming
+HASH_WORKERS = os.cpu_count() or 4    # threads for hash_many (hashlib drops the GIL on big buffers)
+HASH_PARALLEL_MIN = 64 * 1024         # items smaller than this are hashed inline
+
+# Event code -> text; records keep only the code and payload, text is built on read
+EVENT_TEXT = {
+    "message": "{}",
+    "session_activated": "Session activated for {}",
+    "system_time": "User requested system time: {}",
+    "list_users": "User requested user list.",
+    "encrypt": "Encrypted data: {}",
+    "decrypt": "User attempted decryption (simulated).",
+    "session_terminated": "Session terminated.",
+    "unknown_command": "Received unknown command: {}",
+}
+
+
+class EventMemory:
+    """
+    Fixed-capacity ring of (id, timestamp, code, payload) records.
+
+    Codes are interned strings and the payload is stored as given, so an
+    event costs one small tuple; timestamps are floats and the log line is
+    formatted only when read. When full, the oldest record is overwritten
+    after being handed to 'spill' (if set) as spill(code, line).
+    """
+
+    def __init__(self, capacity=MEMORY_CAPACITY, spill=None):
+        self.capacity = capacity
+        self.spill = spill
+        self._slots = [None] * capacity
+        self.first_id = 1
+        self.next_id = 1
+        self.bytes = sys.getsizeof(self._slots)
+        self.spilled = 0
+
+    def __len__(self):
+        return self.next_id - self.first_id
+
+    @staticmethod
+    def _cost(payload):
+        return RECORD_BYTES + (sys.getsizeof(payload) if payload is not None else 0)
+
+    def append(self, code, payload=None):
+        nid = self.next_id
+        slot = nid % self.capacity
+        if nid - self.first_id >= self.capacity:
+            old = self._slots[slot]
+            if self.spill is not None:
+                self.spill(old[2], self.format(old))
+                self.spilled += 1
+            self.bytes -= self._cost(old[3])
+            self.first_id += 1
+        self._slots[slot] = (nid, time.time(), sys.intern(code), payload)
+        self.bytes += self._cost(payload)
+        self.next_id = nid + 1
+        return nid
+
+    def records(self, after_id=0, since_ts=None, limit=0):
+        """Records with id > after_id (and timestamp >= since_ts), oldest first."""
+        out = []
+        slots, cap = self._slots, self.capacity
+        for i in range(max(after_id + 1, self.first_id), self.next_id):
+            rec = slots[i % cap]
+            if since_ts is not None and rec[1] < since_ts:
+                continue
+            out.append(rec)
+            if 0 < limit <= len(out):
+                break
+        return out
+
+    @staticmethod
+    def format(rec):
+        _, ts, code, payload = rec
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(ts))
+        return f"[{stamp}] {EVENT_TEXT.get(code, code + ': {}').format(payload)}"
+
+    def lines(self):
+        return [self.format(rec) for rec in self.records()]
+
 
 class MatrixAI:
     """
     Core AI engine that handles logic, decision-making, and adaptive responses.
     """
 
-    def __init__(self):
+    def __init__(self, verbose=True, spill=None):
         self.session_active = False
         self.user = None
-        self.memory = []
-        print("Matrix AI Engine initialized.")
+        # 'spill(user, code, line)' receives events pushed out of the ring (e.g. A18 log_ai_event)
+        self.memory = EventMemory(
+            spill=(lambda code, line: spill(self.user or "", code, line)) if spill else None)
+        self.verbose = verbose   # services pass False to keep stdout out of the request path
+        if verbose:
+            print("Matrix AI Engine initialized.")
 
     def activate_session(self, username):
         """
@@ -26,15 +141,26 @@ class MatrixAI:
         """
         self.user = username
         self.session_active = True
-        self.log_event(f"Session activated for {username}")
-        print(f"AI session started for user: {username}")
+        self.record("session_activated", username)
+        if self.verbose:
+            print(f"AI session started for user: {username}")
+
+    @property
+    def memory_bytes(self):
+        """Estimated size of the event memory (used by AIPool's memory cap)."""
+        return self.memory.bytes
+
+    def record(self, code, payload=None):
+        """
+        Log an AI event by code (see EVENT_TEXT) for future recall.
+        """
+        return self.memory.append(code, payload)
 
     def log_event(self, message):
         """
-        Log AI events for future recall.
+        Log a free-text AI event for future recall.
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.memory.append(f"[{timestamp}] {message}")
+        return self.memory.append("message", message)
 
     def process_command(self, command):
         """
@@ -44,52 +170,394 @@ class MatrixAI:
             return "⚠️ No active AI session. Please authenticate first."
 
         command = command.lower().strip()
+        handler, arg = COMMANDS.resolve(command)
+        if handler is None:
+            response = random.choice(UNKNOWN_RESPONSES)
+            self.record("unknown_command", command)
+            return response
+        return handler(self, arg)
+
+    def show_log(self):
+        """
+        Display all recorded AI log events.
+        """
+        return "\n".join(self.memory.lines())
+
+
+# ===== Command registry =====
+class CommandRegistry:
+    """
+    Maps commands to handlers: handler(ai, arg) -> response text.
+
+    Exact commands ("time") are one dict lookup. Argument commands are
+    registered by prefix ("encrypt ") in a character trie; the longest
+    registered prefix wins and the rest of the command is the argument.
+    Other modules can add commands as plugins:
+
+        @ai_mod.COMMANDS.command("uptime")
+        def uptime(ai, arg): ...
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self._trie = {}
+        self.prefixes = []
+
+    def command(self, *names):
+        """Decorator: register a handler for exact command names."""
+        def register(fn):
+            for name in names:
+                self.exact[name] = fn
+            return fn
+        return register
+
+    def prefix(self, *prefixes):
+        """Decorator: register a handler for commands starting with a prefix."""
+        def register(fn):
+            for p in prefixes:
+                node = self._trie
+                for ch in p:
+                    node = node.setdefault(ch, {})
+                node[None] = fn
+                self.prefixes.append(p)
+            return fn
+        return register
+
+    def resolve(self, command):
+        """(handler, argument) for a normalized command, or (None, command)."""
+        fn = self.exact.get(command)
+        if fn is not None:
+            return fn, ""
+        node, found, end = self._trie, None, 0
+        for i, ch in enumerate(command):
+            node = node.get(ch)
+            if node is None:
+                break
+            if None in node:
+                found, end = node[None], i + 1
+        if found is None:
+            return None, command
+        return found, command[end:]
 
-        if command in ["time", "system time"]:
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.log_event(f"User requested system time: {now}")
-            return f"🕒 System Time: {now}"
+    def names(self):
+        return sorted(self.exact) + sorted(p.strip() + " <arg>" for p in self.prefixes)
 
-        elif command in ["list users", "show users"]:
-            users = list_users()
-            self.log_event("User requested user list.")
-            return f"👥 Registered Users: {users}"
 
-        elif command.startswith("encrypt "):
-            text = command.replace("encrypt ", "")
-            encrypted = hashlib.sha256(text.encode()).hexdigest()
-            self.log_event(f"Encrypted data: {text}")
-            return f"🔒 Encrypted Output: {encrypted}"
+COMMANDS = CommandRegistry()
 
-        elif command.startswith("decrypt "):
-            # Placeholder — true decryption would require key storage
-            self.log_event("User attempted decryption (simulated).")
-            return "⚙️ Decryption simulation: Decryption requires Matrix private key."
+UNKNOWN_RESPONSES = (
+    "💡 Processing request...",
+    "⚙️ Executing subroutine...",
+    "🤖 Thinking...",
+    "🧠 Analyzing input pattern..."
+)
 
-        elif command in ["exit", "logout", "end"]:
-            self.session_active = False
-            self.log_event("Session terminated.")
-            return "🔚 Matrix AI session closed."
+@COMMANDS.command("time", "system time")
+def _cmd_time(ai, arg):
+    now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    ai.record("system_time", now)
+    return f"🕒 System Time: {now}"
 
+@COMMANDS.command("list users", "show users")
+def _cmd_list_users(ai, arg):
+    users = db.list_users()
+    ai.record("list_users")
+    return f"👥 Registered Users: {users}"
+
+@COMMANDS.prefix("encrypt ")
+def _cmd_encrypt(ai, text):
+    encrypted = hashlib.sha256(text.encode()).hexdigest()
+    ai.record("encrypt", text)
+    return f"🔒 Encrypted Output: {encrypted}"
+
+@COMMANDS.prefix("decrypt ")
+def _cmd_decrypt(ai, arg):
+    # Placeholder — true decryption would require key storage
+    ai.record("decrypt")
+    return "⚙️ Decryption simulation: Decryption requires Matrix private key."
+
+@COMMANDS.command("exit", "logout", "end")
+def _cmd_exit(ai, arg):
+    ai.session_active = False
+    ai.record("session_terminated")
+    return "🔚 Matrix AI session closed."
+
+
+# ===== Streaming / parallel hashing =====
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+
+def _executor():
+    global _hash_pool
+    if _hash_pool is None:
+        with _hash_pool_lock:
+            if _hash_pool is None:
+                _hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="a6-hash")
+    return _hash_pool
+
+def hash_stream(chunks, algorithm=HASH_ALGORITHM):
+    """
+    Hash an iterable of byte chunks incrementally (e.g. a request body read
+    HASH_CHUNK at a time). Returns (hexdigest, total bytes).
+    """
+    h = hashlib.new(algorithm)
+    total = 0
+    for chunk in chunks:
+        h.update(chunk)
+        total += len(chunk)
+    return h.hexdigest(), total
+
+def read_chunks(stream, chunk=HASH_CHUNK):
+    """Yield successive reads from a file-like object until EOF."""
+    while True:
+        data = stream.read(chunk)
+        if not data:
+            return
+        yield data
+
+def _digest(data, algorithm):
+    return hashlib.new(algorithm, data).hexdigest()
+
+def hash_many(items, algorithm=HASH_ALGORITHM):
+    """
+    Hex digests of many bytes/str items, in order. Large items are hashed
+    on the shared thread pool; small ones inline, where a thread hop would
+    cost more than the hash.
+    """
+    items = [i.encode() if isinstance(i, str) else i for i in items]
+    big = [k for k, item in enumerate(items) if len(item) >= HASH_PARALLEL_MIN]
+    out = [None] * len(items)
+    futures = {}
+    if len(big) > 1:
+        pool = _executor()
+        futures = {k: pool.submit(_digest, items[k], algorithm) for k in big}
+    for k, item in enumerate(items):
+        if k not in futures:
+            out[k] = _digest(item, algorithm)
+    for k, fut in futures.items():
+        out[k] = fut.result()
+    return out
+
+def bench_hash(sizes=(1024, 1024 ** 2, 64 * 1024 ** 2, 1024 ** 3), batch_bytes=256 * 1024 ** 2):
+    """
+    Throughput of hash_stream (MB/s) and hash_many (items/s, MB/s, serial vs
+    parallel) per input size. Stream inputs reuse one HASH_CHUNK buffer, so
+    1 GB is measured without allocating 1 GB.
+    """
+    block = os.urandom(HASH_CHUNK)
+    rows = []
+    for size in sizes:
+        full, rest = divmod(size, len(block))
+        chunks = [block] * full + ([block[:rest]] if rest else [])
+        reps = max(1, (64 * 1024 ** 2) // size)
+        start = time.perf_counter()
+        for _ in range(reps):
+            hash_stream(chunks)
+        stream_s = (time.perf_counter() - start) / reps
+
+        n_items = max(2, min(10000, batch_bytes // size))
+        if size <= len(block):
+            items = [block[:size]] * n_items
         else:
-            response = random.choice([
-                "💡 Processing request...",
-                "⚙️ Executing subroutine...",
-                "🤖 Thinking...",
-                "🧠 Analyzing input pattern..."
-            ])
-            self.log_event(f"Received unknown command: {command}")
-            return response
+            items = [os.urandom(size)] * min(n_items, 4) if size <= 256 * 1024 ** 2 else []
+        serial_s = parallel_s = None
+        if items:
+            start = time.perf_counter()
+            [_digest(i, HASH_ALGORITHM) for i in items]
+            serial_s = time.perf_counter() - start
+            start = time.perf_counter()
+            hash_many(items)
+            parallel_s = time.perf_counter() - start
+        rows.append({
+            "size": size,
+            "stream_mb_s": round(size / stream_s / 1e6, 1),
+            "batch_items": len(items),
+            "serial_items_s": round(len(items) / serial_s, 1) if serial_s else None,
+            "parallel_items_s": round(len(items) / parallel_s, 1) if parallel_s else None,
+            "parallel_mb_s": round(len(items) * size / parallel_s / 1e6, 1) if parallel_s else None,
+        })
+    return rows
 
-    def show_log(self):
+
+class _PoolEntry:
+    __slots__ = ("ai", "lock", "last_used", "bytes")
+
+    def __init__(self, ai):
+        self.ai = ai
+        self.lock = threading.Lock()   # one request at a time per instance
+        self.last_used = time.time()
+        self.bytes = ai.memory_bytes
+
+
+class AIPool:
+    """
+    MatrixAI instances keyed by session token, created on first use.
+
+    Entries are kept in LRU order. Past 'capacity' instances, past
+    'max_bytes' of estimated engine memory, or after 'idle_seconds'
+    unused, the least recently used instances are evicted. The pool lock
+    only guards the index; each instance has its own lock, so requests
+    for different sessions run concurrently and requests for one session
+    are serialized.
+    """
+
+    def __init__(self, capacity=AI_POOL_SIZE, max_bytes=AI_POOL_MAX_BYTES,
+                 idle_seconds=AI_IDLE_SECONDS, spill=None):
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self.spill = spill              # passed to each MatrixAI (see MatrixAI.__init__)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # token -> _PoolEntry, least recently used first
+        self.total_bytes = 0
+        self.activations = 0
+        self.commands = 0
+        self.hits = 0
+        self.evicted_capacity = 0
+        self.evicted_memory = 0
+        self.evicted_idle = 0
+        self.released = 0
+        self.started = time.time()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _evict(self, now):
+        # Caller holds _lock
+        entries = self._entries
+        while entries:
+            token, entry = next(iter(entries.items()))
+            if len(entries) > self.capacity:
+                self.evicted_capacity += 1
+            elif self.total_bytes > self.max_bytes:
+                self.evicted_memory += 1
+            elif now - entry.last_used > self.idle_seconds:
+                self.evicted_idle += 1
+            else:
+                break
+            del entries[token]
+            self.total_bytes -= entry.bytes
+
+    def _entry(self, token, username):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None:
+                self._entries.move_to_end(token)
+                entry.last_used = now
+                self.hits += 1
+                return entry, False
+            if username is None:
+                return None, False
+            entry = self._entries[token] = _PoolEntry(MatrixAI(verbose=False, spill=self.spill))
+            self.total_bytes += entry.bytes
+            self._evict(now)
+            return entry, True
+
+    @contextmanager
+    def use(self, token, username=None):
         """
-        Display all recorded AI log events.
+        Hold the instance for 'token' for one request:
+            with pool.use(token, username) as ai: ai.process_command(...)
+        A missing instance is created and activated for 'username';
+        without a username it yields None instead.
+        """
+        entry, created = self._entry(token, username)
+        if entry is None:
+            yield None
+            return
+        try:
+            with entry.lock:
+                if created:
+                    entry.ai.activate_session(username)
+                    self.activations += 1
+                yield entry.ai
+        finally:
+            # Also when the body raised. An entry evicted meanwhile is no longer in total_bytes.
+            with self._lock:
+                size = entry.ai.memory_bytes
+                if self._entries.get(token) is entry:
+                    self.total_bytes += size - entry.bytes
+                entry.bytes = size
+                self._evict(time.time())
+
+    def activate(self, token, username):
+        """(Re)activate the instance for a session token."""
+        with self.use(token, username) as ai:
+            if ai.user != username or not ai.session_active:
+                ai.activate_session(username)
+                self.activations += 1
+
+    def command(self, token, command, username=None):
+        """Run a command on the session's instance; None if it has none and no username."""
+        with self.use(token, username) as ai:
+            if ai is None:
+                return None
+            self.commands += 1
+            return ai.process_command(command)
+
+    def batch(self, token, commands, username=None):
+        """
+        Run several commands on one session's instance under a single lock hold.
+        Returns [(response, error, ms)] in order (one failing command does not
+        stop the rest), or None if there is no instance and no username.
         """
-        return "\n".join(self.memory)
+        with self.use(token, username) as ai:
+            if ai is None:
+                return None
+            results = []
+            for command in commands:
+                start = time.perf_counter()
+                try:
+                    response, error = ai.process_command(command), None
+                except Exception as e:
+                    response, error = None, str(e)
+                results.append((response, error, (time.perf_counter() - start) * 1000))
+            self.commands += len(commands)
+            return results
+
+    def release(self, token):
+        """Drop a session's instance (logout)."""
+        with self._lock:
+            entry = self._entries.pop(token, None)
+            if entry is None:
+                return False
+            self.total_bytes -= entry.bytes
+            self.released += 1
+            return True
+
+    def stats(self):
+        uptime = max(time.time() - self.started, 1e-9)
+        with self._lock:
+            return {
+                "instances": len(self._entries),
+                "capacity": self.capacity,
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "memory_events": sum(len(e.ai.memory) for e in self._entries.values()),
+                "activations": self.activations,
+                "commands": self.commands,
+                "hits": self.hits,
+                "evicted_capacity": self.evicted_capacity,
+                "evicted_memory": self.evicted_memory,
+                "evicted_idle": self.evicted_idle,
+                "released": self.released,
+                "activations_per_s": round(self.activations / uptime, 3),
+                "commands_per_s": round(self.commands / uptime, 3),
+                "evictions_per_s": round((self.evicted_capacity + self.evicted_memory
+                                          + self.evicted_idle) / uptime, 3),
+            }
 
 
 # --- Example test routine ---
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--bench-hash":
+        # python matrix-OS-A6-ai-engine.py --bench-hash
+        print(f"workers={HASH_WORKERS} cpus={os.cpu_count()}")
+        for row in bench_hash():
+            print(row)
+        sys.exit(0)
+
     ai = MatrixAI()
     ai.activate_session("Admin")
 
@@ -4,31 +4,51 @@ matrix-os A7 api system
 # Exposes endpoints for AI Engine + Database
 # Matrix Instruction Manual, ARM Index, Volume 1
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 import importlib.util
+import sys
+import json
+import time
 from pathlib import Path
 
 APP_DIR = Path(__file__).parent.resolve()
 
-def load_module(module_name: str, filename: str):
-    """Dynamically load a module from a file with hyphens in the name."""
-    path = APP_DIR / filename
-    spec = importlib.util.spec_from_file_location(module_name, str(path))
-    if spec is None or spec.loader is None:
-        raise ImportError(f"Could not load spec for {filename}")
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
-
-# Load A5 (database) and A6 (AI Engine) even though filenames contain hyphens
-db = load_module("matrix_os_a5_database", "matrix-OS-A5-database.py")
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
+
+# A5 (database) and A3 load on first use; A6 is needed now for the AI pool
+db = loader.lazy("matrix_os_a5_database", "matrix-OS-A5-database.py")
 ai_mod = load_module("matrix_os_a6_ai_engine", "matrix-OS-A6-ai-engine.py")
+sec_mod = loader.lazy("matrix_os_a3_security", "matrix-OS-A3-security.py")
 MatrixAI = ai_mod.MatrixAI
 
 app = Flask(__name__)
 
-# Single, simple AI instance (you can expand to per-session later)
-AI = MatrixAI()
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A7-api")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A7-api")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A7-api")
+
+# Copy AI events pushed out of an engine's bounded memory into A18 telemetry
+AI_LOG_SPILL = False
+telemetry = load_module("matrix_os_a18_telemetry", "matrix-OS-A18-telemetry.py") if AI_LOG_SPILL else None
+
+# One AI engine per session token, created on first use (A6 AIPool).
+# Requests without a token share the DEFAULT_AI instance, as before.
+AI_POOL = ai_mod.AIPool(spill=telemetry.log_ai_event if telemetry else None)
+memdiag.register("A7.ai_pool", AI_POOL.stats)
+DEFAULT_AI = "default"
+NO_SESSION = "⚠️ No active AI session. Please authenticate first."
+MAX_BATCH_COMMANDS = 100   # commands accepted by one /api/ai/commands call
+MAX_HASH_ITEMS = 1000      # inputs accepted by one /api/ai/encrypt/batch call
 
 # --- Helpers ---
 
@@ -42,6 +62,25 @@ def ok(data=None, **extra):
 def err(message, code=400):
     return jsonify({"ok": False, "error": message}), code
 
+def session_token(data=None):
+    """Token from the X-Matrix-Token header, JSON body or ?token= (None if absent)."""
+    token = request.headers.get("X-Matrix-Token") or (data or {}).get("token") \
+        or request.args.get("token")
+    return (token or "").strip() or None
+
+def ai_session(data):
+    """
+    (pool key, username) for an AI request; username is None for the shared
+    engine. Raises LookupError for an invalid or expired token.
+    """
+    token = session_token(data)
+    if token is None:
+        return DEFAULT_AI, None
+    username = sec_mod.session_user(token)
+    if username is None:
+        raise LookupError("Invalid or expired session token")
+    return token, username
+
 # --- Routes ---
 
 @app.route("/api/health", methods=["GET"])
@@ -50,7 +89,15 @@ def health():
 
 @app.route("/api/users", methods=["GET"])
 def list_users():
+    """
+    Registered users (served from A5's cached directory).
+    Optional paging: ?limit=<n>&after=<username> (returns next_cursor).
+    """
     try:
+        if "limit" in request.args or "after" in request.args:
+            limit = max(1, min(int(request.args.get("limit", "100")), 1000))
+            users, next_cursor = db.list_users_page(request.args.get("after"), limit)
+            return ok(users=users, next_cursor=next_cursor, total=db.count_users())
         users = db.list_users()
         return ok(users=users)
     except Exception as e:
@@ -59,9 +106,13 @@ def list_users():
 @app.route("/api/ai/activate", methods=["POST"])
 def ai_activate():
     data = request.get_json(silent=True) or {}
-    username = data.get("username", "Admin")
     try:
-        AI.activate_session(username)
+        key, username = ai_session(data)
+    except LookupError as e:
+        return err(str(e), 401)
+    username = username or data.get("username", "Admin")
+    try:
+        AI_POOL.activate(key, username)
         return ok(message=f"AI session activated for {username}")
     except Exception as e:
         return err(f"Activation failed: {e}")
@@ -73,29 +124,147 @@ def ai_command():
     if not cmd:
         return err("Missing 'command' in JSON payload.")
     try:
-        response = AI.process_command(cmd)
-        return ok(response=response)
+        key, username = ai_session(data)
+    except LookupError as e:
+        return err(str(e), 401)
+    try:
+        response = AI_POOL.command(key, cmd, username)
+        return ok(response=response if response is not None else NO_SESSION)
     except Exception as e:
         return err(f"Command failed: {e}")
 
+@app.route("/api/ai/commands", methods=["POST"])
+def ai_commands():
+    """
+    Run several commands in one request, in order, on the same engine:
+      { "commands": ["time", "encrypt hello"], "token": "<optional>" }
+    Returns per-command results with timings:
+      { "results": [{"command", "ok", "response" | "error", "ms"}], "total_ms" }
+    """
+    start = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    cmds = data.get("commands")
+    if not isinstance(cmds, list) or not cmds:
+        return err("Missing 'commands' array in JSON payload.")
+    if len(cmds) > MAX_BATCH_COMMANDS:
+        return err(f"At most {MAX_BATCH_COMMANDS} commands per batch")
+    cmds = [str(c).strip() for c in cmds]
+    try:
+        key, username = ai_session(data)
+    except LookupError as e:
+        return err(str(e), 401)
+    runnable = [c for c in cmds if c]
+    try:
+        ran = AI_POOL.batch(key, runnable, username) if runnable else []
+    except Exception as e:
+        return err(f"Batch failed: {e}")
+    ran = iter(ran) if ran is not None else None
+    results = []
+    for cmd in cmds:
+        if not cmd:
+            results.append({"command": cmd, "ok": False, "error": "Empty command", "ms": 0.0})
+        elif ran is None:
+            results.append({"command": cmd, "ok": True, "response": NO_SESSION, "ms": 0.0})
+        else:
+            response, error, ms = next(ran)
+            item = {"command": cmd, "ok": error is None, "ms": round(ms, 3)}
+            item.update({"response": response} if error is None else {"error": error})
+            results.append(item)
+    return ok(results=results, total_ms=round((time.perf_counter() - start) * 1000, 3))
+
+@app.route("/api/ai/encrypt/stream", methods=["POST"])
+def ai_encrypt_stream():
+    """
+    SHA-256 of the raw request body, read and hashed in chunks as it arrives
+    (works with Transfer-Encoding: chunked), so large payloads are never
+    held in memory:
+      curl -T big.iso -H "Transfer-Encoding: chunked" http://127.0.0.1:5000/api/ai/encrypt/stream
+    """
+    start = time.perf_counter()
+    try:
+        digest, size = ai_mod.hash_stream(ai_mod.read_chunks(request.stream))
+    except Exception as e:
+        return err(f"Hashing failed: {e}")
+    ms = (time.perf_counter() - start) * 1000
+    return ok(algorithm=ai_mod.HASH_ALGORITHM, digest=digest, bytes=size, ms=round(ms, 3),
+              mb_s=round(size / ms / 1000, 1) if ms else None)
+
+@app.route("/api/ai/encrypt/batch", methods=["POST"])
+def ai_encrypt_batch():
+    """
+    SHA-256 of many inputs in one call, large ones hashed in parallel:
+      { "items": ["hello", "world", ...] }  ->  { "digests": [...], "ms": ... }
+    """
+    start = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    items = data.get("items")
+    if not isinstance(items, list) or not items:
+        return err("Missing 'items' array in JSON payload.")
+    if len(items) > MAX_HASH_ITEMS:
+        return err(f"At most {MAX_HASH_ITEMS} items per batch")
+    try:
+        digests = ai_mod.hash_many([str(i) for i in items])
+    except Exception as e:
+        return err(f"Hashing failed: {e}")
+    return ok(algorithm=ai_mod.HASH_ALGORITHM, digests=digests,
+              ms=round((time.perf_counter() - start) * 1000, 3))
+
 @app.route("/api/ai/log", methods=["GET"])
 def ai_log():
+    """
+    AI event log, oldest first:
+      GET /api/ai/log?cursor=<id>&since=<unix ts>&limit=<n>
+    - cursor: continue after this event id (next_cursor from the previous page)
+    - since:  only events at or after this time
+    - limit:  events per page (default: everything still buffered)
+    Streams {"ok": true, "next_cursor": <id or null>, "events": N, "log": "<lines>"}.
+    """
+    try:
+        cursor = int(request.args.get("cursor", "0"))
+        since = float(request.args["since"]) if request.args.get("since") else None
+        limit = max(0, int(request.args.get("limit", "0")))
+    except ValueError:
+        return err("cursor and limit must be integers, since a unix timestamp")
+    try:
+        key, _ = ai_session(request.args)
+    except LookupError as e:
+        return err(str(e), 401)
     try:
-        log = AI.show_log()
-        return ok(log=log)
+        # Copy the records under the engine's lock; format them while streaming
+        with AI_POOL.use(key) as ai:
+            records = ai.memory.records(cursor, since, limit + 1 if limit else 0) if ai else []
     except Exception as e:
         return err(f"Failed to fetch log: {e}")
+    more = bool(limit) and len(records) > limit
+    if more:
+        records = records[:limit]
+    next_cursor = records[-1][0] if more else None
+
+    def gen():
+        yield '{"ok": true, "next_cursor": %s, "events": %d, "log": "' % (
+            json.dumps(next_cursor), len(records))
+        for i, rec in enumerate(records):
+            yield json.dumps(("\n" if i else "") + ai_mod.EventMemory.format(rec))[1:-1]
+        yield '"}'
+
+    return Response(gen(), mimetype="application/json")
+
+@app.route("/api/ai/pool/stats", methods=["GET"])
+def ai_pool_stats():
+    return ok(stats=AI_POOL.stats())
 
 # --- Simple CORS so a local HTML page can call the API in the browser ---
 
 @app.after_request
 def add_cors_headers(resp):
     resp.headers["Access-Control-Allow-Origin"] = "*"
-    resp.headers["Access-Control-Allow-Headers"] = "Content-Type"
+    resp.headers["Access-Control-Allow-Headers"] = "Content-Type, X-Matrix-Token"
     resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
     return resp
 
 if __name__ == "__main__":
     # Run: python matrix-OS-A7-api.py
     # Default: http://127.0.0.1:5000
+    # AI routes accept a session token (X-Matrix-Token header, "token" field or ?token=)
+    # to get that session's own engine; GET /api/ai/pool/stats shows pool counters.
     app.run(host="127.0.0.1", port=5000, debug=True)
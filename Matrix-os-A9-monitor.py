@@ -3,28 +3,342 @@ matrix-os A9 system monitor
 # Matrix Windows System Monitor API
 # Matrix Instruction Manual, ARM Index, Volume 1
 
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request
 import psutil
 import time
 import importlib.util
+import os
+import re
+import sys
+import threading
+from array import array
+from bisect import bisect_left
 from pathlib import Path
 
 APP_DIR = Path(__file__).parent.resolve()
 
-def load_module(module_name: str, filename: str):
-    """Utility to import another Matrix file dynamically."""
-    path = APP_DIR / filename
-    spec = importlib.util.spec_from_file_location(module_name, str(path))
-    module = importlib.util.module_from_spec(spec)
-    spec.loader.exec_module(module)
-    return module
+# Shared module loader (A52): each Matrix module runs once per process
+loader = sys.modules.get("matrix_os_a52_loader")
+if loader is None:
+    _spec = importlib.util.spec_from_file_location("matrix_os_a52_loader", str(APP_DIR / "matrix-OS-A52-loader.py"))
+    loader = sys.modules["matrix_os_a52_loader"] = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(loader)
+load_module = loader.load
 
-# Load the database module
-db = load_module("matrix_os_a5_database", "matrix-OS-A5-database.py")
+# Database module, loaded on the first health check
+db = loader.lazy("matrix_os_a5_database", "matrix-OS-A5-database.py")
 
 app = Flask(__name__)
+
+# Per-route latency histograms (A53), reported on GET /api/_stats
+load_module("matrix_os_a53_route_stats", "matrix-OS-A53-route-stats.py").instrument(app, "A9-monitor")
+# On-demand profiling (A54): GET /api/_profile?seconds=N (flamegraph stacks) or ?mode=cprofile&path=...
+load_module("matrix_os_a54_profiler", "matrix-OS-A54-profiler.py").install(app, "A9-monitor")
+# Memory growth diagnostics (A55): tracemalloc snapshots/diffs and registry sizes on /api/_memory
+memdiag = load_module("matrix_os_a55_memdiag", "matrix-OS-A55-memdiag.py")
+memdiag.install(app, "A9-monitor")
 start_time = time.time()
 
+# ===== Config =====
+SAMPLE_EVERY = 1.0           # seconds between background samples
+HISTORY_SAMPLES = 3600       # samples kept (1 hour at SAMPLE_EVERY=1)
+DEFAULT_WINDOW = 300         # seconds of history returned by default
+MAX_POINTS = 1000            # buckets one /history response may contain
+METRICS = ("cpu_percent", "memory_percent",
+           "disk_read_bps", "disk_write_bps", "net_sent_bps", "net_recv_bps")
+PROCESS_EVERY = 5.0          # seconds between per-service process samples
+DISCOVER_EVERY = 30.0        # seconds between scans for new/exited Matrix services
+SERVICE_SCRIPT = re.compile(r"matrix-os-(A\d+[\w-]*)\.py$", re.IGNORECASE)
+
+
+class MetricRing:
+    """
+    Fixed-size time series: one array('d') per metric plus timestamps.
+    Appends overwrite the oldest slot; reads copy the wanted span in time
+    order with slice operations, so nothing grows after startup.
+    """
+
+    def __init__(self, capacity, names):
+        self.capacity = capacity
+        self.names = names
+        self.ts = array("d", bytes(8 * capacity))
+        self.cols = {n: array("d", bytes(8 * capacity)) for n in names}
+        self.count = 0          # samples ever appended
+        self._lock = threading.Lock()
+
+    def append(self, ts, values):
+        with self._lock:
+            i = self.count % self.capacity
+            self.ts[i] = ts
+            for n in self.names:
+                self.cols[n][i] = values[n]
+            self.count += 1
+
+    def latest(self):
+        with self._lock:
+            if not self.count:
+                return None
+            i = (self.count - 1) % self.capacity
+            return {"ts": self.ts[i], **{n: self.cols[n][i] for n in self.names}}
+
+    def _ordered(self, col):
+        # Caller holds _lock; oldest..newest without Python-level loops
+        if self.count <= self.capacity:
+            return col[:self.count]
+        i = self.count % self.capacity
+        return col[i:] + col[:i]
+
+    def since(self, t0, names):
+        """(timestamps, {name: values}) for samples with ts >= t0, oldest first."""
+        with self._lock:
+            ts = self._ordered(self.ts)
+            start = bisect_left(ts, t0)
+            return ts[start:], {n: self._ordered(self.cols[n])[start:] for n in names}
+
+    def downsample(self, window, step, names=None, now=None):
+        """
+        Bucket the last 'window' seconds into 'step'-second buckets and return
+        min/max/avg per metric. Empty buckets are left out.
+        """
+        names = names or self.names
+        now = time.time() if now is None else now
+        t0 = now - window
+        ts, cols = self.since(t0, names)
+        out = {"t": [], "series": {n: {"min": [], "max": [], "avg": []} for n in names}}
+        lo = 0
+        edge = t0 + step
+        while lo < len(ts):
+            hi = bisect_left(ts, edge, lo)
+            if hi > lo:
+                out["t"].append(round(edge - step, 3))
+                for n in names:
+                    seg = cols[n][lo:hi]
+                    s = out["series"][n]
+                    s["min"].append(min(seg))
+                    s["max"].append(max(seg))
+                    s["avg"].append(round(sum(seg) / len(seg), 3))
+                lo = hi
+            edge += step
+        return out
+
+
+class ServiceProcesses:
+    """
+    Resource usage of every running Matrix service process.
+
+    Services are found by script name in the process table (one full scan
+    every DISCOVER_EVERY seconds; in between only known pids are read).
+    Per process: RSS, threads, open fds, sockets and CPU seconds, read in
+    one psutil oneshot() plus one pass over /proc/<pid>/fd.
+    """
+
+    def __init__(self):
+        self.procs = {}          # pid -> (service name, psutil.Process)
+        self.latest = {}         # pid -> {"service", "rss", "threads", "fds", "sockets", "cpu_seconds"}
+        self._next_discover = 0.0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def service_name(cmdline):
+        for arg in cmdline or ():
+            m = SERVICE_SCRIPT.search(arg)
+            if m:
+                return m.group(1)
+        return None
+
+    def discover(self):
+        found = {}
+        for p in psutil.process_iter(["pid", "cmdline"]):
+            name = self.service_name(p.info["cmdline"])
+            if name:
+                found[p.info["pid"]] = (name, self.procs.get(p.info["pid"], (None, p))[1])
+        me = os.getpid()
+        if me not in found:
+            found[me] = (self.service_name(sys.argv) or "A9-monitor", psutil.Process(me))
+        self.procs = found
+
+    @staticmethod
+    def _fds(proc):
+        """(open fds, sockets); sockets are fds linking to socket:[inode]."""
+        try:
+            fd_dir = f"/proc/{proc.pid}/fd"
+            fds = sockets = 0
+            for entry in os.scandir(fd_dir):
+                fds += 1
+                try:
+                    if os.readlink(entry.path).startswith("socket:"):
+                        sockets += 1
+                except OSError:
+                    pass   # fd closed while scanning
+            return fds, sockets
+        except FileNotFoundError:
+            raise psutil.NoSuchProcess(proc.pid)
+        except OSError:   # no /proc (not Linux) or not permitted
+            fds = proc.num_fds() if hasattr(proc, "num_fds") else proc.num_handles()
+            return fds, len(proc.connections("all"))
+
+    def sample(self, now=None):
+        now = time.time() if now is None else now
+        if now >= self._next_discover:
+            self._next_discover = now + DISCOVER_EVERY
+            self.discover()
+        latest = {}
+        for pid, (name, proc) in list(self.procs.items()):
+            try:
+                with proc.oneshot():
+                    cpu = proc.cpu_times()
+                    row = {
+                        "service": name,
+                        "rss": proc.memory_info().rss,
+                        "threads": proc.num_threads(),
+                        "cpu_seconds": round(cpu.user + cpu.system, 3),
+                    }
+                row["fds"], row["sockets"] = self._fds(proc)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                self.procs.pop(pid, None)
+                continue
+            latest[pid] = row
+        with self._lock:
+            self.latest = latest
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.latest)
+
+
+class Sampler:
+    """
+    Background thread taking one sample every SAMPLE_EVERY seconds.
+    CPU percent is measured over the interval between samples (no blocking
+    call); disk and network counters become per-second rates. Service
+    processes are sampled every PROCESS_EVERY seconds on the same thread.
+    The thread's own CPU time is tracked to keep sampling cost visible.
+    """
+
+    def __init__(self, ring, services, every=SAMPLE_EVERY, process_every=PROCESS_EVERY):
+        self.ring = ring
+        self.services = services
+        self.every = every
+        self.process_every = process_every
+        self.samples = 0
+        self.last_ms = 0.0
+        self.cpu_seconds = 0.0        # CPU time spent sampling (this thread)
+        self.started = None
+        self._first = threading.Event()
+        self._thread = None
+        self._prev = None
+
+    def _counters(self):
+        disk = psutil.disk_io_counters()
+        net = psutil.net_io_counters()
+        return (time.time(),
+                disk.read_bytes if disk else 0, disk.write_bytes if disk else 0,
+                net.bytes_sent if net else 0, net.bytes_recv if net else 0)
+
+    def sample(self):
+        start = time.perf_counter()
+        cur = self._counters()
+        prev, self._prev = self._prev, cur
+        dt = max(cur[0] - prev[0], 1e-6) if prev else None
+        rate = (lambda k: (cur[k] - prev[k]) / dt) if dt else (lambda k: 0.0)
+        self.ring.append(cur[0], {
+            "cpu_percent": psutil.cpu_percent(interval=None),
+            "memory_percent": psutil.virtual_memory().percent,
+            "disk_read_bps": rate(1), "disk_write_bps": rate(2),
+            "net_sent_bps": rate(3), "net_recv_bps": rate(4),
+        })
+        self.samples += 1
+        self.last_ms = (time.perf_counter() - start) * 1000
+        self._first.set()
+
+    def _loop(self):
+        psutil.cpu_percent(interval=None)   # first call only primes the counter
+        self._prev = self._counters()
+        self.started = time.time()
+        next_procs = 0.0
+        while True:
+            time.sleep(self.every)
+            cpu0 = time.thread_time()
+            try:
+                self.sample()
+                if time.time() >= next_procs:
+                    next_procs = time.time() + self.process_every
+                    self.services.sample()
+            except Exception:
+                pass   # keep sampling; a failed read leaves a gap in the series
+            self.cpu_seconds += time.thread_time() - cpu0
+
+    def cpu_share(self):
+        """Fraction of one CPU spent sampling since the thread started."""
+        if not self.started:
+            return 0.0
+        return self.cpu_seconds / max(time.time() - self.started, 1e-6)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="a9-sampler", daemon=True)
+            self._thread.start()
+
+    def latest(self, wait=SAMPLE_EVERY * 2):
+        """Newest sample; right after startup, waits for the first one."""
+        self._first.wait(wait)
+        return self.ring.latest()
+
+
+history = MetricRing(HISTORY_SAMPLES, METRICS)
+services = ServiceProcesses()
+sampler = Sampler(history, services)
+
+# ===== Prometheus exposition =====
+PROCESS_GAUGES = (
+    # name, row key, type, help
+    ("matrix_process_resident_memory_bytes", "rss", "gauge", "Resident set size of a Matrix service process."),
+    ("matrix_process_threads", "threads", "gauge", "Threads in a Matrix service process."),
+    ("matrix_process_open_fds", "fds", "gauge", "Open file descriptors of a Matrix service process."),
+    ("matrix_process_sockets", "sockets", "gauge", "Open sockets of a Matrix service process."),
+    ("matrix_process_cpu_seconds_total", "cpu_seconds", "counter", "User plus system CPU time of a Matrix service process."),
+)
+HOST_GAUGES = (
+    ("matrix_host_cpu_percent", "cpu_percent", "Host CPU use over the last sample interval."),
+    ("matrix_host_memory_percent", "memory_percent", "Host memory in use."),
+    ("matrix_host_disk_read_bytes_per_second", "disk_read_bps", "Host disk reads."),
+    ("matrix_host_disk_write_bytes_per_second", "disk_write_bps", "Host disk writes."),
+    ("matrix_host_network_sent_bytes_per_second", "net_sent_bps", "Host network bytes sent."),
+    ("matrix_host_network_received_bytes_per_second", "net_recv_bps", "Host network bytes received."),
+)
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_text():
+    """Latest host and per-service samples in Prometheus text format 0.0.4."""
+    lines = []
+    procs = sorted(services.snapshot().items(), key=lambda kv: (kv[1]["service"], kv[0]))
+    for name, key, kind, help_text in PROCESS_GAUGES:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for pid, row in procs:
+            lines.append(f'{name}{{service="{_label(row["service"])}",pid="{pid}"}} {row[key]}')
+    latest = history.latest()
+    if latest is not None:
+        for name, key, help_text in HOST_GAUGES:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {latest[key]}")
+    lines.append("# HELP matrix_monitor_sampler_cpu_seconds_total CPU time A9 spent sampling.")
+    lines.append("# TYPE matrix_monitor_sampler_cpu_seconds_total counter")
+    lines.append(f"matrix_monitor_sampler_cpu_seconds_total {sampler.cpu_seconds:.6f}")
+    lines.append("# HELP matrix_monitor_services Matrix service processes being sampled.")
+    lines.append("# TYPE matrix_monitor_services gauge")
+    lines.append(f"matrix_monitor_services {len(procs)}")
+    return "\n".join(lines) + "\n"
+
+@loader.on_startup
+def start_sampler():
+    sampler.start()
+
+app.before_request(loader.startup)
+
 def get_uptime():
     """Return formatted system uptime."""
     seconds = int(time.time() - start_time)
@@ -35,23 +349,132 @@ def get_uptime():
 
 @app.route("/api/monitor/health", methods=["GET"])
 def health():
-    """Return general system health and uptime."""
+    """Return general system health and uptime (from the latest background sample)."""
     try:
-        cpu = psutil.cpu_percent(interval=0.5)
-        memory = psutil.virtual_memory().percent
+        latest = sampler.latest()
+        if latest is None:
+            return jsonify({"ok": False, "error": "No sample yet"}), 503
         uptime = get_uptime()
-        users = len(db.list_users())
+        users = db.count_users()
         data = {
             "ok": True,
-            "cpu_percent": cpu,
-            "memory_percent": memory,
+            "cpu_percent": latest["cpu_percent"],
+            "memory_percent": latest["memory_percent"],
             "uptime": uptime,
             "registered_users": users,
+            "sampled_at": latest["ts"],
         }
         return jsonify(data)
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/api/monitor/history", methods=["GET"])
+def monitor_history():
+    """
+    Downsampled metric history:
+      GET /api/monitor/history?window=300&step=10&metrics=cpu_percent,memory_percent
+    - window: seconds back from now (default 300, at most the ring's span)
+    - step:   bucket width in seconds (default: window / 100, at least SAMPLE_EVERY)
+    Each series has min/max/avg per non-empty bucket; t holds bucket starts.
+    """
+    span = HISTORY_SAMPLES * SAMPLE_EVERY
+    try:
+        window = float(request.args.get("window", DEFAULT_WINDOW))
+    except (TypeError, ValueError):
+        window = DEFAULT_WINDOW
+    window = min(max(window, SAMPLE_EVERY), span)
+    try:
+        step = float(request.args.get("step") or window / 100)
+    except (TypeError, ValueError):
+        step = window / 100
+    step = max(step, SAMPLE_EVERY, window / MAX_POINTS)
+    names = [m for m in (request.args.get("metrics") or "").split(",") if m]
+    unknown = [m for m in names if m not in METRICS]
+    if unknown:
+        return jsonify({"ok": False, "error": f"Unknown metrics: {', '.join(unknown)}"}), 400
+    data = history.downsample(window, step, names or None)
+    return jsonify({"ok": True, "window": window, "step": step, **data})
+
+@app.route("/api/monitor/sampler", methods=["GET"])
+def sampler_stats():
+    return jsonify({"ok": True, "samples": sampler.samples, "every": sampler.every,
+                    "capacity": history.capacity, "last_sample_ms": round(sampler.last_ms, 3),
+                    "process_every": sampler.process_every, "services": len(services.procs),
+                    "cpu_share": round(sampler.cpu_share(), 5)})
+
+@app.route("/api/monitor/services", methods=["GET"])
+def monitor_services():
+    """Latest per-process sample of each running Matrix service (JSON view of /metrics)."""
+    procs = services.snapshot()
+    return jsonify({"ok": True, "services": [{"pid": pid, **row} for pid, row in sorted(procs.items())]})
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus scrape endpoint."""
+    return app.response_class(prometheus_text(), mimetype="text/plain",
+                              content_type="text/plain; version=0.0.4; charset=utf-8")
+
+def bench_processes(n_services=20, seconds=30, sockets_each=50):
+    """
+    Start n_services idle processes named like Matrix services, each holding
+    some sockets, and run the sampler for 'seconds': reports its CPU share.
+    """
+    import subprocess
+    child = ("import socket, sys, time\n"
+             f"pairs = [socket.socketpair() for _ in range({sockets_each // 2})]\n"
+             "time.sleep(3600)\n")
+    procs = [subprocess.Popen([sys.executable, "-c", child, f"matrix-OS-A9{i:02d}-bench.py"])
+             for i in range(n_services)]
+    try:
+        time.sleep(1)
+        sampler.start()
+        time.sleep(seconds)
+        sampled = services.snapshot()
+        start = time.thread_time()
+        services.sample(now=0)   # one round without discovery
+        one_round = (time.thread_time() - start) * 1000
+        services._next_discover = 0
+        start = time.thread_time()
+        services.sample()        # one round with a full process scan
+        discover_round = (time.thread_time() - start) * 1000
+    finally:
+        for p in procs:
+            p.kill()
+        for p in procs:
+            p.wait()
+    print(f"services sampled: {len(sampled)} (bench children + this process)")
+    print(f"sampler CPU share over {seconds}s: {sampler.cpu_share() * 100:.3f}% of one core")
+    print(f"one process round: {one_round:.2f} ms CPU; with discovery: {discover_round:.2f} ms CPU")
+    print(prometheus_text().splitlines()[2])
+
+def bench(n=2000):
+    """Health latency (was ~500 ms on cpu_percent) and a full-ring history query."""
+    loader.startup()
+    client = app.test_client()
+    client.get("/api/monitor/health")
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get("/api/monitor/health")
+    health_ms = (time.perf_counter() - start) * 1000 / n
+    now = time.time()
+    for i in range(HISTORY_SAMPLES):   # fill the ring with a synthetic hour
+        history.append(now - HISTORY_SAMPLES + i, {m: float(i % 100) for m in METRICS})
+    start = time.perf_counter()
+    resp = client.get(f"/api/monitor/history?window={HISTORY_SAMPLES}&step=10")
+    hist_ms = (time.perf_counter() - start) * 1000
+    print(f"health: {health_ms:.3f} ms/request")
+    print(f"history: {HISTORY_SAMPLES} samples -> {len(resp.get_json()['t'])} buckets in {hist_ms:.2f} ms")
+
 if __name__ == "__main__":
-    # Run: python matrix-OS-A9-monitor.py
+    # Run: python matrix-OS-A9-monitor.py          (--bench for endpoint timings)
+    # Endpoints: GET /api/monitor/health, /api/monitor/history?window=&step=, /api/monitor/sampler,
+    #            /api/monitor/services, /metrics (Prometheus text; scrape localhost:5050/metrics)
+    # --bench-processes [N]: sampler CPU share with N service processes
+    if sys.argv[1:2] == ["--bench"]:
+        bench()
+        sys.exit(0)
+    if sys.argv[1:2] == ["--bench-processes"]:
+        bench_processes(int(sys.argv[2]) if len(sys.argv) > 2 else 20)
+        sys.exit(0)
+    loader.startup()
     app.run(host="127.0.0.1", port=5050, debug=True)